@@ -1,2 +1,10 @@
-from .mongodb import connect_mongodb, close_mongodb, get_db
-from .neo4j_db import connect_neo4j, close_neo4j, get_driver
+from .mongodb import (
+    connect_mongodb, close_mongodb, get_db, get_analytics_db, get_client, supports_transactions,
+    get_pool_stats,
+    DOC_CACHE_SIZE, DOC_CACHE_TTL, MONGO_TYPED_REFERENCES,
+)
+from .neo4j_db import (
+    connect_neo4j, close_neo4j, get_driver, get_session,
+    NEO4J_BATCH_SIZE, GRAPH_SYNC_MODE, FRIEND_REC_CACHE_SIZE, FRIEND_REC_CACHE_TTL,
+    RECOMMENDATION_BATCH_INTERVAL,
+)
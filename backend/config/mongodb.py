@@ -1,22 +1,168 @@
 """
 MongoDB-Verbindung mit Motor (async Driver für FastAPI).
+
+Pool, Timeouts, Kompression und Read Preference/Concern kommen aus der
+Umgebung. Analyse-Aggregationen und Exporte lesen über get_analytics_db()
+(Standard: secondaryPreferred), damit sie im Replica Set die Secondaries
+statt den Primary belasten.
 """
 
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
+import threading
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.getenv("MONGO_DB", "gamestore")
+# Read-Through-Cache für Katalog-Dokumente (0 = deaktiviert)
+DOC_CACHE_SIZE = int(os.getenv("DOC_CACHE_SIZE", "5000"))
+DOC_CACHE_TTL = float(os.getenv("DOC_CACHE_TTL", "60"))
+# Referenzen (user_id, game_id, publisher_id) als ObjectId statt String speichern
+MONGO_TYPED_REFERENCES = os.getenv("MONGO_TYPED_REFERENCES", "false").lower() == "true"
+# Verbindungspool (pro Server); MONGO_MIN_POOL_SIZE Verbindungen werden beim Start geöffnet
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+# Timeouts in Millisekunden
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+# Netzwerk-Kompression, z.B. "zstd,snappy,zlib" (zstd/snappy brauchen zstandard bzw. python-snappy)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+# Read Preference/Concern: allgemein und für Analysen (leerer Concern = Server-Standard)
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_READ_CONCERN = os.getenv("MONGO_READ_CONCERN", "")
+MONGO_ANALYTICS_READ_PREFERENCE = os.getenv("MONGO_ANALYTICS_READ_PREFERENCE", "secondaryPreferred")
+MONGO_ANALYTICS_READ_CONCERN = os.getenv("MONGO_ANALYTICS_READ_CONCERN", "local")
 
 client: AsyncIOMotorClient = None
 db = None
+analytics_db = None
+transactions_supported = False
+
+
+# ──────────────────────────────────────────
+# Pool-Auslastung (Events kommen aus den Threads von PyMongo)
+# ──────────────────────────────────────────
+
+class _PoolListener(monitoring.ConnectionPoolListener):
+    """Zählt offene, ausgeliehene und wartende Verbindungen pro Server."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.servers: dict[str, dict] = {}
+
+    def _count(self, event, **deltas):
+        address = "%s:%s" % event.address
+        with self._lock:
+            counts = self.servers.setdefault(address, {"open": 0, "in_use": 0, "waiting": 0})
+            for key, delta in deltas.items():
+                counts[key] += delta
+
+    def connection_created(self, event):
+        self._count(event, open=1)
+
+    def connection_closed(self, event):
+        self._count(event, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._count(event, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._count(event, waiting=-1)
+
+    def connection_checked_out(self, event):
+        self._count(event, waiting=-1, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._count(event, in_use=-1)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.servers.pop("%s:%s" % event.address, None)
+
+    # Für die Zählung irrelevant, aber von PyMongo verlangt
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+
+_pool_listener = _PoolListener()
+
+
+def get_pool_stats() -> dict:
+    """Pool-Auslastung pro Server; utilisation = ausgeliehen / MONGO_MAX_POOL_SIZE."""
+    with _pool_listener._lock:
+        servers = {address: dict(counts) for address, counts in _pool_listener.servers.items()}
+    for counts in servers.values():
+        counts["utilisation"] = round(counts["in_use"] / MONGO_MAX_POOL_SIZE, 3)
+    return {
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "min_pool_size": MONGO_MIN_POOL_SIZE,
+        "utilisation": max((c["utilisation"] for c in servers.values()), default=0.0),
+        "servers": servers,
+    }
+
+
+# ──────────────────────────────────────────
+# Verbindung
+# ──────────────────────────────────────────
+
+def _read_preference(name: str):
+    return make_read_preference(read_pref_mode_from_name(name), None)
+
+
+def _read_concern(level: str) -> ReadConcern:
+    return ReadConcern(level or None)
+
+
+async def _warm_pool():
+    """Öffnet MONGO_MIN_POOL_SIZE Verbindungen durch parallele Pings."""
+    if MONGO_MIN_POOL_SIZE:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(MONGO_MIN_POOL_SIZE)))
 
 
 async def connect_mongodb():
-    global client, db
-    client = AsyncIOMotorClient(MONGO_URI)
-    db = client[MONGO_DB]
-    print(f"[OK] MongoDB verbunden: {MONGO_URI}/{MONGO_DB}")
+    global client, db, analytics_db, transactions_supported
+    client = AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        **({"compressors": MONGO_COMPRESSORS} if MONGO_COMPRESSORS else {}),
+        event_listeners=[_pool_listener],
+    )
+    db = client.get_database(
+        MONGO_DB,
+        read_preference=_read_preference(MONGO_READ_PREFERENCE),
+        read_concern=_read_concern(MONGO_READ_CONCERN),
+    )
+    analytics_db = client.get_database(
+        MONGO_DB,
+        read_preference=_read_preference(MONGO_ANALYTICS_READ_PREFERENCE),
+        read_concern=_read_concern(MONGO_ANALYTICS_READ_CONCERN),
+    )
+    # Transaktionen gibt es nur im Replica Set oder hinter mongos
+    hello = await client.admin.command("hello")
+    transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    await _warm_pool()
+    print(f"[OK] MongoDB verbunden: {MONGO_URI}/{MONGO_DB} "
+          f"(Transaktionen: {'ja' if transactions_supported else 'nein'}, "
+          f"Pool: {get_pool_stats()['servers']})")
     return db
 
 
@@ -29,3 +175,16 @@ async def close_mongodb():
 
 def get_db():
     return db
+
+
+def get_analytics_db():
+    """Wie get_db(), aber mit der Read Preference/dem Read Concern für Analysen."""
+    return analytics_db
+
+
+def get_client():
+    return client
+
+
+def supports_transactions() -> bool:
+    return transactions_supported
@@ -1,25 +1,55 @@
 """
 Neo4j-Verbindung mit dem offiziellen Python-Driver.
 Enthält Retry-Logik, da Neo4j beim Start länger brauchen kann.
+
+Mit NEO4J_URI=neo4j://… (Routing) verteilt der Driver Lesetransaktionen
+auf die Follower bzw. Read-Replicas eines Clusters, Schreibtransaktionen
+gehen an den Leader. Mit bolt://… läuft alles über die eine Instanz.
 """
 
-from neo4j import AsyncGraphDatabase
+from neo4j import AsyncGraphDatabase, READ_ACCESS, WRITE_ACCESS
 import asyncio
 import os
 
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "gamestore2026")
+# Leer = Standard-Datenbank des Servers
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE") or None
+# Verbindungspool: max. Verbindungen, Wartezeit auf eine freie Verbindung (s)
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "100"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60"))
+# Datensätze pro Abruf vom Server (-1 = alles auf einmal)
+NEO4J_FETCH_SIZE = int(os.getenv("NEO4J_FETCH_SIZE", "1000"))
+# Wie lange Transaktionsfunktionen bei transienten Fehlern wiederholt werden (s)
+NEO4J_MAX_RETRY_TIME = float(os.getenv("NEO4J_MAX_RETRY_TIME", "30"))
+# Zeilen pro UNWIND-Transaktion bei Bulk-Schreibvorgängen
+NEO4J_BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", "5000"))
+# Wer hält den Graphen aktuell: "outbox" (Worker in der API) oder
+# "changestream" (separater Prozess, siehe projector.py)
+GRAPH_SYNC_MODE = os.getenv("GRAPH_SYNC_MODE", "outbox").lower()
+# Cache für Freundes-Empfehlungen: max. Anzahl User, Ablaufzeit in Sekunden.
+# Invalidiert wird nur im eigenen Prozess – Käufe aus anderen API-Prozessen
+# oder vom Projektor werden erst nach Ablauf der TTL sichtbar
+FRIEND_REC_CACHE_SIZE = int(os.getenv("FRIEND_REC_CACHE_SIZE", "10000"))
+FRIEND_REC_CACHE_TTL = float(os.getenv("FRIEND_REC_CACHE_TTL", "60"))
+# Abstand der Läufe des Empfehlungs-Batch-Jobs in Sekunden (0 = nur manuell)
+RECOMMENDATION_BATCH_INTERVAL = float(os.getenv("RECOMMENDATION_BATCH_INTERVAL", "3600"))
 
 driver = None
 
 
 async def connect_neo4j(max_retries=10, delay=3):
     global driver
-    driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    driver = AsyncGraphDatabase.driver(
+        NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD),
+        max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+        connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+        max_transaction_retry_time=NEO4J_MAX_RETRY_TIME,
+    )
     for attempt in range(1, max_retries + 1):
         try:
-            async with driver.session() as session:
+            async with get_session() as session:
                 result = await session.run("RETURN 1")
                 await result.single()
             print(f"[OK] Neo4j verbunden: {NEO4J_URI}")
@@ -42,3 +72,12 @@ async def close_neo4j():
 
 def get_driver():
     return driver
+
+
+def get_session(read: bool = False):
+    """Session mit Datenbank, Fetch-Size und Zugriffsmodus (READ → Follower im Cluster)."""
+    return driver.session(
+        database=NEO4J_DATABASE,
+        fetch_size=NEO4J_FETCH_SIZE,
+        default_access_mode=READ_ACCESS if read else WRITE_ACCESS,
+    )
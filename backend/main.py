@@ -15,10 +15,13 @@ from dotenv import load_dotenv
 load_dotenv()  # .env Datei laden BEVOR config-Module importiert werden
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from config import connect_mongodb, close_mongodb, connect_neo4j, close_neo4j
+from config import (
+    connect_mongodb, close_mongodb, connect_neo4j, close_neo4j, get_pool_stats, GRAPH_SYNC_MODE,
+)
 from routes import (
     games_router,
     users_router,
@@ -26,15 +29,36 @@ from routes import (
     publishers_router,
     purchases_router,
     recommendations_router,
+    exports_router,
+)
+from seed import seed_all, seed_synthetic
+from services import (
+    schema_service, co_ownership_service, mongo_service, migration_service, outbox_service,
+    graph_projector, tag_registry, tag_similarity_service, recommendation_batch_service,
+    buddy_index_service, metrics,
 )
-from seed import seed_all
+from services.mongo_service import InvalidCursorError, InvalidFieldsError
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_mongodb()
     await connect_neo4j()
+    await schema_service.ensure_schema()
+    await co_ownership_service.start()
+    await tag_registry.start()
+    await tag_similarity_service.start()
+    buddy_index_service.start()
+    recommendation_batch_service.start_schedule()
+    # Auch im Change-Stream-Modus: der Worker bucht die Umsatz-Rollups
+    outbox_service.start_worker()
     yield
+    await recommendation_batch_service.stop_schedule()
+    await buddy_index_service.stop()
+    await outbox_service.stop_worker()
+    await tag_similarity_service.stop()
+    await co_ownership_service.stop()
+    await tag_registry.stop()
     await close_mongodb()
     await close_neo4j()
 
@@ -58,6 +82,7 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:3000"],
@@ -66,12 +91,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(InvalidFieldsError)
+async def invalid_fields_handler(request: Request, exc: InvalidFieldsError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
 app.include_router(games_router)
 app.include_router(users_router)
 app.include_router(reviews_router)
 app.include_router(publishers_router)
 app.include_router(purchases_router)
 app.include_router(recommendations_router)
+app.include_router(exports_router)
 
 
 @app.get("/", tags=["Health"])
@@ -88,8 +125,109 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Latenz-Histogramme, DB-Round-Trips und Pool-Auslastung im Prometheus-Textformat."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/api/seed", tags=["Admin"])
-async def seed_database():
-    """[WARNUNG] Befuellt beide Datenbanken mit Testdaten. Loescht alle bestehenden Daten!"""
-    result = await seed_all()
+async def seed_database(
+    users: int | None = Query(None, ge=1, description="Synthetischer Modus: Anzahl User"),
+    games: int | None = Query(None, ge=1, description="Synthetischer Modus: Anzahl Spiele"),
+    avg_friends: int = Query(10, ge=0),
+    avg_games: int = Query(20, ge=1),
+    seed: int = 42,
+):
+    """
+    [WARNUNG] Befuellt beide Datenbanken mit Testdaten. Loescht alle bestehenden Daten!
+
+    Ohne Parameter: kuratierter Demo-Datensatz.
+    Mit users/games: synthetischer Katalog für Lasttests,
+    z.B. /api/seed?users=200000&games=50000&avg_friends=40
+    """
+    if users is None and games is None:
+        result = await seed_all()
+    else:
+        result = await seed_synthetic(users=users or 1000, games=games or 500,
+                                      avg_friends=avg_friends, avg_games=avg_games, seed=seed)
     return {"message": "Seed-Daten erfolgreich geladen", "counts": result}
+
+
+@app.get("/api/schema", tags=["Admin"])
+async def get_schema_status():
+    """Schema-Version und fehlende Indizes/Constraints."""
+    return await schema_service.get_schema_report()
+
+
+@app.post("/api/also-bought/rebuild", tags=["Admin"])
+async def rebuild_also_bought():
+    """Berechnet die Co-Ownership-Nachbarn ("Spieler kauften auch") komplett neu."""
+    return await co_ownership_service.rebuild()
+
+
+@app.post("/api/similar-by-tags/rebuild", tags=["Admin"], status_code=202)
+async def rebuild_tag_similarity():
+    """Fordert den Neuaufbau der TF-IDF-Tag-Nachbarn an (übernimmt der schreibende Worker)."""
+    await tag_similarity_service.schedule_rebuild()
+    return {"scheduled": True}
+
+
+@app.post("/api/friend-recommendations/rebuild", tags=["Admin"], status_code=202)
+async def rebuild_friend_recommendations():
+    """Startet den Batch-Job, der die Freundes-Empfehlungen aller User vorberechnet."""
+    return recommendation_batch_service.start()
+
+
+@app.get("/api/friend-recommendations/status", tags=["Admin"])
+async def get_friend_recommendation_status():
+    """Fortschritt und Durchsatz (User/s) des Empfehlungs-Batch-Jobs."""
+    return recommendation_batch_service.get_progress()
+
+
+@app.post("/api/gaming-buddies/rebuild", tags=["Admin"])
+async def rebuild_buddy_index():
+    """Baut den MinHash/LSH-Index für Gaming-Buddies aus den OWNS-Kanten neu auf."""
+    return await buddy_index_service.rebuild()
+
+
+@app.post("/api/game-stats/rebuild", tags=["Admin"])
+async def rebuild_game_stats():
+    """Berechnet die materialisierten Review-Statistiken (game_stats) neu."""
+    return {"games": await mongo_service.rebuild_game_stats()}
+
+
+@app.post("/api/revenue/rebuild", tags=["Admin"])
+async def rebuild_publisher_revenue():
+    """Berechnet die Umsatz-Rollups pro Publisher und Tag aus allen Käufen neu."""
+    return {"rollups": await mongo_service.rebuild_publisher_revenue()}
+
+
+@app.get("/api/mongo/pool", tags=["Admin"])
+async def get_mongo_pool_status():
+    """Auslastung des MongoDB-Verbindungspools (offen, ausgeliehen, wartend pro Server)."""
+    return get_pool_stats()
+
+
+@app.get("/api/outbox/status", tags=["Admin"])
+async def get_outbox_status():
+    """Synchronisations-Rückstand MongoDB → Neo4j (offene/tote Outbox-Aufträge, Lag)."""
+    return await outbox_service.get_status()
+
+
+@app.get("/api/projector/status", tags=["Admin"])
+async def get_projector_status():
+    """Stand des Change-Stream-Projektors (nur bei GRAPH_SYNC_MODE=changestream aktiv)."""
+    return {"mode": GRAPH_SYNC_MODE, **await graph_projector.get_status()}
+
+
+@app.get("/api/migrations/typed-references", tags=["Admin"])
+async def get_typed_reference_status():
+    """Wie viele Referenzen (user_id, game_id, publisher_id) sind noch Strings?"""
+    return await migration_service.count_untyped_references()
+
+
+@app.post("/api/migrations/typed-references", tags=["Admin"])
+async def migrate_typed_references(batch_size: int = Query(1000, ge=1)):
+    """Konvertiert String-Referenzen online und batchweise zu ObjectIds."""
+    return await migration_service.migrate_typed_references(batch_size)
@@ -0,0 +1,37 @@
+"""
+Graph-Projektor als eigener Prozess (GRAPH_SYNC_MODE=changestream).
+
+Start:  python projector.py
+
+Liest die MongoDB Change Streams und hält den Neo4j-Graphen aktuell,
+unabhängig von der Anzahl der API-Worker (siehe services/graph_projector.py).
+Es sollte genau ein Projektor pro Datenbank laufen.
+"""
+
+from dotenv import load_dotenv
+load_dotenv()  # .env Datei laden BEVOR config-Module importiert werden
+
+import asyncio
+
+from config import connect_mongodb, close_mongodb, connect_neo4j, close_neo4j, supports_transactions
+from services import graph_projector
+
+
+async def main():
+    await connect_mongodb()
+    await connect_neo4j()
+    try:
+        if not supports_transactions():
+            # Gleiche Voraussetzung wie Transaktionen: Replica Set oder mongos
+            raise SystemExit("[ERROR] Change Streams benötigen ein MongoDB Replica Set")
+        await graph_projector.run()
+    finally:
+        await close_neo4j()
+        await close_mongodb()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("[CLOSED] Graph-Projektor beendet")
@@ -4,3 +4,4 @@ from .reviews import router as reviews_router
 from .publishers import router as publishers_router
 from .purchases import router as purchases_router
 from .recommendations import router as recommendations_router
+from .exports import router as exports_router
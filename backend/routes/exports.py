@@ -0,0 +1,70 @@
+"""
+API-Routen für Exporte – Streaming als NDJSON (optional gzip).
+
+Die Collection wird batchweise vom Motor-Cursor gelesen und direkt in die
+Response geschrieben; der Speicherbedarf bleibt unabhängig von der
+Collection-Größe konstant.
+"""
+
+import json
+import zlib
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from services import mongo_service
+
+router = APIRouter(prefix="/api/export", tags=["Export"])
+
+EXPORTABLE_COLLECTIONS = {"games", "users", "reviews", "purchases", "publishers"}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def _ndjson_lines(collection: str, fields: str | None, batch_size: int):
+    async for batch in mongo_service.iter_all(collection, fields, batch_size):
+        yield "".join(
+            json.dumps(doc, default=_json_default, ensure_ascii=False) + "\n" for doc in batch
+        ).encode()
+
+
+async def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@router.get("/{collection}")
+async def export_collection(collection: str, gzip: bool = False,
+                            fields: str | None = None,
+                            batch_size: int = Query(1000, ge=1, le=5000)):
+    """
+    Exportiert eine komplette Collection als NDJSON (ein Dokument pro Zeile).
+
+    gzip=true liefert eine komprimierte .ndjson.gz-Datei.
+    fields: Projektion wie bei den Listen-Endpunkten.
+    """
+    if collection not in EXPORTABLE_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Collection nicht exportierbar")
+    # Vor dem Streamen prüfen – danach ist der Status 200 schon gesendet
+    mongo_service.resolve_fields(collection, fields)
+
+    body = _ndjson_lines(collection, fields, batch_size)
+    filename = f"{collection}.ndjson"
+    media_type = "application/x-ndjson"
+    if gzip:
+        body = _gzipped(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
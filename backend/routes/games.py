@@ -2,40 +2,96 @@
 API-Routen für Games – vollständige CRUD-Funktionalität.
 """
 
-from fastapi import APIRouter, HTTPException
+import json
+from fastapi import APIRouter, HTTPException, Request, Query
 from models.schemas import GameCreate, GameUpdate
-from services import mongo_service, neo4j_service
+from services import (
+    mongo_service, outbox_service, game_import_service, tag_registry, tag_similarity_service,
+)
 
 router = APIRouter(prefix="/api/games", tags=["Games"])
 
 
 @router.post("/", status_code=201)
 async def create_game(game: GameCreate):
-    """Erstellt ein neues Spiel in MongoDB + Neo4j."""
-    result = await mongo_service.create_one("games", game.model_dump())
-    
-    # Tag-IDs aus MongoDB beziehen oder neu erstellen
-    tag_ids = []
-    if game.tag_names:
-        for tag_name in game.tag_names:
-            # Suchen ob Tag existiert
-            from config import get_db
-            db = get_db()
-            tag_doc = await db["tags"].find_one({"name": tag_name})
-            if not tag_doc:
-                from bson import ObjectId
-                tag_doc = {"_id": ObjectId(), "name": tag_name}
-                await db["tags"].insert_one(tag_doc)
-            tag_ids.append(str(tag_doc["_id"]))
-
-    await neo4j_service.create_game_node(result["_id"], tag_ids)
+    """Erstellt ein neues Spiel in MongoDB; Knoten und Tags folgen über die Outbox."""
+    # Tag-IDs aus der Tag-Registry (neue Tags werden in MongoDB angelegt)
+    by_name = await tag_registry.ensure(game.tag_names)
+    tag_ids = [by_name[n] for n in game.tag_names if n in by_name]
+
+    async with mongo_service.transaction() as session:
+        result = await mongo_service.create_one("games", game.model_dump(), session=session)
+        await outbox_service.enqueue(
+            "create_game", {"gameId": result["_id"], "tagIds": tag_ids}, session=session
+        )
+        await tag_similarity_service.schedule_update(result["_id"], game.tag_names, session=session)
+    outbox_service.notify()
     return result
 
 
+async def _ndjson_items(request: Request):
+    """Liest den Body zeilenweise (NDJSON), ohne ihn komplett zu laden."""
+    index, buffer = 0, b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, _parse_line(line)
+                index += 1
+    if buffer.strip():
+        yield index, _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> dict | Exception:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Ungültiges JSON: {e}")
+
+
+async def _json_array_items(body: bytes):
+    try:
+        items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Ungültiges JSON: {e}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Erwartet wird ein JSON-Array")
+    for index, item in enumerate(items):
+        yield index, item
+
+
+@router.post("/bulk")
+async def create_games_bulk(request: Request):
+    """
+    Legt viele Spiele auf einmal an (z.B. Katalog-Feed eines Publishers).
+
+    Body: JSON-Array von Spielen oder NDJSON (Content-Type application/x-ndjson,
+    ein Spiel pro Zeile – wird gestreamt verarbeitet).
+    Antwort: {"created": [{index, _id}], "errors": [{index, error}]} –
+    fehlerhafte Einträge brechen den Import nicht ab.
+    """
+    if "ndjson" in request.headers.get("content-type", ""):
+        items = _ndjson_items(request)
+    else:
+        items = _json_array_items(await request.body())
+    return await game_import_service.import_games(items)
+
+
 @router.get("/")
-async def get_games(limit: int = 100, skip: int = 0):
-    """Listet alle Spiele auf (mit Pagination)."""
-    return await mongo_service.get_all("games", limit=limit, skip=skip)
+async def get_games(limit: int = Query(100, ge=1, le=mongo_service.MAX_PAGE_SIZE),
+                    skip: int = Query(0, ge=0), fields: str | None = None,
+                    cursor: str | None = None, sort: str = "_id", order: str = "asc"):
+    """
+    Listet alle Spiele auf (mit Pagination).
+
+    fields: Projektion – "card", "name-only", "detail" oder z.B. "title,price".
+    cursor: Keyset-Pagination ("" = erste Seite) → {"items", "next_cursor"}.
+            Ohne cursor: klassisch per skip (Liste).
+    """
+    if cursor is not None:
+        return await mongo_service.get_page("games", limit, cursor, sort, order, fields)
+    return await mongo_service.get_all("games", limit=limit, skip=skip, fields=fields)
 
 
 @router.get("/top-rated")
@@ -68,18 +124,36 @@ async def get_also_bought(game_id: str, limit: int = 5):
 
 @router.put("/{game_id}")
 async def update_game(game_id: str, game: GameUpdate):
-    """Aktualisiert ein Spiel."""
-    result = await mongo_service.update_one("games", game_id, game.model_dump())
-    if not result:
-        raise HTTPException(status_code=404, detail="Spiel nicht gefunden")
+    """Aktualisiert ein Spiel (geänderte Tags → Graph + Tag-Ähnlichkeit)."""
+    tag_ids = None
+    if game.tag_names is not None:
+        by_name = await tag_registry.ensure(game.tag_names)
+        tag_ids = [by_name[n] for n in game.tag_names if n in by_name]
+
+    # Update und Outbox-Auftrag gemeinsam – sonst kann der Graph die Tags verpassen
+    async with mongo_service.transaction() as session:
+        result = await mongo_service.update_one("games", game_id, game.model_dump(), session=session)
+        if not result:
+            raise HTTPException(status_code=404, detail="Spiel nicht gefunden")
+        if tag_ids is not None:
+            await outbox_service.enqueue(
+                "set_game_tags", {"gameId": game_id, "tagIds": tag_ids}, session=session
+            )
+            await tag_similarity_service.schedule_update(game_id, game.tag_names, session=session)
+    mongo_service.invalidate_cached("games", game_id)
+    if tag_ids is not None:
+        outbox_service.notify()
     return result
 
 
 @router.delete("/{game_id}")
 async def delete_game(game_id: str):
-    """Löscht ein Spiel aus MongoDB + Neo4j."""
-    deleted = await mongo_service.delete_one("games", game_id)
-    if not deleted:
-        raise HTTPException(status_code=404, detail="Spiel nicht gefunden")
-    await neo4j_service.delete_game_node(game_id)
+    """Löscht ein Spiel aus MongoDB; der Neo4j-Knoten folgt über die Outbox."""
+    async with mongo_service.transaction() as session:
+        deleted = await mongo_service.delete_one("games", game_id, session=session)
+        if not deleted:
+            raise HTTPException(status_code=404, detail="Spiel nicht gefunden")
+        await outbox_service.enqueue("delete_game", {"gameId": game_id}, session=session)
+        await tag_similarity_service.schedule_update(game_id, None, session=session)
+    outbox_service.notify()
     return {"message": "Spiel gelöscht", "id": game_id}
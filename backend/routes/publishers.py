@@ -2,6 +2,7 @@
 API-Routen für Publishers – CRUD.
 """
 
+from datetime import date
 from fastapi import APIRouter, HTTPException
 from models.schemas import PublisherCreate, PublisherUpdate
 from services import mongo_service
@@ -15,14 +16,14 @@ async def create_publisher(publisher: PublisherCreate):
 
 
 @router.get("/")
-async def get_publishers():
-    return await mongo_service.get_all("publishers")
+async def get_publishers(fields: str | None = None):
+    return await mongo_service.get_all("publishers", fields=fields)
 
 
 @router.get("/revenue")
-async def get_revenue_stats():
-    """Umsatz pro Publisher (Aggregation-Pipeline)."""
-    return await mongo_service.get_revenue_per_publisher()
+async def get_revenue_stats(start: date | None = None, end: date | None = None):
+    """Umsatz pro Publisher aus den Tages-Rollups, optional im Zeitraum [start, end]."""
+    return await mongo_service.get_revenue_per_publisher(start, end)
 
 
 @router.get("/{publisher_id}")
@@ -3,12 +3,14 @@ API-Routen für Purchases – Kauf-Logik.
 
 Beim Kauf passieren drei Dinge gleichzeitig:
   1. MongoDB: Purchase-Dokument erstellen + Wallet-Guthaben abziehen
-  2. Neo4j: OWNS-Beziehung erstellen (User besitzt jetzt das Spiel)
+     (atomar, siehe services/purchase_service.py)
+  2. Neo4j: OWNS-Beziehung erstellen (User besitzt jetzt das Spiel) –
+     asynchron über die Outbox (services/outbox_service.py)
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from models.schemas import PurchaseCreate
-from services import mongo_service, neo4j_service
+from services import mongo_service, outbox_service, purchase_service
 
 router = APIRouter(prefix="/api/purchases", tags=["Purchases"])
 
@@ -18,42 +20,17 @@ async def purchase_game(purchase: PurchaseCreate):
     """
     Kauft ein Spiel für einen User.
 
-    1. Prüft ob User genug Guthaben hat
-    2. Erstellt Purchase-Dokument in MongoDB
-    3. Zieht Guthaben vom User ab (MongoDB)
-    4. Erstellt OWNS-Beziehung in Neo4j
+    1. MongoDB: Guthaben bedingt abbuchen + Purchase und Outbox-Auftrag anlegen (atomar)
+    2. Outbox-Worker: OWNS-Beziehung erstellen + Co-Ownership-Speicher fortschreiben
     """
-    # User und Spiel laden
-    user = await mongo_service.get_one("users", purchase.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User nicht gefunden")
-
-    game = await mongo_service.get_one("games", purchase.game_id)
-    if not game:
-        raise HTTPException(status_code=404, detail="Spiel nicht gefunden")
-
-    # Prüfe Guthaben
-    if user.get("wallet_balance", 0) < purchase.price_paid:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Nicht genug Guthaben. Benötigt: {purchase.price_paid}€, "
-                   f"Vorhanden: {user.get('wallet_balance', 0)}€"
+    try:
+        result, game, new_balance = await purchase_service.purchase_game(
+            purchase.user_id, purchase.game_id, purchase.price_paid
         )
+    except purchase_service.PurchaseError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    # Prüfe ob User das Spiel schon besitzt
-    library = await neo4j_service.get_user_library(purchase.user_id)
-    if purchase.game_id in library:
-        raise HTTPException(status_code=400, detail="Spiel bereits in Bibliothek")
-
-    # MongoDB: Purchase erstellen
-    result = await mongo_service.create_one("purchases", purchase.model_dump())
-
-    # MongoDB: Guthaben abziehen
-    new_balance = user.get("wallet_balance", 0) - purchase.price_paid
-    await mongo_service.update_one("users", purchase.user_id, {"wallet_balance": new_balance})
-
-    # Neo4j: OWNS-Beziehung erstellen
-    await neo4j_service.add_ownership(purchase.user_id, purchase.game_id)
+    outbox_service.notify()
 
     return {
         "purchase": result,
@@ -63,9 +40,17 @@ async def purchase_game(purchase: PurchaseCreate):
 
 
 @router.get("/")
-async def get_purchases(limit: int = 100, skip: int = 0):
-    """Listet alle Käufe auf."""
-    return await mongo_service.get_all("purchases", limit=limit, skip=skip)
+async def get_purchases(limit: int = Query(100, ge=1, le=mongo_service.MAX_PAGE_SIZE),
+                        skip: int = Query(0, ge=0), fields: str | None = None,
+                        cursor: str | None = None, sort: str = "_id", order: str = "asc"):
+    """
+    Listet alle Käufe auf (fields: z.B. "user_id,game_id,price_paid").
+
+    cursor: Keyset-Pagination ("" = erste Seite) → {"items", "next_cursor"}.
+    """
+    if cursor is not None:
+        return await mongo_service.get_page("purchases", limit, cursor, sort, order, fields)
+    return await mongo_service.get_all("purchases", limit=limit, skip=skip, fields=fields)
 
 
 @router.get("/{purchase_id}")
@@ -4,16 +4,21 @@ API-Routen für Empfehlungen und Analysen.
 Integrations-Use-Cases: Neo4j-Graph → MongoDB-Details → Kombiniert.
 """
 
-from fastapi import APIRouter
-from services import neo4j_service, integration_service
+from fastapi import APIRouter, Query
+from services import neo4j_service, integration_service, recommendation_batch_service
 
 router = APIRouter(prefix="/api/recommendations", tags=["Recommendations & Analytics"])
 
+# Obergrenze für limit der Graph-Abfragen (Cypher LIMIT, Listen im Speicher)
+MAX_LIMIT = 100
+
 
 # ── Integrations-Use-Cases (Neo4j → MongoDB) ──
 
 @router.get("/{user_id}/friends")
-async def get_friend_recommendations(user_id: str, limit: int = 10):
+async def get_friend_recommendations(
+    user_id: str, limit: int = Query(10, ge=1, le=recommendation_batch_service.LIST_SIZE)
+):
     """
     🔗 INTEGRATIONS-USE-CASE: Spielempfehlungen basierend auf Freundes-Graph.
 
@@ -25,21 +30,26 @@ async def get_friend_recommendations(user_id: str, limit: int = 10):
 
 
 @router.get("/{user_id}/gaming-buddies")
-async def get_gaming_buddies(user_id: str, limit: int = 5):
-    """Potenzielle Gaming-Buddies (Neo4j → MongoDB Profile)."""
-    return await integration_service.get_gaming_buddies_with_profiles(user_id, limit)
+async def get_gaming_buddies(user_id: str, limit: int = Query(5, ge=1, le=MAX_LIMIT),
+                             exact: bool = False):
+    """
+    Potenzielle Gaming-Buddies (Buddy-Index → MongoDB Profile).
+
+    exact=true: exakte Berechnung in Neo4j statt MinHash/LSH-Näherung.
+    """
+    return await integration_service.get_gaming_buddies_with_profiles(user_id, limit, exact)
 
 
 # ── Graph-Analysen (Neo4j) ─────────────────
 
 @router.get("/analytics/popular-tags/{user_id}")
-async def get_popular_tags(user_id: str):
-    """Beliebteste Tags im Freundeskreis."""
-    return await integration_service.get_popular_tags_with_details(user_id)
+async def get_popular_tags(user_id: str, limit: int = Query(20, ge=1, le=MAX_LIMIT)):
+    """Beliebteste Tags im Freundeskreis (die limit häufigsten)."""
+    return await integration_service.get_popular_tags_with_details(user_id, limit)
 
 
 @router.get("/games/{game_id}/similar")
-async def get_similar_games(game_id: str, limit: int = 5):
+async def get_similar_games(game_id: str, limit: int = Query(5, ge=1, le=MAX_LIMIT)):
     """
     Aehnliche Spiele basierend auf Neo4j-Graph.
     
@@ -49,7 +59,7 @@ async def get_similar_games(game_id: str, limit: int = 5):
 
 
 @router.get("/games/{game_id}/similar-by-tags")
-async def get_similar_games_by_tags(game_id: str, limit: int = 5):
+async def get_similar_games_by_tags(game_id: str, limit: int = Query(5, ge=1, le=MAX_LIMIT)):
     """
     AEhnliche Spiele basierend auf gemeinsamen Tags.
     """
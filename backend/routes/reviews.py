@@ -2,7 +2,7 @@
 API-Routen für Reviews – CRUD.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from models.schemas import ReviewCreate, ReviewUpdate
 from services import mongo_service
 
@@ -11,14 +11,22 @@ router = APIRouter(prefix="/api/reviews", tags=["Reviews"])
 
 @router.post("/", status_code=201)
 async def create_review(review: ReviewCreate):
-    """Erstellt eine neue Review."""
-    return await mongo_service.create_one("reviews", review.model_dump())
+    """Erstellt eine neue Review (aktualisiert game_stats)."""
+    return await mongo_service.create_review(review.model_dump())
 
 
 @router.get("/")
-async def get_reviews(limit: int = 100, skip: int = 0):
-    """Listet alle Reviews auf."""
-    return await mongo_service.get_all("reviews", limit=limit, skip=skip)
+async def get_reviews(limit: int = Query(100, ge=1, le=mongo_service.MAX_PAGE_SIZE),
+                      skip: int = Query(0, ge=0), fields: str | None = None,
+                      cursor: str | None = None, sort: str = "_id", order: str = "asc"):
+    """
+    Listet alle Reviews auf (fields: z.B. "game_id,rating").
+
+    cursor: Keyset-Pagination ("" = erste Seite) → {"items", "next_cursor"}.
+    """
+    if cursor is not None:
+        return await mongo_service.get_page("reviews", limit, cursor, sort, order, fields)
+    return await mongo_service.get_all("reviews", limit=limit, skip=skip, fields=fields)
 
 
 @router.get("/{review_id}")
@@ -31,7 +39,7 @@ async def get_review(review_id: str):
 
 @router.put("/{review_id}")
 async def update_review(review_id: str, review: ReviewUpdate):
-    result = await mongo_service.update_one("reviews", review_id, review.model_dump())
+    result = await mongo_service.update_review(review_id, review.model_dump())
     if not result:
         raise HTTPException(status_code=404, detail="Review nicht gefunden")
     return result
@@ -39,7 +47,7 @@ async def update_review(review_id: str, review: ReviewUpdate):
 
 @router.delete("/{review_id}")
 async def delete_review(review_id: str):
-    deleted = await mongo_service.delete_one("reviews", review_id)
+    deleted = await mongo_service.delete_review(review_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Review nicht gefunden")
     return {"message": "Review gelöscht", "id": review_id}
@@ -2,25 +2,35 @@
 API-Routen für Users – CRUD + Freundschaften + Bibliothek.
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from models.schemas import UserCreate, UserUpdate
-from services import mongo_service, neo4j_service
+from services import mongo_service, neo4j_service, outbox_service, recommendation_batch_service
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
 
 @router.post("/", status_code=201)
 async def create_user(user: UserCreate):
-    """Erstellt einen neuen User in MongoDB + Neo4j."""
-    result = await mongo_service.create_one("users", user.model_dump())
-    await neo4j_service.create_user_node(result["_id"])
+    """Erstellt einen neuen User in MongoDB; der Neo4j-Knoten folgt über die Outbox."""
+    async with mongo_service.transaction() as session:
+        result = await mongo_service.create_one("users", user.model_dump(), session=session)
+        await outbox_service.enqueue("create_user", {"userId": result["_id"]}, session=session)
+    outbox_service.notify()
     return result
 
 
 @router.get("/")
-async def get_users(limit: int = 100, skip: int = 0):
-    """Listet alle User auf."""
-    return await mongo_service.get_all("users", limit=limit, skip=skip)
+async def get_users(limit: int = Query(100, ge=1, le=mongo_service.MAX_PAGE_SIZE),
+                    skip: int = Query(0, ge=0), fields: str | None = None,
+                    cursor: str | None = None, sort: str = "_id", order: str = "asc"):
+    """
+    Listet alle User auf (fields: "card", "name-only" oder Feldliste).
+
+    cursor: Keyset-Pagination ("" = erste Seite) → {"items", "next_cursor"}.
+    """
+    if cursor is not None:
+        return await mongo_service.get_page("users", limit, cursor, sort, order, fields)
+    return await mongo_service.get_all("users", limit=limit, skip=skip, fields=fields)
 
 
 @router.get("/{user_id}")
@@ -39,21 +49,21 @@ async def get_user_stats(user_id: str):
 
 
 @router.get("/{user_id}/library")
-async def get_library(user_id: str):
+async def get_library(user_id: str, fields: str | None = None):
     """Spielebibliothek eines Users (Neo4j OWNS → MongoDB Details)."""
     game_ids = await neo4j_service.get_user_library(user_id)
     if not game_ids:
         return []
-    return await mongo_service.get_many_by_ids("games", game_ids)
+    return await mongo_service.get_many_by_ids("games", game_ids, fields)
 
 
 @router.get("/{user_id}/friends")
-async def get_friends(user_id: str):
+async def get_friends(user_id: str, fields: str | None = None):
     """Freundesliste (Neo4j → MongoDB Profile)."""
     friend_ids = await neo4j_service.get_user_friends(user_id)
     if not friend_ids:
         return []
-    return await mongo_service.get_many_by_ids("users", friend_ids)
+    return await mongo_service.get_many_by_ids("users", friend_ids, fields)
 
 
 @router.put("/{user_id}")
@@ -67,11 +77,13 @@ async def update_user(user_id: str, user: UserUpdate):
 
 @router.delete("/{user_id}")
 async def delete_user(user_id: str):
-    """Löscht einen User aus MongoDB + Neo4j."""
-    deleted = await mongo_service.delete_one("users", user_id)
-    if not deleted:
-        raise HTTPException(status_code=404, detail="User nicht gefunden")
-    await neo4j_service.delete_user_node(user_id)
+    """Löscht einen User aus MongoDB; der Neo4j-Knoten folgt über die Outbox."""
+    async with mongo_service.transaction() as session:
+        deleted = await mongo_service.delete_one("users", user_id, session=session)
+        if not deleted:
+            raise HTTPException(status_code=404, detail="User nicht gefunden")
+        await outbox_service.enqueue("delete_user", {"userId": user_id}, session=session)
+    outbox_service.notify()
     return {"message": "User gelöscht", "id": user_id}
 
 
@@ -81,6 +93,7 @@ async def delete_user(user_id: str):
 async def add_friend(user_id: str, friend_id: str):
     """Erstellt eine Freundschaft."""
     await neo4j_service.add_friendship(user_id, friend_id)
+    await recommendation_batch_service.invalidate([user_id, friend_id])
     return {"message": "Freundschaft erstellt", "users": [user_id, friend_id]}
 
 
@@ -88,4 +101,5 @@ async def add_friend(user_id: str, friend_id: str):
 async def remove_friend(user_id: str, friend_id: str):
     """Entfernt eine Freundschaft."""
     await neo4j_service.remove_friendship(user_id, friend_id)
+    await recommendation_batch_service.invalidate([user_id, friend_id])
     return {"message": "Freundschaft entfernt"}
@@ -1 +1,2 @@
 from .seed_data import seed_all
+from .synthetic import seed_synthetic
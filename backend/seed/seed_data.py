@@ -5,21 +5,41 @@ Enthält 29 bekannte Spieletitel, 14 Publisher, 6 Users mit Guthaben,
 Reviews, Käufe und ein Freundesnetzwerk.
 """
 
-from config import get_db, get_driver
+from config import get_db
+from services import (
+    schema_service, neo4j_service, mongo_service, co_ownership_service,
+    tag_registry, tag_similarity_service, recommendation_batch_service,
+    buddy_index_service,
+)
 from bson import ObjectId
 from datetime import datetime
 
 
+async def reset_databases():
+    """Löscht alle Daten in beiden Datenbanken und legt das Schema neu an."""
+    db = get_db()
+    for coll in ["publishers", "games", "users", "reviews", "purchases", "tags",
+                 "also_bought", "game_stats", "publisher_revenue_daily", "graph_outbox",
+                 "tag_similar", "tag_similarity_queue", "recommendations",
+                 "co_ownership_applied"]:
+        await db[coll].drop()
+    await neo4j_service.clear_graph()
+    mongo_service.clear_cache()
+    co_ownership_service.clear()
+    tag_registry.clear()
+    tag_similarity_service.clear()
+    buddy_index_service.clear()
+    print("[DELETED] Bestehende Daten geloescht")
+
+    # Drop entfernt auch die Indizes → vor dem Befüllen neu anlegen
+    await schema_service.ensure_schema()
+
+
 async def seed_all():
     db = get_db()
-    driver = get_driver()
 
     # Bestehende Daten löschen
-    for coll in ["publishers", "games", "users", "reviews", "purchases", "tags"]:
-        await db[coll].drop()
-    async with driver.session() as session:
-        await session.run("MATCH (n) DETACH DELETE n")
-    print("[DELETED] Bestehende Daten geloescht")
+    await reset_databases()
 
     # ── 1. Publishers (13 Publisher) ────────────────────────
     publishers = [
@@ -300,7 +320,7 @@ async def seed_all():
          "min_requirements": "Nintendo Switch",
          "tag_names": ["RPG", "Adventure"], "created_at": datetime.utcnow()},
     ]
-    await db["games"].insert_many(games)
+    await db["games"].insert_many([mongo_service.to_storage_refs("games", d) for d in games])
     game_map = {g["title"]: str(g["_id"]) for g in games}
     print(f"[OK] {len(games)} Spiele erstellt")
 
@@ -400,8 +420,9 @@ async def seed_all():
             "_id": ObjectId(), "user_id": uid, "game_id": gid,
             "price_paid": price, "created_at": datetime.utcnow()
         })
-    await db["purchases"].insert_many(purchases_docs)
+    await db["purchases"].insert_many([mongo_service.to_storage_refs("purchases", d) for d in purchases_docs])
     print(f"[OK] {len(purchases_docs)} Kaeufe erstellt")
+    await mongo_service.rebuild_publisher_revenue()
 
     # ── 5. Reviews (30 Reviews) ───────────────────────────
     reviews_data = [
@@ -477,77 +498,58 @@ async def seed_all():
         {"_id": ObjectId(), "user_id": user_map["03oreo"], "game_id": game_map["Minecraft"],
          "rating": 5, "text": "Das Spiel meiner Kindheit. Wird nie alt.", "recommended": True, "playtime_hours": 500, "created_at": datetime.utcnow()},
     ]
-    await db["reviews"].insert_many(reviews_data)
+    await db["reviews"].insert_many([mongo_service.to_storage_refs("reviews", d) for d in reviews_data])
     print(f"[OK] {len(reviews_data)} Reviews erstellt")
-
-    # ── Neo4j: Graph aufbauen ────────────────
-    async with driver.session() as session:
-        # User-Knoten
-        for username, uid in user_map.items():
-            await session.run("CREATE (u:User {userId: $uid})", uid=uid)
-
-        # Game-Knoten
-        for game in games:
-            gid = str(game["_id"])
-            await session.run("CREATE (g:Game {gameId: $gid})", gid=gid)
-
-        # Tag-Knoten in MongoDB & Neo4j
-        all_tags = set()
-        for game in games:
-            for tag in game["tag_names"]:
-                all_tags.add(tag)
-        
-        # Tags in MongoDB speichern
-        tags_docs = [{"_id": ObjectId(), "name": tag} for tag in all_tags]
-        if tags_docs:
-            await db["tags"].insert_many(tags_docs)
-        tag_map = {doc["name"]: str(doc["_id"]) for doc in tags_docs}
-        print(f"[OK] {len(tags_docs)} Tags in MongoDB erstellt")
-
-        for tag_name, tid in tag_map.items():
-            await session.run("MERGE (t:Tag {tagId: $tid})", tid=tid)
-
-        for game in games:
-            gid = str(game["_id"])
-            for tag_name in game["tag_names"]:
-                tid = tag_map[tag_name]
-                await session.run(
-                    """
-                    MATCH (g:Game {gameId: $gid}), (t:Tag {tagId: $tid})
-                    CREATE (g)-[:TAGGED_WITH]->(t)
-                    """,
-                    gid=gid, tid=tid
-                )
-
-        # OWNS-Beziehungen (aus Purchases)
-        for uid, gid, _ in purchases_data:
-            await session.run(
-                """
-                MATCH (u:User {userId: $uid}), (g:Game {gameId: $gid})
-                CREATE (u)-[:OWNS {purchaseDate: datetime()}]->(g)
-                """,
-                uid=uid, gid=gid
-            )
-
-        # FRIENDS_WITH-Beziehungen
-        friendships = [
-            ("willalo", "invalidluca"),
-            ("willalo", "1401felix"),
-            ("1401felix", "ghostswetterZ"),
-            ("1401felix", "03oreo"),
-            ("invalidluca", "03oreo"),
-            ("ghostswetterZ", "03oreo"),
-        ]
-        for u1, u2 in friendships:
-            await session.run(
-                """
-                MATCH (u1:User {userId: $uid1}), (u2:User {userId: $uid2})
-                CREATE (u1)-[:FRIENDS_WITH]->(u2)
-                """,
-                uid1=user_map[u1], uid2=user_map[u2]
-            )
+    await mongo_service.rebuild_game_stats()
+
+    # ── Neo4j: Graph aufbauen (gebündelt per UNWIND) ────────────────
+    await neo4j_service.bulk_create_nodes("User", user_map.values())
+    await neo4j_service.bulk_create_nodes("Game", (str(g["_id"]) for g in games))
+
+    # Tag-Knoten in MongoDB & Neo4j
+    all_tags = set()
+    for game in games:
+        for tag in game["tag_names"]:
+            all_tags.add(tag)
+
+    # Tags in MongoDB speichern
+    tags_docs = [{"_id": ObjectId(), "name": tag} for tag in all_tags]
+    if tags_docs:
+        await db["tags"].insert_many(tags_docs)
+    tag_map = {doc["name"]: str(doc["_id"]) for doc in tags_docs}
+    print(f"[OK] {len(tags_docs)} Tags in MongoDB erstellt")
+
+    await neo4j_service.bulk_create_nodes("Tag", tag_map.values())
+    await neo4j_service.bulk_create_relationships("TAGGED_WITH", (
+        (str(game["_id"]), tag_map[tag_name])
+        for game in games for tag_name in game["tag_names"]
+    ))
+
+    # OWNS-Beziehungen (aus Purchases)
+    await neo4j_service.bulk_create_relationships(
+        "OWNS", ((uid, gid) for uid, gid, _ in purchases_data)
+    )
+
+    # FRIENDS_WITH-Beziehungen
+    friendships = [
+        ("willalo", "invalidluca"),
+        ("willalo", "1401felix"),
+        ("1401felix", "ghostswetterZ"),
+        ("1401felix", "03oreo"),
+        ("invalidluca", "03oreo"),
+        ("ghostswetterZ", "03oreo"),
+    ]
+    await neo4j_service.bulk_create_relationships(
+        "FRIENDS_WITH", ((user_map[u1], user_map[u2]) for u1, u2 in friendships)
+    )
 
     print("[OK] Neo4j Graph aufgebaut")
+
+    await co_ownership_service.rebuild()
+    await tag_registry.load()
+    await tag_similarity_service.rebuild()
+    await buddy_index_service.rebuild()
+    await recommendation_batch_service.run()
     print("[DONE] Seed-Daten vollstaendig geladen!")
 
     return {
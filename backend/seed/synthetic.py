@@ -0,0 +1,236 @@
+"""
+Synthetischer Katalog-Generator für Last- und Skalierungstests.
+
+Erzeugt deterministisch (gleicher seed → gleiche Daten) einen großen
+Datenbestand mit Power-Law-Verteilungen:
+  - wenige Blockbuster-Spiele werden von sehr vielen Usern besessen
+  - wenige "Influencer" haben sehr viele Freunde
+
+Die Daten werden in Chunks erzeugt und direkt in MongoDB und Neo4j
+geschrieben – es liegt nie der komplette Datenbestand im Speicher.
+"""
+
+import random
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from config import get_db
+from services import (
+    neo4j_service, mongo_service, co_ownership_service, tag_registry, tag_similarity_service,
+    recommendation_batch_service, buddy_index_service,
+)
+from .seed_data import reset_databases
+
+CHUNK_SIZE = 5000
+REVIEW_RATE = 0.15          # Anteil der Käufe, zu denen eine Review geschrieben wird
+
+TAG_NAMES = [
+    "Action", "Adventure", "RPG", "Open World", "Shooter", "Multiplayer",
+    "Co-op", "Indie", "Strategy", "Simulation", "Platformer", "Horror",
+    "Survival", "Sandbox", "Puzzle", "Racing", "Sports", "Fighting",
+    "Souls-like", "Metroidvania", "Roguelike", "Story Rich", "Casual",
+    "Pixel Art", "Sci-Fi", "Fantasy", "Stealth", "Tactical", "MMO", "Cozy",
+]
+PLATFORMS = ["PC", "PS5", "Xbox", "Switch"]
+PRICES = [0.00, 4.99, 9.99, 14.99, 19.99, 29.99, 39.99, 49.99, 59.99, 69.99]
+
+# Präfixe für deterministische ObjectIds (Typ + laufende Nummer)
+_KIND_PUBLISHER, _KIND_GAME, _KIND_USER, _KIND_TAG, _KIND_PURCHASE, _KIND_REVIEW = range(1, 7)
+
+_BASE_DATE = datetime(2026, 1, 1)
+
+
+# ──────────────────────────────────────────
+# Hilfsfunktionen
+# ──────────────────────────────────────────
+
+def _oid(kind: int, i: int) -> ObjectId:
+    return ObjectId(f"{kind:08x}{i:016x}")
+
+
+def _rng(seed: int, kind: str, i: int) -> random.Random:
+    """Eigener Zufallsgenerator pro Entität → Reihenfolge-unabhängig reproduzierbar."""
+    return random.Random(f"{seed}:{kind}:{i}")
+
+
+def _zipf_cum_weights(n: int, exponent: float = 1.0) -> list[float]:
+    """Kumulative Zipf-Gewichte: Rang 0 ist am beliebtesten."""
+    cum, total = [], 0.0
+    for rank in range(n):
+        total += 1.0 / (rank + 1) ** exponent
+        cum.append(total)
+    return cum
+
+
+def _sample_zipf(rng: random.Random, cum: list[float], k: int) -> set[int]:
+    """Zieht bis zu k verschiedene Indizes gemäß der kumulativen Gewichte."""
+    k = min(k, len(cum))
+    picked = set()
+    # Bei sehr kleinen Katalogen nicht endlos nach neuen Indizes suchen
+    for _ in range(k * 4):
+        picked.add(bisect_left(cum, rng.random() * cum[-1]))
+        if len(picked) >= k:
+            break
+    return picked
+
+
+def _power_law(rng: random.Random, mean: float, alpha: float) -> int:
+    """Ganzzahlige Pareto-verteilte Größe mit ungefähr dem gewünschten Mittelwert."""
+    scale = mean * (alpha - 1) / alpha
+    return int(rng.paretovariate(alpha) * scale)
+
+
+def _created_at(rng: random.Random) -> datetime:
+    return _BASE_DATE - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+
+
+# ──────────────────────────────────────────
+# Generator
+# ──────────────────────────────────────────
+
+async def seed_synthetic(users: int = 1000, games: int = 500, avg_friends: int = 10,
+                         avg_games: int = 20, seed: int = 42) -> dict:
+    """
+    Befüllt beide Datenbanken mit einem synthetischen Katalog.
+
+    users / games:  Anzahl User bzw. Spiele
+    avg_friends:    durchschnittliche Anzahl Freunde pro User
+    avg_games:      durchschnittliche Bibliotheksgröße pro User
+    seed:           gleicher seed → identische Daten
+    """
+    db = get_db()
+    await reset_databases()
+
+    counts = {"publishers": 0, "games": 0, "users": 0, "purchases": 0,
+              "reviews": 0, "friendships": 0, "tags": 0}
+
+    # ── 1. Tags ──────────────────────────────
+    tag_ids = [str(_oid(_KIND_TAG, i)) for i in range(len(TAG_NAMES))]
+    await db["tags"].insert_many(
+        [{"_id": _oid(_KIND_TAG, i), "name": name} for i, name in enumerate(TAG_NAMES)]
+    )
+    await neo4j_service.bulk_create_nodes("Tag", tag_ids)
+    counts["tags"] = len(TAG_NAMES)
+    tag_cum = _zipf_cum_weights(len(TAG_NAMES))
+
+    # ── 2. Publishers ────────────────────────
+    publisher_count = max(1, games // 50)
+    await db["publishers"].insert_many([
+        {"_id": _oid(_KIND_PUBLISHER, i), "name": f"Synthetic Publisher {i}",
+         "description": "Generierter Publisher für Lasttests",
+         "founded_year": _rng(seed, "publisher", i).randint(1975, 2020),
+         "country": _rng(seed, "publisher", i).choice(["USA", "Japan", "Deutschland", "Polen", "Schweden"])}
+        for i in range(publisher_count)
+    ])
+    counts["publishers"] = publisher_count
+    publisher_cum = _zipf_cum_weights(publisher_count)
+
+    # ── 3. Games (chunkweise) ────────────────
+    # Nur Preis und "Qualität" pro Spiel bleiben im Speicher (für Käufe/Reviews)
+    game_prices: list[float] = []
+    game_quality: list[float] = []
+    for start in range(0, games, CHUNK_SIZE):
+        docs, tagged = [], []
+        for i in range(start, min(start + CHUNK_SIZE, games)):
+            rng = _rng(seed, "game", i)
+            gid = _oid(_KIND_GAME, i)
+            price = rng.choice(PRICES)
+            tags = sorted(_sample_zipf(rng, tag_cum, rng.randint(2, 5)))
+            publisher = bisect_left(publisher_cum, rng.random() * publisher_cum[-1])
+            docs.append({
+                "_id": gid, "title": f"Synthetic Game {i}",
+                "description": "Generiertes Spiel für Lasttests.",
+                "price": price, "release_date": _created_at(rng).date().isoformat(),
+                "publisher_id": str(_oid(_KIND_PUBLISHER, publisher)),
+                "cover_url": None, "screenshots": [],
+                "platforms": sorted(rng.sample(PLATFORMS, rng.randint(1, len(PLATFORMS)))),
+                "min_requirements": None,
+                "tag_names": [TAG_NAMES[t] for t in tags],
+                "created_at": _created_at(rng),
+            })
+            tagged.extend((str(gid), tag_ids[t]) for t in tags)
+            game_prices.append(price)
+            game_quality.append(rng.uniform(2.0, 4.8))
+        await db["games"].insert_many(
+            [mongo_service.to_storage_refs("games", d) for d in docs], ordered=False)
+        await neo4j_service.bulk_create_nodes("Game", (str(d["_id"]) for d in docs))
+        await neo4j_service.bulk_create_relationships("TAGGED_WITH", tagged)
+        counts["games"] += len(docs)
+    print(f"[OK] {counts['games']} synthetische Spiele erstellt")
+
+    # ── 4. Users (chunkweise) ────────────────
+    for start in range(0, users, CHUNK_SIZE):
+        docs = []
+        for i in range(start, min(start + CHUNK_SIZE, users)):
+            rng = _rng(seed, "user", i)
+            docs.append({
+                "_id": _oid(_KIND_USER, i), "username": f"player{i}",
+                "email": f"player{i}@example.com", "display_name": f"Player {i}",
+                "wallet_balance": round(rng.uniform(0, 200), 2),
+                "avatar_url": None, "created_at": _created_at(rng),
+            })
+        await db["users"].insert_many(docs, ordered=False)
+        await neo4j_service.bulk_create_nodes("User", (str(d["_id"]) for d in docs))
+        counts["users"] += len(docs)
+    print(f"[OK] {counts['users']} synthetische User erstellt")
+
+    # ── 5. Bibliotheken, Käufe, Reviews, Freundschaften ──
+    # Erst jetzt, da alle User-Knoten existieren (Freunde können in späteren Chunks liegen)
+    game_cum = _zipf_cum_weights(games)
+    user_cum = _zipf_cum_weights(users)
+    purchase_no = review_no = 0
+    for start in range(0, users, CHUNK_SIZE):
+        purchases, reviews, owns, friends = [], [], [], []
+        for i in range(start, min(start + CHUNK_SIZE, users)):
+            rng = _rng(seed, "library", i)
+            uid = str(_oid(_KIND_USER, i))
+
+            library = _sample_zipf(rng, game_cum, max(1, _power_law(rng, avg_games, 1.5)))
+            for g in sorted(library):
+                gid = str(_oid(_KIND_GAME, g))
+                created_at = _created_at(rng)
+                purchases.append({
+                    "_id": _oid(_KIND_PURCHASE, purchase_no), "user_id": uid, "game_id": gid,
+                    "price_paid": game_prices[g], "created_at": created_at,
+                })
+                purchase_no += 1
+                owns.append((uid, gid))
+                if rng.random() < REVIEW_RATE:
+                    rating = min(5, max(1, round(rng.gauss(game_quality[g], 1.0))))
+                    reviews.append({
+                        "_id": _oid(_KIND_REVIEW, review_no), "user_id": uid, "game_id": gid,
+                        "rating": rating, "text": None, "recommended": rating >= 4,
+                        "playtime_hours": round(rng.expovariate(1 / 40), 1),
+                        "created_at": created_at + timedelta(days=rng.randint(1, 60)),
+                    })
+                    review_no += 1
+
+            # Jeder User "initiiert" im Schnitt avg_friends/2 Kanten → Grad ≈ avg_friends
+            out_degree = _power_law(rng, avg_friends / 2, 2.0)
+            for f in _sample_zipf(rng, user_cum, out_degree):
+                if f != i:
+                    friends.append((uid, str(_oid(_KIND_USER, f))))
+
+        if purchases:
+            await db["purchases"].insert_many(
+                [mongo_service.to_storage_refs("purchases", d) for d in purchases], ordered=False)
+        if reviews:
+            await db["reviews"].insert_many(
+                [mongo_service.to_storage_refs("reviews", d) for d in reviews], ordered=False)
+        await neo4j_service.bulk_create_relationships("OWNS", owns)
+        await neo4j_service.bulk_create_relationships("FRIENDS_WITH", friends)
+        counts["purchases"] += len(purchases)
+        counts["reviews"] += len(reviews)
+        counts["friendships"] += len(friends)
+        print(f"[OK] Beziehungen für User {start}–{min(start + CHUNK_SIZE, users) - 1} erstellt")
+
+    await mongo_service.rebuild_game_stats()
+    await mongo_service.rebuild_publisher_revenue()
+    await co_ownership_service.rebuild()
+    await tag_registry.load()
+    await tag_similarity_service.rebuild()
+    await buddy_index_service.rebuild()
+    await recommendation_batch_service.run()
+    print("[DONE] Synthetischer Katalog vollstaendig geladen!")
+    return counts
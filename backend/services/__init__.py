@@ -1,3 +1,19 @@
+from . import metrics
 from . import mongo_service
+from . import tag_registry
 from . import neo4j_service
+from . import recommendation_batch_service
 from . import integration_service
+from . import schema_service
+from . import co_ownership_service
+from . import buddy_index_service
+from . import tag_similarity_service
+from . import outbox_service
+from . import graph_projector
+from . import migration_service
+from . import purchase_service
+from . import game_import_service
+
+# Latenz-Histogramme pro Service-Funktion (siehe metrics.py)
+for _module in (mongo_service, neo4j_service, integration_service, purchase_service):
+    metrics.instrument(_module)
@@ -0,0 +1,277 @@
+"""
+Buddy-Index – ähnliche User über MinHash/LSH.
+
+find_gaming_buddies expandiert jedes Spiel des Users zu allen anderen
+Besitzern – bei Blockbustern praktisch die ganze User-Basis. Stattdessen:
+
+  - MinHash:  pro User eine Signatur aus NUM_PERM Hashfunktionen über
+              seine Bibliothek; P(Signaturen gleich) ≈ Jaccard-Ähnlichkeit
+  - LSH:      Signatur in BANDS Bänder zu je ROWS Werten zerlegt; User mit
+              einem gleichen Band landen im selben Bucket → Kandidaten
+  - Ranking:  exakte Jaccard-Ähnlichkeit nur für die Kandidaten,
+              Freunde (aktuell aus Neo4j) werden ausgeschlossen
+
+Der Index liegt nur im Speicher (Aufbau beim Start aus den OWNS-Kanten).
+Danach folgt jeder API-Prozess selbst den neuen Käufen in MongoDB – per
+Change Stream auf purchases/users (Replica Set) bzw. durch periodisches
+Nachladen neuer Käufe (Standalone). So sieht er auch Käufe, die ein anderer
+Prozess oder der Projektor verarbeitet hat; record_purchases ist eine
+Mengen-Vereinigung und verträgt doppelte Events. Gelöschte User verschwinden
+ohne Change Streams erst beim nächsten Rebuild.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import numpy as np
+
+from config import get_db, supports_transactions
+from services import neo4j_service, co_ownership_service
+
+NUM_PERM = 64
+BANDS = 32                      # Schwelle ≈ (1/BANDS)^(1/ROWS) ≈ 0.18
+ROWS = NUM_PERM // BANDS
+MAX_CANDIDATES = 2000           # obere Grenze für das exakte Nachranking
+_PRIME = (1 << 31) - 1          # Mersenne-Primzahl für h(x) = (a·x + b) mod p
+REFRESH_INTERVAL = 10           # Sekunden; Fallback ohne Change Streams
+# Käufe, die beim Aufbau evtl. noch nicht als OWNS-Kante in Neo4j standen
+CATCH_UP_SECONDS = 300
+
+_rng = np.random.default_rng(1)
+_hash_a = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.int64)
+_hash_b = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.int64)
+
+_game_codes: dict[str, int] = {}
+_game_ids: list[str] = []
+_libraries: dict[str, np.ndarray] = {}      # userId → sortierte Spiel-Codes
+_band_keys: dict[str, tuple] = {}           # userId → Bucket-Schlüssel pro Band
+_buckets: list[dict[int, set[str]]] = [{} for _ in range(BANDS)]
+_built = False
+_generation = 0                 # erhöht bei clear() – Spiel-Codes gelten nur bis dahin
+_follow_task: asyncio.Task | None = None
+
+
+# ──────────────────────────────────────────
+# MinHash / LSH
+# ──────────────────────────────────────────
+
+def _signature(library: np.ndarray) -> np.ndarray:
+    """Minimum jeder Hashfunktion über alle Spiel-Codes der Bibliothek."""
+    hashed = (np.outer(library.astype(np.int64), _hash_a) + _hash_b) % _PRIME
+    return hashed.min(axis=0)
+
+
+def _keys(library: np.ndarray) -> tuple:
+    signature = _signature(library)
+    return tuple(hash(signature[b * ROWS:(b + 1) * ROWS].tobytes()) for b in range(BANDS))
+
+
+def _insert(user_id: str, library: np.ndarray):
+    _libraries[user_id] = library
+    keys = _keys(library)
+    _band_keys[user_id] = keys
+    for band, key in enumerate(keys):
+        _buckets[band].setdefault(key, set()).add(user_id)
+
+
+def _remove(user_id: str):
+    _libraries.pop(user_id, None)
+    for band, key in enumerate(_band_keys.pop(user_id, ())):
+        bucket = _buckets[band].get(key)
+        if bucket is not None:
+            bucket.discard(user_id)
+            if not bucket:
+                del _buckets[band][key]
+
+
+def _game_code(game_id: str) -> int:
+    code = _game_codes.get(game_id)
+    if code is None:
+        code = _game_codes[game_id] = len(_game_ids)
+        _game_ids.append(game_id)
+    return code
+
+
+# ──────────────────────────────────────────
+# Lesen
+# ──────────────────────────────────────────
+
+def is_built() -> bool:
+    return _built
+
+
+async def find_buddies(user_id: str, limit: int = 5) -> list[dict]:
+    """
+    Gleiche Struktur wie neo4j_service.find_gaming_buddies (+ "similarity").
+
+    Ohne Index (oder für User ohne Bibliothek im Index) wird exakt in Neo4j gerechnet.
+    """
+    library = _libraries.get(user_id)
+    band_keys = _band_keys.get(user_id)
+    if not _built or library is None or band_keys is None:
+        return await neo4j_service.find_gaming_buddies(user_id, limit)
+
+    candidates = set()
+    for band, key in enumerate(band_keys):
+        candidates.update(_buckets[band].get(key, ()))
+        if len(candidates) >= MAX_CANDIDATES:
+            break
+    generation = _generation
+    excluded = set(await neo4j_service.get_user_friends(user_id))
+    if generation != _generation:
+        # Während des awaits neu aufgebaut – Spiel-Codes passen nicht mehr
+        return await neo4j_service.find_gaming_buddies(user_id, limit)
+    excluded.add(user_id)
+    candidates -= excluded
+
+    scored = []
+    for other in candidates:
+        other_library = _libraries.get(other)
+        if other_library is None:
+            continue    # während des awaits entfernt
+        shared = np.intersect1d(library, other_library, assume_unique=True)
+        union = len(library) + len(other_library) - len(shared)
+        scored.append((len(shared) / union, other, shared))
+    scored.sort(key=lambda s: (s[0], len(s[2])), reverse=True)
+
+    return [
+        {
+            "userId": other,
+            "commonGames": len(shared),
+            # Wie in Neo4j nur Beispiel-IDs; die Anzahl steht in commonGames
+            "sharedGameIds": [_game_ids[c] for c in shared[:neo4j_service.ID_SAMPLE]],
+            "similarity": round(similarity, 4),
+        }
+        for similarity, other, shared in scored[:limit]
+    ]
+
+
+def stats() -> dict:
+    return {
+        "built": _built, "users": len(_libraries), "games": len(_game_ids),
+        "buckets": sum(len(b) for b in _buckets),
+    }
+
+
+# ──────────────────────────────────────────
+# Aufbau + Pflege
+# ──────────────────────────────────────────
+
+def clear():
+    global _built, _generation
+    _generation += 1
+    _game_codes.clear()
+    _game_ids.clear()
+    _libraries.clear()
+    _band_keys.clear()
+    for bucket in _buckets:
+        bucket.clear()
+    _built = False
+
+
+async def rebuild() -> dict:
+    """Baut den Index komplett aus den OWNS-Kanten in Neo4j auf."""
+    global _built
+    matrix, user_ids, game_ids = await co_ownership_service.load_ownership_matrix()
+    clear()
+    for game_id in game_ids:
+        _game_code(game_id)
+    for row, user_id in enumerate(user_ids):
+        library = np.sort(matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]])
+        if len(library):
+            _insert(user_id, library)
+        if row % 10000 == 9999:
+            # Event-Loop zwischendurch freigeben (Aufbau läuft beim Start im Hintergrund)
+            await asyncio.sleep(0)
+    _built = True
+    print(f"[OK] Buddy-Index aufgebaut: {len(_libraries)} User, {len(_game_ids)} Spiele")
+    return stats()
+
+
+def record_purchases(pairs: list[tuple[str, str]]):
+    """Schreibt die Bibliotheken der Käufer fort (nach dem Anlegen der OWNS-Kanten)."""
+    if not _built:
+        return
+    added: dict[str, list[int]] = {}
+    for user_id, game_id in pairs:
+        added.setdefault(user_id, []).append(_game_code(game_id))
+    for user_id, codes in added.items():
+        library = np.union1d(_libraries.get(user_id, np.empty(0, dtype=np.int64)), codes)
+        _remove(user_id)
+        _insert(user_id, library)
+
+
+def remove_users(user_ids: list[str]):
+    for user_id in user_ids:
+        _remove(user_id)
+
+
+# ──────────────────────────────────────────
+# Änderungen aus MongoDB übernehmen
+# ──────────────────────────────────────────
+
+async def _catch_up(since: datetime) -> datetime:
+    """Übernimmt alle Käufe seit since (abzüglich Überlappung für Uhrenabweichungen)."""
+    db = get_db()
+    query = {"created_at": {"$gte": since - timedelta(seconds=REFRESH_INTERVAL)}}
+    pairs, latest = [], since
+    async for p in db["purchases"].find(query, {"user_id": 1, "game_id": 1, "created_at": 1}):
+        pairs.append((str(p["user_id"]), str(p["game_id"])))
+        latest = max(latest, p["created_at"])
+    record_purchases(pairs)
+    return latest
+
+
+async def _follow(since: datetime):
+    db = get_db()
+    pipeline = [{"$match": {"$or": [
+        {"ns.coll": "purchases", "operationType": "insert"},
+        {"ns.coll": "users", "operationType": "delete"},
+    ]}}]
+    while True:
+        try:
+            if not supports_transactions():
+                await asyncio.sleep(REFRESH_INTERVAL)
+                since = await _catch_up(since)
+                continue
+            async with db.watch(pipeline) as stream:
+                # Käufe zwischen Aufbau und Stream-Start nachholen
+                since = await _catch_up(since)
+                async for change in stream:
+                    if change["ns"]["coll"] == "purchases":
+                        doc = change["fullDocument"]
+                        record_purchases([(str(doc["user_id"]), str(doc["game_id"]))])
+                    else:
+                        remove_users([str(change["documentKey"]["_id"])])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WARN] Buddy-Index: Änderungsstrom unterbrochen ({e})")
+            await asyncio.sleep(REFRESH_INTERVAL)
+
+
+async def _run():
+    # Bis der Index steht, wird exakt in Neo4j gerechnet
+    started_at = datetime.utcnow() - timedelta(seconds=CATCH_UP_SECONDS)
+    try:
+        await rebuild()
+    except Exception as e:
+        print(f"[ERROR] Buddy-Index konnte nicht aufgebaut werden: {e}")
+        return
+    await _follow(started_at)
+
+
+def start():
+    """Baut den Index im Hintergrund auf und folgt danach den Käufen (API-Prozess)."""
+    global _follow_task
+    _follow_task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _follow_task
+    if _follow_task:
+        _follow_task.cancel()
+        try:
+            await _follow_task
+        except asyncio.CancelledError:
+            pass
+        _follow_task = None
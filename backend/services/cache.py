@@ -0,0 +1,65 @@
+"""
+In-Process-Cache mit LRU-Verdrängung und TTL.
+
+Bewusst ohne Locks: FastAPI/asyncio läuft in einem Thread, zwischen
+zwei awaits kann niemand anders auf den Cache zugreifen.
+"""
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU-Cache mit Größenlimit und Ablaufzeit pro Eintrag."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Wird bei jeder Invalidierung erhöht, siehe set()
+        self.generation = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, generation: int = None):
+        """
+        Speichert value unter key.
+
+        generation: Stand von self.generation VOR dem Datenbankzugriff.
+        Wurde zwischenzeitlich invalidiert, wird der (evtl. veraltete)
+        Wert verworfen.
+        """
+        if self.maxsize <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self.generation += 1
+        self._data.pop(key, None)
+
+    def clear(self):
+        self.generation += 1
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses}
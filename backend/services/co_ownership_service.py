@@ -0,0 +1,327 @@
+"""
+Co-Ownership Service – vorberechnetes "Spieler kauften auch...".
+
+Statt bei jeder Anfrage alle Besitzer eines Spiels und deren übrige Spiele
+in Neo4j zu traversieren, wird einmal aus allen OWNS-Kanten eine
+dünnbesetzte User×Game-Matrix A gebaut. Das Produkt Aᵀ·A enthält für jedes
+Spielpaar die Anzahl gemeinsamer Besitzer; pro Spiel werden die Top-K
+Nachbarn gespeichert.
+
+  - In-Memory-Map:   gameId → Nachbarliste (Lesepfad, konstante Zeit)
+  - MongoDB:         Collection "also_bought" (maßgeblicher Stand)
+  - Inkrementell:    record_purchase() nach jedem Kauf, vorher per
+                     claim_purchases() gegen doppeltes Einrechnen geprüft
+
+Geschrieben wird nur in MongoDB – vom Outbox-Worker irgendeines API-Prozesses
+oder vom separaten Projektor. Jeder API-Prozess lädt beim Start und folgt
+danach "also_bought" per Change Stream (Replica Set) bzw. durch periodisches
+Nachladen geänderter Dokumente (Standalone), wie die Tag-Registry.
+
+Die inkrementelle Pflege ist exakt für Paare, die bereits in der Liste
+stehen. Paare außerhalb der gespeicherten Nachbarn werden genähert
+(Start bei 1); rebuild() stellt den exakten Stand wieder her.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import numpy as np
+from scipy import sparse
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import get_db, get_session, supports_transactions
+from services import neo4j_service, metrics
+
+TOP_K = 20                      # gespeicherte Nachbarn pro Spiel
+STORE_K = TOP_K * 2             # mit Reserve für inkrementelle Updates
+OWNER_SAMPLE = 5                # gespeicherte Beispiel-Besitzer pro Paar (für die UI)
+_ROW_BLOCK = 1000               # Spiele pro Block beim Matrixprodukt
+_WRITE_BATCH = 1000
+_DUPLICATE_KEY = 11000
+REFRESH_INTERVAL = 10           # Sekunden; Fallback ohne Change Streams
+
+# gameId → [{"gameId", "commonOwners", "ownerIds"}], absteigend sortiert
+_neighbors: dict[str, list[dict]] = {}
+_built = False
+_follow_task: asyncio.Task | None = None
+
+
+# ──────────────────────────────────────────
+# Lesen
+# ──────────────────────────────────────────
+
+async def get_also_bought(game_id: str, limit: int = 5) -> list[dict]:
+    """
+    Gleiche Struktur wie neo4j_service.players_also_bought.
+
+    Solange noch nie gebaut wurde (oder limit > TOP_K), wird live in Neo4j gerechnet.
+    """
+    if not _built or limit > TOP_K:
+        return await neo4j_service.players_also_bought(game_id, limit)
+    return [
+        {**n, "ownerIds": list(n["ownerIds"])}
+        for n in _neighbors.get(game_id, [])[:limit]
+    ]
+
+
+async def load_from_mongo():
+    """Lädt die gespeicherten Nachbarlisten in den Speicher (beim Start)."""
+    global _built
+    db = get_db()
+    _neighbors.clear()
+    async for doc in db["also_bought"].find():
+        _neighbors[doc["_id"]] = doc["neighbors"]
+    _built = bool(_neighbors)
+    print(f"[OK] Co-Ownership geladen: {len(_neighbors)} Spiele")
+
+
+def clear():
+    """Verwirft den Speicherstand (z.B. beim Zurücksetzen der Datenbanken)."""
+    global _built
+    _neighbors.clear()
+    _built = False
+
+
+# ──────────────────────────────────────────
+# Änderungen anderer Prozesse übernehmen
+# ──────────────────────────────────────────
+
+async def _reload_changed(since: datetime) -> datetime:
+    """Lädt alle seit since geänderten Nachbarlisten nach (Standalone)."""
+    global _built
+    db = get_db()
+    latest = since
+    # Überlappung: updated_at stammt von der Uhr des schreibenden Prozesses
+    query = {"updated_at": {"$gte": since - timedelta(seconds=REFRESH_INTERVAL)}}
+    async for doc in db["also_bought"].find(query):
+        _neighbors[doc["_id"]] = doc["neighbors"]
+        latest = max(latest, doc["updated_at"])
+        _built = True
+    return latest
+
+
+async def _follow():
+    global _built
+    db = get_db()
+    since = datetime.utcnow()
+    while True:
+        try:
+            if not supports_transactions():
+                await asyncio.sleep(REFRESH_INTERVAL)
+                since = await _reload_changed(since)
+                continue
+            async with db["also_bought"].watch(full_document="updateLookup") as stream:
+                # Änderungen zwischen Laden und Stream-Start nachholen
+                since = await _reload_changed(since)
+                async for change in stream:
+                    if "documentKey" not in change:
+                        continue    # drop/invalidate – Stream endet danach
+                    game_id = change["documentKey"]["_id"]
+                    doc = change.get("fullDocument")
+                    if change["operationType"] == "delete":
+                        _neighbors.pop(game_id, None)
+                    elif doc:
+                        _neighbors[game_id] = doc["neighbors"]
+                        _built = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WARN] Co-Ownership: Änderungsstrom unterbrochen ({e})")
+            await asyncio.sleep(REFRESH_INTERVAL)
+
+
+async def start():
+    """Lädt den Speicherstand und folgt danach den Änderungen (API-Prozess)."""
+    global _follow_task
+    await load_from_mongo()
+    _follow_task = asyncio.create_task(_follow())
+
+
+async def stop():
+    global _follow_task
+    if _follow_task:
+        _follow_task.cancel()
+        try:
+            await _follow_task
+        except asyncio.CancelledError:
+            pass
+        _follow_task = None
+
+
+# ──────────────────────────────────────────
+# Bulk-Aufbau
+# ──────────────────────────────────────────
+
+async def load_ownership_matrix():
+    """Liest alle OWNS-Kanten und baut die dünnbesetzte User×Game-Matrix."""
+    user_index: dict[str, int] = {}
+    game_index: dict[str, int] = {}
+    rows, cols = [], []
+
+    async def read_edges(tx):
+        # Beim Wiederholen der Transaktion von vorn beginnen
+        user_index.clear(), game_index.clear(), rows.clear(), cols.clear()
+        metrics.count_round_trip("neo4j")
+        result = await tx.run(
+            "MATCH (u:User)-[:OWNS]->(g:Game) RETURN u.userId AS userId, g.gameId AS gameId"
+        )
+        async for record in result:
+            rows.append(user_index.setdefault(record["userId"], len(user_index)))
+            cols.append(game_index.setdefault(record["gameId"], len(game_index)))
+
+    async with get_session(read=True) as session:
+        await session.execute_read(read_edges)
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(user_index), len(game_index))
+    )
+    # Doppelte Kanten zählen nur einmal
+    matrix.data[:] = 1
+    return matrix, list(user_index), list(game_index)
+
+
+def _top_neighbors(matrix, user_ids: list[str], game_ids: list[str], top_k: int) -> dict:
+    """Berechnet Aᵀ·A blockweise und behält pro Spiel die top_k Nachbarn."""
+    by_game = matrix.tocsc()
+    transposed = matrix.T.tocsr()
+    result = {}
+    for block_start in range(0, len(game_ids), _ROW_BLOCK):
+        co_counts = (transposed[block_start:block_start + _ROW_BLOCK] @ matrix).tocsr()
+        for offset in range(co_counts.shape[0]):
+            g = block_start + offset
+            start, end = co_counts.indptr[offset], co_counts.indptr[offset + 1]
+            others = co_counts.indices[start:end]
+            counts = co_counts.data[start:end]
+            keep = others != g
+            others, counts = others[keep], counts[keep]
+            if len(others) > top_k:
+                top = np.argpartition(-counts, top_k)[:top_k]
+                others, counts = others[top], counts[top]
+            order = np.argsort(-counts, kind="stable")
+
+            owners_g = by_game.indices[by_game.indptr[g]:by_game.indptr[g + 1]]
+            neighbors = []
+            for h, count in zip(others[order], counts[order]):
+                owners_h = by_game.indices[by_game.indptr[h]:by_game.indptr[h + 1]]
+                sample = np.intersect1d(owners_g, owners_h, assume_unique=True)[:OWNER_SAMPLE]
+                neighbors.append({
+                    "gameId": game_ids[h],
+                    "commonOwners": int(count),
+                    "ownerIds": [user_ids[u] for u in sample],
+                })
+            if neighbors:
+                result[game_ids[g]] = neighbors
+    return result
+
+
+async def rebuild(top_k: int = STORE_K) -> dict:
+    """Baut den kompletten Co-Ownership-Speicher aus den OWNS-Kanten neu auf."""
+    global _built
+    db = get_db()
+    started_at = datetime.utcnow()
+
+    matrix, user_ids, game_ids = await load_ownership_matrix()
+    neighbors = _top_neighbors(matrix, user_ids, game_ids, top_k)
+
+    ops = [
+        ReplaceOne({"_id": gid}, {"neighbors": n, "updated_at": started_at}, upsert=True)
+        for gid, n in neighbors.items()
+    ]
+    for i in range(0, len(ops), _WRITE_BATCH):
+        await db["also_bought"].bulk_write(ops[i:i + _WRITE_BATCH], ordered=False)
+    await db["also_bought"].delete_many({"updated_at": {"$lt": started_at}})
+
+    _neighbors.clear()
+    _neighbors.update(neighbors)
+    _built = True
+    print(f"[OK] Co-Ownership neu berechnet: {len(neighbors)} Spiele, {matrix.nnz} OWNS-Kanten")
+    return {"games": len(neighbors), "ownerships": int(matrix.nnz), "users": len(user_ids)}
+
+
+# ──────────────────────────────────────────
+# Inkrementelle Pflege
+# ──────────────────────────────────────────
+
+async def claim_purchases(purchase_ids: list[str]) -> set[str]:
+    """
+    Markiert Käufe als eingerechnet und gibt die zurück, die es noch nicht waren.
+
+    Outbox-Worker und Projektor wenden Batches nach Fehlern bzw. Neustarts
+    erneut an – ohne diese Prüfung würden commonOwners doppelt gezählt.
+    Die Marker in "co_ownership_applied" verfallen per TTL-Index.
+    """
+    if not purchase_ids:
+        return set()
+    db = get_db()
+    now = datetime.utcnow()
+    try:
+        await db["co_ownership_applied"].insert_many(
+            [{"_id": pid, "applied_at": now} for pid in purchase_ids], ordered=False
+        )
+    except BulkWriteError as e:
+        errors = e.details["writeErrors"]
+        if any(err["code"] != _DUPLICATE_KEY for err in errors):
+            raise
+        return set(purchase_ids) - {purchase_ids[err["index"]] for err in errors}
+    return set(purchase_ids)
+
+
+def _bump_ops(game_id: str, other_ids: list[str], user_id: str, now: datetime) -> list:
+    """
+    Zwei Updates pro Spiel: Zähler erhöhen bzw. neue Nachbarn anhängen (eine
+    Update-Pipeline, atomar im Dokument), danach sortieren und kürzen.
+    """
+    new = [{"gameId": other, "commonOwners": 1, "ownerIds": [user_id]} for other in other_ids]
+    neighbors = {"$let": {
+        "vars": {"current": {"$ifNull": ["$neighbors", []]}},
+        "in": {"$concatArrays": [
+            {"$map": {"input": "$$current", "as": "n", "in": {"$cond": [
+                {"$in": ["$$n.gameId", {"$literal": other_ids}]},
+                {"$mergeObjects": ["$$n", {
+                    "commonOwners": {"$add": ["$$n.commonOwners", 1]},
+                    "ownerIds": {"$slice": [
+                        {"$concatArrays": ["$$n.ownerIds", {"$literal": [user_id]}]}, OWNER_SAMPLE
+                    ]},
+                }]},
+                "$$n",
+            ]}}},
+            {"$filter": {"input": {"$literal": new}, "as": "e",
+                         "cond": {"$not": [{"$in": ["$$e.gameId", "$$current.gameId"]}]}}},
+        ]},
+    }}
+    return [
+        UpdateOne({"_id": game_id}, [{"$set": {"neighbors": neighbors, "updated_at": now}}],
+                  upsert=True),
+        UpdateOne({"_id": game_id}, {"$push": {"neighbors": {
+            "$each": [], "$sort": {"commonOwners": -1}, "$slice": STORE_K,
+        }}}),
+    ]
+
+
+async def _is_built() -> bool:
+    """Gebaut in diesem Prozess – oder (Projektor, ohne Speicherstand) in MongoDB."""
+    if _built:
+        return True
+    db = get_db()
+    return await db["also_bought"].find_one({}, {"_id": 1}) is not None
+
+
+async def record_purchase(user_id: str, game_id: str, library: list[str]):
+    """
+    Schreibt die Nachbarlisten nach einem Kauf in MongoDB fort.
+
+    library: Spiele, die der User VOR diesem Kauf besaß.
+    Parallele Worker überschreiben sich nicht (Update-Pipeline statt Replace);
+    der Speicher der API-Prozesse folgt über _follow().
+    """
+    others = [gid for gid in library if gid != game_id]
+    if not others or not await _is_built():
+        return
+    db = get_db()
+    now = datetime.utcnow()
+    ops = _bump_ops(game_id, others, user_id, now)
+    for other in others:
+        ops += _bump_ops(other, [game_id], user_id, now)
+    # ordered: Sortieren erst nach dem Hochzählen desselben Spiels
+    await db["also_bought"].bulk_write(ops, ordered=True)
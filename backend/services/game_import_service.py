@@ -0,0 +1,165 @@
+"""
+Game-Import-Service – Bulk-Anlage von Spielen (z.B. Publisher-Feeds).
+
+Statt pro Spiel create_one + find_one/insert_one pro Tag + Cypher pro Tag
+wird chunkweise gearbeitet:
+  1. Validierung gegen GameCreate (Fehler pro Eintrag, Rest läuft weiter)
+  2. Tag-Namen über die Tag-Registry auflösen; nur unbekannte Namen
+     gehen per $in-Query + Upserts an MongoDB
+  3. Spiele per insert_many anlegen, Outbox-Aufträge per insert_many
+     (in einer Transaktion, sofern verfügbar); Schreibfehler werden pro
+     Eintrag aus BulkWriteError.details["writeErrors"] gemeldet
+  4. Knoten + TAGGED_WITH schreibt der Outbox-Worker per UNWIND
+"""
+
+import asyncio
+from typing import AsyncIterable
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from config import supports_transactions
+from models.schemas import GameCreate
+from services import mongo_service, outbox_service, tag_registry, tag_similarity_service
+
+CHUNK_SIZE = 1000
+ENQUEUE_ATTEMPTS = 3            # Standalone: Outbox-Aufträge nach erfolgreichem Insert
+# Ab so vielen neuen Spielen wird die Tag-Ähnlichkeit komplett neu berechnet
+# statt Spiel für Spiel fortgeschrieben
+SIMILARITY_REBUILD_THRESHOLD = 200
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'item'}: {err['msg']}" for err in e.errors()
+    )
+
+
+def _write_errors(e: BulkWriteError, positions: list[int]) -> dict[int, str]:
+    """Position im Chunk → Fehlermeldung (writeErrors-Index = Position in insert_many)."""
+    return {positions[err["index"]]: err.get("errmsg", "Schreibfehler")
+            for err in e.details.get("writeErrors", [])}
+
+
+def _create_game_payloads(docs: list[dict], tag_ids: dict) -> list[dict]:
+    return [{"gameId": str(d["_id"]),
+             "tagIds": [tag_ids[n] for n in d["tag_names"] if n in tag_ids]} for d in docs]
+
+
+async def _insert_in_transaction(games: list[dict], tag_ids: dict):
+    """
+    Replica Set: Spiele und Outbox-Aufträge in einer Transaktion.
+
+    Ein Schreibfehler bricht die ganze Transaktion ab – dann ohne die
+    fehlerhaften Einträge wiederholen. Rückgabe: (angelegte Dokumente, Fehler).
+    """
+    pending = list(range(len(games)))
+    failed: dict[int, str] = {}
+    while pending:
+        async def write(session):
+            # Frische Kopien pro Versuch – create_many ergänzt die Dokumente
+            docs = [dict(games[p]) for p in pending]
+            await mongo_service.create_many("games", docs, session=session)
+            await outbox_service.enqueue_many(
+                "create_game", _create_game_payloads(docs, tag_ids), session=session
+            )
+            return docs
+
+        try:
+            docs = await mongo_service.run_transaction(write)
+        except BulkWriteError as e:
+            errors = _write_errors(e, pending)
+            if not errors:
+                raise
+            failed.update(errors)
+            pending = [p for p in pending if p not in errors]
+            continue
+        return dict(zip(pending, docs)), failed
+    return {}, failed
+
+
+async def _insert_standalone(games: list[dict], tag_ids: dict):
+    """
+    Standalone: insert_many (ordered=False) legt alle übrigen Spiele an, auch
+    wenn einzelne scheitern; für genau diese folgen die Outbox-Aufträge.
+    Lassen die sich nicht schreiben, werden die Spiele wieder gelöscht –
+    sonst kämen sie nie in den Graphen. Rückgabe: (angelegte Dokumente, Fehler).
+    """
+    docs = [dict(g) for g in games]
+    failed: dict[int, str] = {}
+    try:
+        await mongo_service.create_many("games", docs)
+    except BulkWriteError as e:
+        failed = _write_errors(e, list(range(len(docs))))
+        if not failed:
+            raise
+    created = {p: d for p, d in enumerate(docs) if p not in failed}
+
+    for attempt in range(ENQUEUE_ATTEMPTS):
+        try:
+            await outbox_service.enqueue_many(
+                "create_game", _create_game_payloads(list(created.values()), tag_ids)
+            )
+            return created, failed
+        except Exception as e:
+            error = e
+            if attempt + 1 < ENQUEUE_ATTEMPTS:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+    await mongo_service.delete_many("games", [str(d["_id"]) for d in created.values()])
+    failed.update({p: f"Outbox-Auftrag fehlgeschlagen: {error}" for p in created})
+    return {}, failed
+
+
+async def _import_chunk(chunk: list[tuple[int, GameCreate]], report: dict):
+    # _id vorab vergeben: bleibt über wiederholte Transaktionen hinweg gleich
+    games = [{"_id": ObjectId(), **game.model_dump()} for _, game in chunk]
+    tag_ids = await tag_registry.ensure(n for g in games for n in g["tag_names"])
+    insert = _insert_in_transaction if supports_transactions() else _insert_standalone
+    try:
+        created, failed = await insert(games, tag_ids)
+    except Exception as e:
+        # Kein Schreibfehler einzelner Einträge (z.B. Verbindung weg) → ganzer Chunk
+        report["errors"].extend({"index": i, "error": str(e)} for i, _ in chunk)
+        return
+    report["errors"].extend({"index": chunk[p][0], "error": msg} for p, msg in failed.items())
+    report["created"].extend({"index": chunk[p][0], "_id": str(d["_id"])}
+                             for p, d in sorted(created.items()))
+    report["_games"].extend((str(d["_id"]), d["tag_names"]) for d in created.values())
+
+
+async def import_games(items: AsyncIterable[tuple[int, dict | Exception]]) -> dict:
+    """
+    Legt alle gültigen Spiele an.
+
+    items: (Index, Rohdaten) – oder (Index, Exception), falls schon das
+    Parsen der Zeile fehlgeschlagen ist.
+    Rückgabe: {"created": [{index, _id}], "errors": [{index, error}]}
+    """
+    report = {"created": [], "errors": [], "_games": []}
+    chunk: list[tuple[int, GameCreate]] = []
+    async for index, raw in items:
+        if isinstance(raw, Exception):
+            report["errors"].append({"index": index, "error": str(raw)})
+            continue
+        try:
+            chunk.append((index, GameCreate.model_validate(raw)))
+        except ValidationError as e:
+            report["errors"].append({"index": index, "error": _validation_message(e)})
+            continue
+        if len(chunk) >= CHUNK_SIZE:
+            await _import_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        await _import_chunk(chunk, report)
+
+    outbox_service.notify()
+    games = report.pop("_games")
+    # Beides läuft im Hintergrund-Worker, nicht im Request
+    if len(games) >= SIMILARITY_REBUILD_THRESHOLD:
+        await tag_similarity_service.schedule_rebuild()
+    else:
+        await tag_similarity_service.schedule_updates(games)
+    report["errors"].sort(key=lambda e: e["index"])
+    print(f"[OK] Bulk-Import: {len(report['created'])} Spiele angelegt, "
+          f"{len(report['errors'])} Fehler")
+    return report
@@ -0,0 +1,310 @@
+"""
+Graph-Projektor – hält Neo4j über MongoDB Change Streams aktuell.
+
+Alternative zur Outbox (GRAPH_SYNC_MODE=changestream): Die Routen schreiben
+nur noch in MongoDB, ein eigener Prozess (backend/projector.py) liest die
+Änderungen an users, games, purchases und tags mit und projiziert sie in
+den Graphen:
+
+  users      insert/replace → (:User)         delete → DETACH DELETE
+  games      insert/replace/tag_names geändert → (:Game)-[:TAGGED_WITH]->(:Tag)
+             delete → DETACH DELETE
+  tags       insert/replace → (:Tag)          delete → DETACH DELETE
+  purchases  insert/replace → OWNS            delete → OWNS entfernen (Pre-Image)
+             + Co-Ownership und Empfehlungen in MongoDB (die API-Prozesse
+             übernehmen die Änderungen von dort in ihre Speicherstände)
+
+Bursts werden zu Batches zusammengefasst (pro Dokument gilt die letzte
+Änderung) und per UNWIND in wenigen Transaktionen geschrieben. Nach jedem
+Batch wird das Resume-Token in "projector_state" gespeichert – nach einem
+Neustart geht es genau dort weiter. Alle Schreibvorgänge sind idempotent
+(Co-Ownership zählt jeden Kauf nur einmal, siehe apply_ownerships).
+
+Schlägt ein Batch fehl, wird bei vorübergehenden Fehlern (Neo4j nicht
+erreichbar, Deadlock, MongoDB-Failover) mit exponentiellem Backoff
+wiederholt. Nach MAX_ATTEMPTS bzw. bei dauerhaften Fehlern (z.B. kaputtes
+Dokument) landen die betroffenen Änderungen in "projector_dead" und das
+Token rückt trotzdem weiter – sonst hinge der Projektor nach jedem Neustart
+an derselben Stelle fest.
+
+Change Streams setzen ein Replica Set voraus.
+"""
+
+import asyncio
+from datetime import datetime
+from neo4j.exceptions import DriverError, Neo4jError
+from pymongo.errors import ConnectionFailure, OperationFailure, PyMongoError
+
+from config import get_db
+from services import neo4j_service, outbox_service
+
+WATCHED_COLLECTIONS = ["users", "games", "purchases", "tags"]
+MAX_BATCH = 1000                # Events pro Neo4j-Batch
+BATCH_WINDOW = 0.2              # Sekunden, die nach dem ersten Event gesammelt wird
+MAX_AWAIT_MS = 1000             # Long-Polling des Change Streams
+IDLE_SAVE_INTERVAL = 60         # Sekunden: Token auch ohne relevante Events sichern
+MAX_ATTEMPTS = 10               # Versuche pro Batch, danach → projector_dead
+MAX_BACKOFF_SECONDS = 300
+
+# Code 286: Resume-Token liegt nicht mehr im Oplog
+_CHANGE_STREAM_HISTORY_LOST = 286
+
+_STATE_ID = "graph"
+
+
+# ──────────────────────────────────────────
+# Resume-Token
+# ──────────────────────────────────────────
+
+async def _load_token():
+    db = get_db()
+    state = await db["projector_state"].find_one({"_id": _STATE_ID})
+    return state.get("token") if state else None
+
+
+async def _save_token(token, events: int = 0):
+    db = get_db()
+    update = {"$set": {"token": token, "updated_at": datetime.utcnow()}}
+    if events:
+        update["$inc"] = {"events_total": events}
+        update["$set"]["last_batch_at"] = datetime.utcnow()
+    await db["projector_state"].update_one({"_id": _STATE_ID}, update, upsert=True)
+
+
+async def get_status() -> dict:
+    """Stand des Projektors (für die API, die in einem anderen Prozess läuft)."""
+    db = get_db()
+    state = await db["projector_state"].find_one({"_id": _STATE_ID}, {"token": 0}) or {}
+    return {
+        "events_total": state.get("events_total", 0),
+        "last_batch_at": state.get("last_batch_at"),
+        "updated_at": state.get("updated_at"),
+        "dead": await db["projector_dead"].count_documents({}),
+    }
+
+
+# ──────────────────────────────────────────
+# Batch anwenden
+# ──────────────────────────────────────────
+
+def _coalesce(batch: dict, change: dict):
+    """Fasst Events pro Dokument zusammen – die letzte Änderung gewinnt."""
+    coll = change["ns"]["coll"]
+    doc_id = str(change["documentKey"]["_id"])
+    op = change["operationType"]
+    previous = batch.pop((coll, doc_id), None)
+
+    if op == "delete":
+        entry = {"op": "delete", "before": change.get("fullDocumentBeforeChange")}
+        if previous and previous["op"] == "upsert" and previous.get("created"):
+            # Im selben Batch angelegt und wieder gelöscht
+            entry["before"] = entry["before"] or previous["doc"]
+    else:
+        doc = change.get("fullDocument")
+        if doc is None:
+            # Dokument wurde nach dem Update bereits wieder gelöscht – Delete-Event folgt
+            if previous:
+                batch[(coll, doc_id)] = previous
+            return
+        retag = op in ("insert", "replace") or "tag_names" in _touched_fields(change)
+        entry = {
+            "op": "upsert", "doc": doc,
+            "created": op in ("insert", "replace") or bool(previous and previous.get("created")),
+            "retag": retag or bool(previous and previous.get("retag")),
+        }
+    # Reihenfolge im dict = Reihenfolge der letzten Änderung (wichtig für OWNS)
+    batch[(coll, doc_id)] = entry
+
+
+def _touched_fields(change: dict) -> set:
+    desc = change.get("updateDescription") or {}
+    fields = set(desc.get("updatedFields", {})) | set(desc.get("removedFields", []))
+    return {f.split(".")[0] for f in fields}
+
+
+async def _tag_ids_by_name(names: set) -> dict:
+    if not names:
+        return {}
+    db = get_db()
+    return {t["name"]: str(t["_id"])
+            async for t in db["tags"].find({"name": {"$in": list(names)}}, {"name": 1})}
+
+
+async def _apply(batch: dict):
+    """Schreibt einen zusammengefassten Batch nach Neo4j (erst anlegen, dann löschen)."""
+    upserts: dict[str, list] = {c: [] for c in WATCHED_COLLECTIONS}
+    deletes: dict[str, list] = {c: [] for c in WATCHED_COLLECTIONS}
+    for (coll, doc_id), entry in batch.items():
+        (upserts if entry["op"] == "upsert" else deletes)[coll].append((doc_id, entry))
+
+    tag_ids = [doc_id for doc_id, e in upserts["tags"] if e["created"]]
+    if tag_ids:
+        await neo4j_service.bulk_create_nodes("Tag", tag_ids)
+
+    user_ids = [doc_id for doc_id, e in upserts["users"] if e["created"]]
+    if user_ids:
+        await neo4j_service.bulk_create_nodes("User", user_ids)
+
+    games = [(doc_id, e) for doc_id, e in upserts["games"] if e["retag"]]
+    if games:
+        names = {n for _, e in games for n in e["doc"].get("tag_names") or []}
+        by_name = await _tag_ids_by_name(names)
+        await neo4j_service.bulk_set_game_tags([
+            {"gameId": doc_id,
+             "tagIds": [by_name[n] for n in e["doc"].get("tag_names") or [] if n in by_name]}
+            for doc_id, e in games
+        ])
+
+    purchases = [(doc_id, e["doc"]) for doc_id, e in upserts["purchases"] if e["created"]]
+    if purchases:
+        # Nach einem Neustart ab dem letzten Token kommen Käufe erneut → purchase_ids
+        await outbox_service.apply_ownerships(
+            [(str(doc["user_id"]), str(doc["game_id"])) for _, doc in purchases],
+            [doc_id for doc_id, _ in purchases],
+        )
+
+    # Ohne Pre-Image (changeStreamPreAndPostImages aus) ist das Paar unbekannt
+    removed_owns = [(str(e["before"]["user_id"]), str(e["before"]["game_id"]))
+                    for _, e in deletes["purchases"] if e.get("before")]
+    if removed_owns:
+        await neo4j_service.bulk_delete_ownerships(removed_owns)
+
+    for coll, label in (("games", "Game"), ("users", "User"), ("tags", "Tag")):
+        ids = [doc_id for doc_id, _ in deletes[coll]]
+        if ids:
+            await neo4j_service.bulk_delete_nodes(label, ids)
+
+# ──────────────────────────────────────────
+# Fehlerbehandlung
+# ──────────────────────────────────────────
+
+def _is_transient(error: Exception) -> bool:
+    """Lohnt sich eine Wiederholung (Verbindung, Failover, Deadlock)?"""
+    if isinstance(error, (DriverError, Neo4jError)):
+        return error.is_retryable()
+    if isinstance(error, PyMongoError):
+        return isinstance(error, ConnectionFailure) or error.has_error_label("RetryableWriteError")
+    return False
+
+
+async def _apply_with_retry(batch: dict) -> Exception | None:
+    """Wendet den Batch an; gibt den letzten Fehler zurück, falls es nicht gelang."""
+    attempts = 0
+    while True:
+        try:
+            await _apply(batch)
+            return None
+        except Exception as e:
+            attempts += 1
+            if not _is_transient(e) or attempts >= MAX_ATTEMPTS:
+                return e
+            backoff = min(2 ** attempts, MAX_BACKOFF_SECONDS)
+            print(f"[RETRY] Projektor-Batch ({len(batch)} Änderungen, Versuch {attempts}) "
+                  f"in {backoff}s: {e}")
+            await asyncio.sleep(backoff)
+
+
+async def _dead_letter(batch: dict, error: Exception):
+    db = get_db()
+    now = datetime.utcnow()
+    await db["projector_dead"].insert_many([
+        {"coll": coll, "doc_id": doc_id, "change": entry, "error": str(error), "failed_at": now}
+        for (coll, doc_id), entry in batch.items()
+    ])
+    print(f"[ERROR] Projektor: {len(batch)} Änderungen nach projector_dead verschoben: {error}")
+
+
+async def _apply_or_dead_letter(batch: dict) -> int:
+    """
+    Wendet den Batch an; gibt die Anzahl der Änderungen zurück, die nach
+    projector_dead verschoben wurden.
+
+    Bei einem dauerhaften Fehler wird der Batch einzeln wiederholt, damit
+    eine kaputte Änderung nicht die übrigen mitnimmt.
+    """
+    error = await _apply_with_retry(batch)
+    if error is None:
+        return 0
+    if len(batch) > 1 and not _is_transient(error):
+        dead = 0
+        for key, entry in batch.items():
+            dead += await _apply_or_dead_letter({key: entry})
+        return dead
+    await _dead_letter(batch, error)
+    return len(batch)
+
+
+# ──────────────────────────────────────────
+# Hauptschleife
+# ──────────────────────────────────────────
+
+async def _enable_pre_images():
+    """Pre-Images für purchases, damit gelöschte Käufe ihre OWNS-Kante mitnehmen."""
+    db = get_db()
+    try:
+        await db.command("collMod", "purchases", changeStreamPreAndPostImages={"enabled": True})
+    except OperationFailure as e:
+        print(f"[WARN] Pre-Images für purchases nicht verfügbar: {e}")
+
+
+async def _next_batch(stream) -> dict:
+    """Sammelt Events, bis MAX_BATCH erreicht, das Zeitfenster vorbei oder der Stream leer ist."""
+    batch: dict = {}
+    deadline = None
+    loop = asyncio.get_running_loop()
+    while len(batch) < MAX_BATCH and stream.alive:
+        change = await stream.try_next()
+        if change is None:
+            break
+        _coalesce(batch, change)
+        if deadline is None:
+            deadline = loop.time() + BATCH_WINDOW
+        elif loop.time() >= deadline:
+            break
+    return batch
+
+
+async def run():
+    """Läuft, bis der Prozess beendet wird."""
+    db = get_db()
+    await _enable_pre_images()
+
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": WATCHED_COLLECTIONS},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+    }}]
+    token = await _load_token()
+    print(f"[OK] Graph-Projektor gestartet ({'Resume' if token else 'ab jetzt'})")
+    loop = asyncio.get_running_loop()
+    last_saved = loop.time()
+
+    while True:
+        try:
+            async with db.watch(
+                pipeline, full_document="updateLookup",
+                full_document_before_change="whenAvailable",
+                resume_after=token, max_await_time_ms=MAX_AWAIT_MS,
+            ) as stream:
+                while stream.alive:
+                    batch = await _next_batch(stream)
+                    if batch:
+                        dead = await _apply_or_dead_letter(batch)
+                        print(f"[OK] Projektor: {len(batch) - dead} Änderungen übernommen")
+                    elif stream.resume_token == token or loop.time() - last_saved < IDLE_SAVE_INTERVAL:
+                        continue
+                    # Auch ohne relevante Events weiterrücken, damit das Token im Oplog bleibt
+                    token = stream.resume_token
+                    await _save_token(token, len(batch))
+                    last_saved = loop.time()
+        except OperationFailure as e:
+            if e.code != _CHANGE_STREAM_HISTORY_LOST:
+                print(f"[RETRY] Change Stream abgebrochen: {e}")
+                await asyncio.sleep(1)
+                continue
+            print("[ERROR] Resume-Token nicht mehr im Oplog – starte ab jetzt. "
+                  "Graph ggf. per /api/seed bzw. Rebuild abgleichen.")
+            token = None
+        except PyMongoError as e:
+            # z.B. Failover: ab dem zuletzt gespeicherten Token weiter (idempotent)
+            print(f"[RETRY] Change Stream unterbrochen: {e}")
+            await asyncio.sleep(1)
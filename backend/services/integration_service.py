@@ -11,7 +11,54 @@ Dieses Zusammenspiel demonstriert den Mehrwert der Kombination
 beider Datenbanksysteme.
 """
 
-from services import mongo_service, neo4j_service
+import asyncio
+from typing import Iterable
+from services import (
+    mongo_service, neo4j_service, co_ownership_service, tag_registry, tag_similarity_service,
+    recommendation_batch_service, buddy_index_service,
+)
+
+
+# ──────────────────────────────────────────
+# Anreicherung: IDs → MongoDB-Dokumente
+# ──────────────────────────────────────────
+
+async def _fetch_details(*lookups: tuple[str, Iterable[str], str | None]) -> dict[str, dict]:
+    """
+    Lädt Details für mehrere (collection, ids, Projektion)-Anfragen parallel.
+
+    Anfragen an dieselbe Collection werden zusammengefasst (IDs dedupliziert,
+    Felder vereinigt), danach läuft pro Collection genau eine Abfrage –
+    alle gleichzeitig. Rückgabe: collection → {_id → Dokument}.
+    """
+    merged: dict[str, tuple[dict, set | None]] = {}
+    for collection, ids, projection in lookups:
+        fields = mongo_service.resolve_fields(collection, projection)
+        if collection in merged:
+            known_ids, known_fields = merged[collection]
+        else:
+            known_ids, known_fields = {}, set()
+        known_ids.update(dict.fromkeys(ids))
+        if known_fields is not None:
+            known_fields = None if fields is None else known_fields | set(fields)
+        merged[collection] = (known_ids, known_fields)
+
+    collections = [c for c, (ids, _) in merged.items() if ids]
+    results = await asyncio.gather(*(
+        mongo_service.get_many_by_ids(
+            c, list(merged[c][0]),
+            sorted(merged[c][1]) if merged[c][1] is not None else None
+        )
+        for c in collections
+    ))
+    details = {c: {} for c in merged}
+    for collection, docs in zip(collections, results):
+        details[collection] = {d["_id"]: d for d in docs}
+    return details
+
+
+def _display_name(profile: dict) -> str:
+    return profile.get("display_name", profile.get("username", "?"))
 
 
 async def get_friend_recommendations(user_id: str, limit: int = 10) -> list[dict]:
@@ -30,32 +77,26 @@ async def get_friend_recommendations(user_id: str, limit: int = 10) -> list[dict
       - MongoDB speichert die reichhaltigen Spiel-Dokumente mit allen
         Details, Bildern, Preisen etc. (Dokument-Stärke)
     """
-    # Schritt 1: Neo4j → Empfohlene Spiel-IDs + Graph-Metriken
-    recommendations = await neo4j_service.recommend_by_friends(user_id, limit)
+    # Schritt 1: Vorberechnete Liste (bzw. live aus Neo4j) → Spiel-IDs + Graph-Metriken
+    recommendations = await recommendation_batch_service.get_recommendations(user_id, limit)
 
     if not recommendations:
         return []
 
-    # Schritt 2: MongoDB → Vollständige Spiel-Details
-    game_ids = [r["gameId"] for r in recommendations]
-    game_details = await mongo_service.get_many_by_ids("games", game_ids)
-
-    # Freunde-Profildaten laden für die Begründung
-    all_friend_ids = set()
-    for r in recommendations:
-        all_friend_ids.update(r["friendIds"])
-    friend_profiles = await mongo_service.get_many_by_ids("users", list(all_friend_ids))
-    friend_map = {f["_id"]: f for f in friend_profiles}
+    # Schritt 2: MongoDB → Spiel-Details + Freunde-Namen (parallel)
+    details = await _fetch_details(
+        ("games", (r["gameId"] for r in recommendations), "recommendation"),
+        ("users", (fid for r in recommendations for fid in r["friendIds"]), "name-only"),
+    )
+    game_map, friend_map = details["games"], details["users"]
 
     # Schritt 3: Kombinieren
-    game_map = {g["_id"]: g for g in game_details}
-
     enriched = []
     for rec in recommendations:
         game = game_map.get(rec["gameId"])
         if game:
             friend_names = [
-                friend_map[fid].get("display_name", friend_map[fid].get("username", "?"))
+                _display_name(friend_map[fid])
                 for fid in rec["friendIds"] if fid in friend_map
             ]
             enriched.append({
@@ -75,25 +116,20 @@ async def get_also_bought_with_details(game_id: str, limit: int = 5) -> list[dic
     """
     Integrations-Use-Case 2: "Spieler kauften auch..."
 
-    Neo4j findet häufig zusammen besessene Spiele → MongoDB liefert Details.
+    Vorberechnete Co-Ownership (aus Neo4j-OWNS) → MongoDB liefert Details.
     """
-    # Schritt 1: Neo4j → Spiel-IDs die häufig zusammen besessen werden
-    also_bought = await neo4j_service.players_also_bought(game_id, limit)
+    # Schritt 1: Co-Ownership-Speicher → Spiel-IDs die häufig zusammen besessen werden
+    also_bought = await co_ownership_service.get_also_bought(game_id, limit)
 
     if not also_bought:
         return []
 
-    # Schritt 2: MongoDB → Spiel-Details
-    game_ids = [r["gameId"] for r in also_bought]
-    game_details = await mongo_service.get_many_by_ids("games", game_ids)
-    game_map = {g["_id"]: g for g in game_details}
-
-    # Besitzer-Profile laden für die UI
-    all_owner_ids = set()
-    for ab in also_bought:
-        all_owner_ids.update(ab.get("ownerIds", []))
-    owner_profiles = await mongo_service.get_many_by_ids("users", list(all_owner_ids))
-    owner_map = {p["_id"]: p for p in owner_profiles}
+    # Schritt 2: MongoDB → Spiel-Details + Besitzer-Namen (parallel)
+    details = await _fetch_details(
+        ("games", (ab["gameId"] for ab in also_bought), "recommendation"),
+        ("users", (oid for ab in also_bought for oid in ab.get("ownerIds", [])), "name-only"),
+    )
+    game_map, owner_map = details["games"], details["users"]
 
     # Schritt 3: Kombinieren
     enriched = []
@@ -101,7 +137,7 @@ async def get_also_bought_with_details(game_id: str, limit: int = 5) -> list[dic
         game = game_map.get(ab["gameId"])
         if game:
             owner_names = [
-                owner_map[oid].get("display_name", owner_map[oid].get("username", "?"))
+                _display_name(owner_map[oid])
                 for oid in ab.get("ownerIds", []) if oid in owner_map
             ]
             enriched.append({
@@ -113,27 +149,28 @@ async def get_also_bought_with_details(game_id: str, limit: int = 5) -> list[dic
     return enriched
 
 
-async def get_gaming_buddies_with_profiles(user_id: str, limit: int = 5) -> list[dict]:
+async def get_gaming_buddies_with_profiles(user_id: str, limit: int = 5,
+                                           exact: bool = False) -> list[dict]:
     """
     Potenzielle Gaming-Buddies mit Profildaten.
 
-    Neo4j findet User mit vielen gemeinsamen Spielen → MongoDB liefert Profile.
+    Buddy-Index (MinHash/LSH, genähert) bzw. Neo4j (exact=True) findet User
+    mit ähnlicher Bibliothek → MongoDB liefert Profile.
     """
-    buddies = await neo4j_service.find_gaming_buddies(user_id, limit)
+    if exact:
+        buddies = await neo4j_service.find_gaming_buddies(user_id, limit)
+    else:
+        buddies = await buddy_index_service.find_buddies(user_id, limit)
 
     if not buddies:
         return []
 
-    user_ids = [b["userId"] for b in buddies]
-    profiles = await mongo_service.get_many_by_ids("users", user_ids)
-    profile_map = {p["_id"]: p for p in profiles}
-
-    # Gemeinsame Spiele-Details laden
-    all_game_ids = set()
-    for b in buddies:
-        all_game_ids.update(b["sharedGameIds"])
-    games = await mongo_service.get_many_by_ids("games", list(all_game_ids))
-    game_map = {g["_id"]: g for g in games}
+    # Profile + Titel der gemeinsamen Spiele (parallel)
+    details = await _fetch_details(
+        ("users", (b["userId"] for b in buddies), "card"),
+        ("games", (gid for b in buddies for gid in b["sharedGameIds"]), "name-only"),
+    )
+    profile_map, game_map = details["users"], details["games"]
 
     enriched = []
     for b in buddies:
@@ -146,7 +183,8 @@ async def get_gaming_buddies_with_profiles(user_id: str, limit: int = 5) -> list
             enriched.append({
                 "profile": profile,
                 "common_games": b["commonGames"],
-                "shared_game_titles": shared_games
+                "shared_game_titles": shared_games,
+                "similarity": b.get("similarity")
             })
 
     return enriched
@@ -165,55 +203,45 @@ async def get_similar_games_with_details(game_id: str, limit: int = 5) -> list[d
 async def get_similar_games_by_tags_with_details(game_id: str, limit: int = 5) -> list[dict]:
     """
     Aehnliche Spiele basierend auf gemeinsamen Tags/Genres.
-    
-    Neo4j findet Spiele mit ueberschneidenden Tags → MongoDB liefert Details.
+
+    Vorberechnete TF-IDF-Nachbarn (seltene Tags wiegen mehr) → MongoDB liefert Details.
     """
-    similar = await neo4j_service.similar_games_by_tags(game_id, limit)
+    similar = await tag_similarity_service.get_similar(game_id, limit)
 
     if not similar:
         return []
 
-    game_ids = [r["gameId"] for r in similar]
-    game_details = await mongo_service.get_many_by_ids("games", game_ids)
-    game_map = {g["_id"]: g for g in game_details}
-
-    # Tag-Details laden
-    all_tag_ids = set()
-    for sim in similar:
-        all_tag_ids.update(sim["sharedTagIds"])
-    tag_details = await mongo_service.get_many_by_ids("tags", list(all_tag_ids))
-    tag_map = {t["_id"]: t.get("name", "Unknown") for t in tag_details}
+    # Spiel-Details aus MongoDB, Tag-Namen aus der Tag-Registry
+    details = await _fetch_details(("games", (r["gameId"] for r in similar), "recommendation"))
+    game_map = details["games"]
 
     enriched = []
     for sim in similar:
         game = game_map.get(sim["gameId"])
         if game:
-            shared_tags = [tag_map.get(tid, "?") for tid in sim["sharedTagIds"]]
+            shared_tags = [tag_registry.name_of(tid, "?") for tid in sim["sharedTagIds"]]
             enriched.append({
                 "game": game,
                 "common_tags": sim["commonTags"],
-                "shared_tags": shared_tags
+                "shared_tags": shared_tags,
+                "score": sim.get("score")
             })
 
     return enriched
 
 
-async def get_popular_tags_with_details(user_id: str) -> list[dict]:
+async def get_popular_tags_with_details(user_id: str, limit: int = 20) -> list[dict]:
     """
-    Beliebteste Tags im Freundeskreis, mit Namen aus MongoDB.
+    Beliebteste Tags im Freundeskreis, mit Namen aus der Tag-Registry.
     """
-    tags_stats = await neo4j_service.popular_tags_in_network(user_id)
+    tags_stats = await neo4j_service.popular_tags_in_network(user_id, limit)
     if not tags_stats:
         return []
 
-    tag_ids = [t["tagId"] for t in tags_stats]
-    tags_details = await mongo_service.get_many_by_ids("tags", tag_ids)
-    tag_map = {t["_id"]: t.get("name", "Unknown") for t in tags_details}
-
     enriched = []
     for stat in tags_stats:
         enriched.append({
-            "tag": tag_map.get(stat["tagId"], "Unknown"),
+            "tag": tag_registry.name_of(stat["tagId"]),
             "uniqueGames": stat["uniqueGames"],
             "friendsPlaying": stat["friendsPlaying"]
         })
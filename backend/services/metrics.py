@@ -0,0 +1,249 @@
+"""
+Metriken im Prometheus-Textformat (GET /metrics).
+
+  - Latenz pro Service-Funktion:  instrument(modul) misst alle öffentlichen
+                                   async-Funktionen, Label "operation"
+  - Latenz pro HTTP-Route:        MetricsMiddleware, Label = Routen-Template
+                                   (/api/games/{game_id}, nicht der konkrete Pfad)
+  - DB-Round-Trips pro Request:   MongoDB über einen CommandListener (jedes
+                                   Kommando inkl. getMore), Neo4j über
+                                   count_round_trip() im Ausführungs-Layer
+
+Bewusst ohne prometheus_client: pro Messung nur perf_counter, bisect und ein
+Dict-Zugriff – klein genug, um dauerhaft eingeschaltet zu bleiben.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from pymongo import monitoring
+
+from config import get_pool_stats
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+DATABASES = ("mongodb", "neo4j")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Histogramm mit festen Buckets; eine Serie pro Label-Tupel."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels → [Zähler pro Bucket (nicht kumuliert, letzter = +Inf), Summe]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monoton steigender Zähler; eine Serie pro Label-Tupel."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series: dict[tuple, int] = {}
+
+    def inc(self, labels: tuple, amount: int = 1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+service_duration = Histogram(
+    "gamestore_service_duration_seconds", "Laufzeit der Service-Funktionen.",
+    ("operation",), LATENCY_BUCKETS,
+)
+http_duration = Histogram(
+    "gamestore_http_request_duration_seconds", "Laufzeit der HTTP-Requests pro Route.",
+    ("method", "route"), LATENCY_BUCKETS,
+)
+http_requests = Counter(
+    "gamestore_http_requests_total", "HTTP-Requests pro Route und Status.",
+    ("method", "route", "status"),
+)
+request_round_trips = Histogram(
+    "gamestore_db_round_trips_per_request", "Datenbank-Round-Trips pro HTTP-Request.",
+    ("db", "route"), ROUND_TRIP_BUCKETS,
+)
+round_trips = Counter(
+    "gamestore_db_round_trips_total", "Datenbank-Round-Trips insgesamt (inkl. Hintergrundjobs).",
+    ("db",),
+)
+
+
+# ──────────────────────────────────────────
+# DB-Round-Trips
+# ──────────────────────────────────────────
+
+# Zähler des laufenden Requests; None außerhalb von Requests
+_request_trips: ContextVar[dict | None] = ContextVar("request_trips", default=None)
+# Motor führt PyMongo in Threads aus (mit kopiertem Kontext) → Zählen unter Lock
+_trip_lock = threading.Lock()
+
+
+def count_round_trip(db: str):
+    trips = _request_trips.get()
+    with _trip_lock:
+        round_trips.inc((db,))
+        if trips is not None:
+            trips[db] += 1
+
+
+class _MongoCommandCounter(monitoring.CommandListener):
+    def started(self, event):
+        count_round_trip("mongodb")
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Gilt für alle danach erzeugten Clients (connect_mongodb läuft erst im Lifespan)
+monitoring.register(_MongoCommandCounter())
+
+
+# ──────────────────────────────────────────
+# Service-Funktionen
+# ──────────────────────────────────────────
+
+def _timed(operation: str, fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            service_duration.observe((operation,), time.perf_counter() - started)
+    return wrapper
+
+
+def instrument(module):
+    """
+    Ersetzt die öffentlichen async-Funktionen des Moduls durch gemessene Varianten.
+
+    Aufrufe über das Modul (mongo_service.x(), auch modulintern) werden erfasst;
+    Async-Generatoren und Kontextmanager bleiben unverändert.
+    """
+    prefix = module.__name__.rsplit(".", 1)[-1]
+    for name, fn in list(vars(module).items()):
+        if (name.startswith("_") or not inspect.iscoroutinefunction(fn)
+                or fn.__module__ != module.__name__):
+            continue
+        setattr(module, name, _timed(f"{prefix}.{name}", fn))
+
+
+# ──────────────────────────────────────────
+# HTTP
+# ──────────────────────────────────────────
+
+class MetricsMiddleware:
+    """
+    ASGI-Middleware: Laufzeit, Status und DB-Round-Trips pro Route.
+
+    Bei Streaming-Responses zählt die Zeit bis zum letzten Chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        trips = dict.fromkeys(DATABASES, 0)
+        token = _request_trips.set(trips)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_trips.reset(token)
+            # Routen-Template setzt der Router in den Scope; unbekannte Pfade zusammenfassen
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_duration.observe((method, route), elapsed)
+            http_requests.inc((method, route, str(status)))
+            for db in DATABASES:
+                request_round_trips.observe((db, route), trips[db])
+
+
+# ──────────────────────────────────────────
+# Ausgabe
+# ──────────────────────────────────────────
+
+def _pool_gauges() -> list[str]:
+    stats = get_pool_stats()
+    lines = [
+        "# HELP gamestore_mongo_pool_connections Verbindungen im MongoDB-Pool pro Zustand.",
+        "# TYPE gamestore_mongo_pool_connections gauge",
+    ]
+    for server, counts in sorted(stats["servers"].items()):
+        for state in ("open", "in_use", "waiting"):
+            lines.append(f"gamestore_mongo_pool_connections"
+                         f"{_labels(('server', 'state'), (server, state))} {counts[state]}")
+    lines += [
+        "# HELP gamestore_mongo_pool_utilisation Ausgeliehene / maximale Verbindungen (höchster Server).",
+        "# TYPE gamestore_mongo_pool_utilisation gauge",
+        f"gamestore_mongo_pool_utilisation {stats['utilisation']}",
+    ]
+    return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in (http_duration, http_requests, request_round_trips, round_trips, service_duration):
+        lines += metric.render()
+    lines += _pool_gauges()
+    return "\n".join(lines) + "\n"
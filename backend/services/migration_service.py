@@ -0,0 +1,61 @@
+"""
+Migrations-Service – Online-Migration der Referenzfelder auf ObjectId.
+
+Konvertiert user_id / game_id / publisher_id (siehe
+mongo_service.REFERENCE_FIELDS) batchweise von String auf ObjectId,
+während die API weiterläuft:
+  - jedes Update ist an den alten String-Wert gebunden, parallele
+    Änderungen werden also nicht überschrieben
+  - Lesezugriffe finden Referenzen in beiden Formen (_ref_match)
+
+Danach MONGO_TYPED_REFERENCES=true setzen, damit neue Dokumente direkt
+mit ObjectIds geschrieben und die $lookups per localField/foreignField
+ausgeführt werden.
+"""
+
+from pymongo import UpdateOne
+from config import get_db
+from services.mongo_service import REFERENCE_FIELDS
+
+# Nur gültige 24-stellige Hex-Strings lassen sich konvertieren
+_OBJECT_ID_PATTERN = "^[0-9a-fA-F]{24}$"
+
+
+async def count_untyped_references() -> dict:
+    """Anzahl Dokumente pro collection.feld, die noch String-Referenzen enthalten."""
+    db = get_db()
+    remaining = {}
+    for collection, fields in REFERENCE_FIELDS.items():
+        for field in fields:
+            remaining[f"{collection}.{field}"] = await db[collection].count_documents(
+                {field: {"$type": "string", "$regex": _OBJECT_ID_PATTERN}}
+            )
+    return remaining
+
+
+async def migrate_typed_references(batch_size: int = 1000) -> dict:
+    """Konvertiert alle String-Referenzen in Batches; gibt die Anzahl pro Feld zurück."""
+    db = get_db()
+    converted = {}
+    for collection, fields in REFERENCE_FIELDS.items():
+        for field in fields:
+            total = 0
+            query = {field: {"$type": "string", "$regex": _OBJECT_ID_PATTERN}}
+            while True:
+                docs = await db[collection].find(query, {field: 1}).limit(batch_size).to_list(length=batch_size)
+                if not docs:
+                    break
+                result = await db[collection].bulk_write([
+                    UpdateOne(
+                        {"_id": d["_id"], field: d[field]},
+                        [{"$set": {field: {"$toObjectId": f"${field}"}}}]
+                    )
+                    for d in docs
+                ], ordered=False)
+                total += result.modified_count
+                if result.modified_count == 0:
+                    break
+            converted[f"{collection}.{field}"] = total
+            print(f"[OK] {collection}.{field}: {total} Referenzen konvertiert")
+    return {"converted": converted, "remaining": await count_untyped_references()}
+
@@ -5,9 +5,85 @@ Verwaltet alle 5 Collections:
   games, users, reviews, publishers, purchases
 """
 
-from bson import ObjectId
-from datetime import datetime
-from config import get_db
+import base64
+from bson import ObjectId, json_util
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import date, datetime, timedelta
+from contextlib import asynccontextmanager
+from config import (
+    get_db, get_analytics_db, get_client, supports_transactions,
+    DOC_CACHE_SIZE, DOC_CACHE_TTL, MONGO_TYPED_REFERENCES,
+)
+from services.cache import TTLCache
+
+# Read-Through-Cache für häufig gelesene, selten geänderte Dokumente.
+# Schlüssel: (collection, _id) – Werte sind bereits per _to_str_id konvertiert.
+CACHED_COLLECTIONS = {"games", "users", "publishers", "tags"}
+_doc_cache = TTLCache(DOC_CACHE_SIZE, DOC_CACHE_TTL)
+
+# Benannte Projektionen pro Collection (None = komplettes Dokument).
+# "detail" ist überall implizit verfügbar.
+PROJECTIONS = {
+    "games": {
+        "card": ["title", "price", "cover_url", "tag_names", "platforms",
+                 "release_date", "publisher_id"],
+        "recommendation": ["title", "description", "price", "cover_url", "tag_names",
+                           "platforms", "release_date", "publisher_id"],
+        "name-only": ["title"],
+    },
+    "users": {
+        "card": ["username", "display_name", "avatar_url"],
+        "name-only": ["username", "display_name"],
+    },
+    "publishers": {
+        "card": ["name", "country", "founded_year", "website"],
+        "name-only": ["name"],
+    },
+    "tags": {
+        "name-only": ["name"],
+    },
+}
+
+# Felder, die über ?fields= abgefragt werden dürfen (neben _id).
+# Unbekannte Profile oder Felder → InvalidFieldsError statt leerer Dokumente.
+QUERYABLE_FIELDS = {
+    "games": {"title", "description", "price", "release_date", "publisher_id", "cover_url",
+              "screenshots", "platforms", "min_requirements", "tag_names",
+              "created_at", "updated_at"},
+    "users": {"username", "email", "display_name", "wallet_balance", "avatar_url", "address",
+              "created_at", "updated_at"},
+    "reviews": {"user_id", "game_id", "rating", "text", "recommended", "playtime_hours",
+                "created_at", "updated_at"},
+    "publishers": {"name", "description", "website", "founded_year", "country",
+                   "created_at", "updated_at"},
+    "purchases": {"user_id", "game_id", "price_paid", "created_at"},
+    "tags": {"name"},
+}
+
+
+# Referenzfelder pro Collection. Mit MONGO_TYPED_REFERENCES werden sie als
+# ObjectId gespeichert (→ $lookup per localField/foreignField über den _id-Index),
+# nach außen aber immer als String geliefert.
+REFERENCE_FIELDS = {
+    "reviews": ["user_id", "game_id"],
+    "purchases": ["user_id", "game_id"],
+    "games": ["publisher_id"],
+}
+_REFERENCE_FIELD_NAMES = {f for fields in REFERENCE_FIELDS.values() for f in fields}
+
+# Sortierfelder für Keyset-Pagination (jeweils mit Index (feld, _id))
+PAGINATION_SORT_FIELDS = {"_id", "created_at"}
+# Obergrenze für limit bei Listen/Seiten (die Routen prüfen per Query(le=...))
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursorError(ValueError):
+    """Ungültiger oder manipulierter Pagination-Cursor (→ HTTP 400)."""
+
+
+class InvalidFieldsError(ValueError):
+    """Unbekanntes Projektionsprofil oder Feld in ?fields= (→ HTTP 400)."""
 
 
 # ──────────────────────────────────────────
@@ -18,175 +94,735 @@ def _to_str_id(doc: dict) -> dict:
     """Konvertiert MongoDB ObjectId zu String für JSON-Serialisierung."""
     if doc and "_id" in doc:
         doc["_id"] = str(doc["_id"])
+    if doc:
+        for field in _REFERENCE_FIELD_NAMES:
+            if isinstance(doc.get(field), ObjectId):
+                doc[field] = str(doc[field])
     return doc
 
 
+def to_storage_refs(collection_name: str, data: dict) -> dict:
+    """Wandelt Referenzfelder für das Schreiben um (nur mit MONGO_TYPED_REFERENCES)."""
+    if MONGO_TYPED_REFERENCES:
+        for field in REFERENCE_FIELDS.get(collection_name, []):
+            if isinstance(data.get(field), str) and ObjectId.is_valid(data[field]):
+                data[field] = ObjectId(data[field])
+    return data
+
+
+def _ref_match(ref_id: str):
+    """Filter, der eine Referenz in beiden Formen findet (auch während der Migration)."""
+    if ObjectId.is_valid(ref_id):
+        return {"$in": [ref_id, ObjectId(ref_id)]}
+    return ref_id
+
+
 def _to_str_ids(docs: list[dict]) -> list[dict]:
     return [_to_str_id(doc) for doc in docs]
 
 
+def resolve_fields(collection_name: str, fields: str | list[str] | None) -> list[str] | None:
+    """
+    Übersetzt eine Feldangabe in eine Feldliste.
+
+    fields kann sein: None / "detail" (alles), ein Profilname aus PROJECTIONS
+    ("card", "name-only", ...), eine kommagetrennte Liste ("title,price")
+    oder bereits eine Liste. Unbekannte Profile/Felder → InvalidFieldsError.
+    """
+    if fields is None or isinstance(fields, list):
+        return fields
+    if fields == "detail":
+        return None
+    profiles = PROJECTIONS.get(collection_name, {})
+    if fields in profiles:
+        return profiles[fields]
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in QUERYABLE_FIELDS.get(collection_name, set())]
+    if unknown or not requested:
+        names = ", ".join(unknown) or repr(fields)
+        available = ", ".join(["detail", *profiles])
+        raise InvalidFieldsError(
+            f"Unbekanntes Profil bzw. Feld für {collection_name}: {names} (Profile: {available})"
+        )
+    return requested
+
+
+def _mongo_projection(fields: list[str] | None) -> dict | None:
+    return {f: 1 for f in fields} if fields is not None else None
+
+
+def _project(doc: dict, fields: list[str] | None) -> dict:
+    """Reduziert ein (gecachtes) Dokument auf _id + fields."""
+    if fields is None:
+        return dict(doc)
+    return {k: doc[k] for k in ("_id", *fields) if k in doc}
+
+
+def invalidate_cached(collection_name: str, doc_id: str):
+    """Entfernt ein Dokument aus dem Cache (nach Schreibzugriffen außerhalb dieses Moduls)."""
+    _doc_cache.invalidate((collection_name, doc_id))
+
+
+def clear_cache():
+    """Leert den Dokument-Cache komplett (z.B. nach dem Seeding)."""
+    _doc_cache.clear()
+
+
+def get_cache_stats() -> dict:
+    return _doc_cache.stats()
+
+
 # ──────────────────────────────────────────
 # Generische CRUD-Operationen
 # ──────────────────────────────────────────
 
-async def create_one(collection_name: str, data: dict) -> dict:
+@asynccontextmanager
+async def transaction():
+    """
+    Öffnet eine MongoDB-Transaktion und liefert die Session.
+
+    Ohne Replica Set gibt es keine Transaktionen → liefert None,
+    die Schreibzugriffe laufen dann einzeln.
+    """
+    if not supports_transactions():
+        yield None
+        return
+    async with await get_client().start_session() as session:
+        async with session.start_transaction():
+            yield session
+
+
+async def run_transaction(callback):
+    """
+    Führt callback(session) in einer Transaktion aus und gibt dessen Ergebnis zurück.
+
+    Anders als transaction() wird bei TransientTransactionError (z.B. Write-
+    Konflikt) und UnknownTransactionCommitResult automatisch wiederholt –
+    callback muss daher mehrfach ausführbar sein. Ohne Replica Set: callback(None).
+    """
+    if not supports_transactions():
+        return await callback(None)
+    async with await get_client().start_session() as session:
+        return await session.with_transaction(callback)
+
+
+async def create_one(collection_name: str, data: dict, session=None) -> dict:
     db = get_db()
     data["created_at"] = datetime.utcnow()
-    result = await db[collection_name].insert_one(data)
-    data["_id"] = str(result.inserted_id)
-    return data
+    result = await db[collection_name].insert_one(
+        to_storage_refs(collection_name, data), session=session
+    )
+    data["_id"] = result.inserted_id
+    return _to_str_id(data)
 
 
-async def get_all(collection_name: str, limit: int = 100, skip: int = 0) -> list[dict]:
+async def create_many(collection_name: str, docs: list[dict], session=None) -> list[dict]:
+    """Legt viele Dokumente mit einem insert_many an (wie create_one, ohne Einzel-Roundtrips)."""
     db = get_db()
-    cursor = db[collection_name].find().skip(skip).limit(limit)
+    now = datetime.utcnow()
+    for data in docs:
+        data.setdefault("_id", ObjectId())
+        data["created_at"] = now
+    await db[collection_name].insert_many(
+        [to_storage_refs(collection_name, d) for d in docs], ordered=False, session=session
+    )
+    return [_to_str_id(d) for d in docs]
+
+
+async def resolve_tag_ids(names) -> dict[str, str]:
+    """
+    Tag-Name → Tag-ID; fehlende Tags werden angelegt.
+
+    Ein $in-Query für alle Namen, Upserts nur für die fehlenden. Parallel
+    angelegte Tags fängt der Unique-Index auf name ab (danach neu lesen).
+    """
+    db = get_db()
+    names = list(dict.fromkeys(n for n in names if n))
+    if not names:
+        return {}
+    found = {t["name"]: str(t["_id"])
+             async for t in db["tags"].find({"name": {"$in": names}}, {"name": 1})}
+    missing = [n for n in names if n not in found]
+    if missing:
+        try:
+            await db["tags"].bulk_write([
+                UpdateOne({"name": n}, {"$setOnInsert": {"name": n}}, upsert=True) for n in missing
+            ], ordered=False)
+        except BulkWriteError as e:
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+        async for t in db["tags"].find({"name": {"$in": missing}}, {"name": 1}):
+            found[t["name"]] = str(t["_id"])
+    return found
+
+
+async def get_all(collection_name: str, limit: int = 100, skip: int = 0,
+                  fields: str | list[str] | None = None) -> list[dict]:
+    db = get_db()
+    projection = _mongo_projection(resolve_fields(collection_name, fields))
+    cursor = db[collection_name].find({}, projection).skip(skip).limit(limit)
     docs = await cursor.to_list(length=limit)
     return _to_str_ids(docs)
 
 
-async def get_one(collection_name: str, doc_id: str) -> dict | None:
+def _encode_cursor(sort_field: str, descending: bool, doc: dict) -> str:
+    state = {"s": sort_field, "d": descending, "id": doc["_id"], "v": doc.get(sort_field)}
+    return base64.urlsafe_b64encode(json_util.dumps(state).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        state = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if state["s"] not in PAGINATION_SORT_FIELDS or not isinstance(state["id"], ObjectId):
+            raise ValueError
+        return state
+    except Exception:
+        raise InvalidCursorError("Ungültiger Cursor")
+
+
+async def get_page(collection_name: str, limit: int = 100, cursor: str = "",
+                   sort_field: str = "_id", order: str = "asc",
+                   fields: str | list[str] | None = None) -> dict:
+    """
+    Keyset-Pagination: statt skip() wird ab dem letzten gesehenen
+    (sort_field, _id) weitergelesen – jede Seite kostet gleich viel,
+    egal wie tief geblättert wird.
+
+    cursor: "" für die erste Seite, danach der next_cursor der Vorseite
+    (enthält Sortierung und Richtung, sort_field/order werden dann ignoriert).
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidCursorError(f"limit muss zwischen 1 und {MAX_PAGE_SIZE} liegen")
+    if cursor:
+        state = _decode_cursor(cursor)
+        sort_field, descending = state["s"], state["d"]
+    else:
+        if sort_field not in PAGINATION_SORT_FIELDS:
+            raise InvalidCursorError(f"Sortierung nach '{sort_field}' nicht unterstützt")
+        state, descending = None, order == "desc"
+
+    op = "$lt" if descending else "$gt"
+    query = {}
+    if state and sort_field == "_id":
+        query = {"_id": {op: state["id"]}}
+    elif state:
+        query = {"$or": [
+            {sort_field: {op: state["v"]}},
+            {sort_field: state["v"], "_id": {op: state["id"]}},
+        ]}
+
+    direction = -1 if descending else 1
+    sort = [("_id", direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+    fields = resolve_fields(collection_name, fields)
+    if fields is not None and sort_field not in fields:
+        fields = [*fields, sort_field]
+
     db = get_db()
+    cursor_ = db[collection_name].find(query, _mongo_projection(fields)).sort(sort).limit(limit + 1)
+    docs = await cursor_.to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_cursor(sort_field, descending, docs[-1])
+    return {"items": _to_str_ids(docs), "next_cursor": next_cursor}
+
+
+async def iter_all(collection_name: str, fields: str | list[str] | None = None,
+                   batch_size: int = 1000):
+    """
+    Iteriert über eine komplette Collection, ohne sie in den Speicher zu laden.
+
+    Liefert Listen von höchstens batch_size Dokumenten (ein Motor-Batch).
+    Liest mit der Analyse-Read-Preference (Exporte belasten nicht den Primary).
+    """
+    db = get_analytics_db()
+    projection = _mongo_projection(resolve_fields(collection_name, fields))
+    cursor = db[collection_name].find({}, projection).sort("_id", 1).batch_size(batch_size)
+    batch = []
+    async for doc in cursor:
+        batch.append(_to_str_id(doc))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def get_one(collection_name: str, doc_id: str, use_cache: bool = True,
+                  fields: str | list[str] | None = None) -> dict | None:
+    """Liest ein Dokument. use_cache=False erzwingt einen frischen Lesezugriff."""
+    fields = resolve_fields(collection_name, fields)
+    cacheable = use_cache and collection_name in CACHED_COLLECTIONS
+    if cacheable:
+        cached = _doc_cache.get((collection_name, doc_id))
+        if cached is not None:
+            return _project(cached, fields)
+
+    db = get_db()
+    if collection_name not in CACHED_COLLECTIONS:
+        doc = await db[collection_name].find_one({"_id": ObjectId(doc_id)}, _mongo_projection(fields))
+        return _to_str_id(doc) if doc else None
+
+    generation = _doc_cache.generation
     doc = await db[collection_name].find_one({"_id": ObjectId(doc_id)})
-    return _to_str_id(doc) if doc else None
+    if not doc:
+        return None
+    doc = _to_str_id(doc)
+    _doc_cache.set((collection_name, doc_id), doc, generation)
+    return _project(doc, fields)
 
 
-async def update_one(collection_name: str, doc_id: str, data: dict) -> dict | None:
+async def update_one(collection_name: str, doc_id: str, data: dict, session=None) -> dict | None:
+    """
+    Setzt alle Felder != None und gibt das aktualisierte Dokument zurück.
+
+    Mit session den Cache nach dem Commit erneut invalidieren – bis dahin
+    könnte ein paralleler Lesezugriff den alten Stand wieder cachen.
+    """
     db = get_db()
     update_data = {k: v for k, v in data.items() if v is not None}
     if not update_data:
         return await get_one(collection_name, doc_id)
     update_data["updated_at"] = datetime.utcnow()
-    await db[collection_name].update_one(
+    doc = await db[collection_name].find_one_and_update(
         {"_id": ObjectId(doc_id)},
-        {"$set": update_data}
+        {"$set": to_storage_refs(collection_name, update_data)},
+        return_document=ReturnDocument.AFTER,
+        session=session
     )
-    return await get_one(collection_name, doc_id)
+    _doc_cache.invalidate((collection_name, doc_id))
+    return _to_str_id(doc) if doc else None
 
 
-async def delete_one(collection_name: str, doc_id: str) -> bool:
+async def delete_one(collection_name: str, doc_id: str, session=None) -> bool:
     db = get_db()
-    result = await db[collection_name].delete_one({"_id": ObjectId(doc_id)})
+    result = await db[collection_name].delete_one({"_id": ObjectId(doc_id)}, session=session)
+    _doc_cache.invalidate((collection_name, doc_id))
     return result.deleted_count > 0
 
 
-async def get_many_by_ids(collection_name: str, ids: list[str]) -> list[dict]:
+async def delete_many(collection_name: str, ids: list[str], session=None) -> int:
+    db = get_db()
+    result = await db[collection_name].delete_many(
+        {"_id": {"$in": [ObjectId(id) for id in ids]}}, session=session
+    )
+    for doc_id in ids:
+        _doc_cache.invalidate((collection_name, doc_id))
+    return result.deleted_count
+
+
+async def get_many_by_ids(collection_name: str, ids: list[str],
+                          fields: str | list[str] | None = None) -> list[dict]:
     """Liest mehrere Dokumente anhand einer ID-Liste.
     Zentral für den Integrations-Use-Case: Neo4j liefert IDs → MongoDB liefert Details.
+
+    fields: Profilname oder Feldliste (siehe resolve_fields), None = komplettes Dokument.
+    Bei gecachten Collections werden nur die fehlenden IDs aus MongoDB geladen
+    (vollständig, damit sie gecacht werden können) und danach projiziert.
     """
     db = get_db()
-    object_ids = [ObjectId(id) for id in ids]
-    cursor = db[collection_name].find({"_id": {"$in": object_ids}})
-    docs = await cursor.to_list(length=len(ids))
-    return _to_str_ids(docs)
+    fields = resolve_fields(collection_name, fields)
+    if collection_name not in CACHED_COLLECTIONS:
+        object_ids = [ObjectId(id) for id in ids]
+        cursor = db[collection_name].find({"_id": {"$in": object_ids}}, _mongo_projection(fields))
+        docs = await cursor.to_list(length=len(ids))
+        return _to_str_ids(docs)
+
+    found = {}
+    misses = []
+    for id in dict.fromkeys(ids):
+        cached = _doc_cache.get((collection_name, id))
+        if cached is not None:
+            found[id] = cached
+        else:
+            misses.append(id)
+
+    if misses:
+        generation = _doc_cache.generation
+        cursor = db[collection_name].find({"_id": {"$in": [ObjectId(id) for id in misses]}})
+        for doc in _to_str_ids(await cursor.to_list(length=len(misses))):
+            _doc_cache.set((collection_name, doc["_id"]), doc, generation)
+            found[doc["_id"]] = doc
+
+    return [_project(found[id], fields) for id in dict.fromkeys(ids) if id in found]
+
+
+async def has_purchased(user_id: str, game_id: str, session=None) -> bool:
+    """
+    Prüft, ob der User das Spiel bereits gekauft hat – in beiden Referenzformen.
+
+    Der Unique-Index (user_id, game_id) unterscheidet "abc…" und ObjectId("abc…");
+    solange String- und ObjectId-Referenzen nebeneinander existieren (vor bzw.
+    während der Migration), fängt erst diese Abfrage Doppelkäufe ab.
+    """
+    db = get_db()
+    return await db["purchases"].find_one(
+        {"user_id": _ref_match(user_id), "game_id": _ref_match(game_id)},
+        {"_id": 1}, session=session
+    ) is not None
 
 
 # ──────────────────────────────────────────
-# Aggregation-Pipelines
+# Reviews + materialisierte Spiel-Statistiken (game_stats)
 # ──────────────────────────────────────────
+#
+# game_stats: {_id: game_id, rating_sum, review_count, recommend_count,
+#              playtime_sum, playtime_count, avg_rating}
+# Jede Review-Änderung wird als Delta in einem einzigen Update-Pipeline-
+# Aufruf eingerechnet (atomar pro Dokument, kein Read-Modify-Write).
+
+_STATS_FIELDS = ["rating_sum", "review_count", "recommend_count", "playtime_sum", "playtime_count"]
+
+
+def _review_contribution(review: dict | None) -> dict:
+    """Beitrag einer Review zu den Zählern in game_stats."""
+    if not review:
+        return dict.fromkeys(_STATS_FIELDS, 0)
+    playtime = review.get("playtime_hours")
+    return {
+        "rating_sum": review.get("rating", 0),
+        "review_count": 1,
+        "recommend_count": 1 if review.get("recommended") else 0,
+        "playtime_sum": playtime or 0,
+        "playtime_count": 0 if playtime is None else 1,
+    }
 
-async def get_top_rated_games(limit: int = 10) -> list[dict]:
-    """
-    Aggregation 1: Bestbewertete Spiele.
 
-    Gruppiert Reviews nach game_id, berechnet Durchschnittsbewertung,
-    Empfehlungsrate und durchschnittliche Spielzeit.
-    Joined dann die Spiel-Details aus der games-Collection.
-    """
+async def _apply_stats_delta(game_id: str, before: dict | None, after: dict | None,
+                             session=None):
+    old, new = _review_contribution(before), _review_contribution(after)
+    delta = {f: new[f] - old[f] for f in _STATS_FIELDS}
+    if not any(delta.values()):
+        return
+    db = get_db()
+    await db["game_stats"].update_one({"_id": game_id}, [
+        {"$set": {
+            f: {"$add": [{"$ifNull": [f"${f}", 0]}, d]} for f, d in delta.items()
+        }},
+        {"$set": {"avg_rating": {"$cond": [
+            {"$gt": ["$review_count", 0]},
+            {"$divide": ["$rating_sum", "$review_count"]},
+            None
+        ]}}},
+    ], upsert=True, session=session)
+
+
+# Review-Schreibzugriff und Statistik-Delta laufen in einer Transaktion
+# (bei Write-Konflikten auf game_stats automatisch wiederholt).
+# Ohne Replica Set (keine Transaktionen) kann ein Absturz dazwischen game_stats
+# verfälschen – POST /api/game-stats/rebuild rechnet dann alles neu.
+
+async def create_review(data: dict) -> dict:
+    async def write(session):
+        review = await create_one("reviews", dict(data), session=session)
+        await _apply_stats_delta(review["game_id"], None, review, session=session)
+        return review
+    return await run_transaction(write)
+
+
+async def update_review(review_id: str, data: dict) -> dict | None:
+    """Aktualisiert eine Review; der Vorher-Stand kommt atomar aus find_one_and_update."""
+    db = get_db()
+    update_data = {k: v for k, v in data.items() if v is not None}
+    if not update_data:
+        return await get_one("reviews", review_id)
+    update_data["updated_at"] = datetime.utcnow()
+
+    async def write(session):
+        before = await db["reviews"].find_one_and_update(
+            {"_id": ObjectId(review_id)},
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if not before:
+            return None
+        after = _to_str_id({**before, **update_data})
+        await _apply_stats_delta(after["game_id"], before, after, session=session)
+        return after
+    return await run_transaction(write)
+
+
+async def delete_review(review_id: str) -> bool:
+    db = get_db()
+
+    async def write(session):
+        before = await db["reviews"].find_one_and_delete(
+            {"_id": ObjectId(review_id)}, session=session
+        )
+        if not before:
+            return False
+        await _apply_stats_delta(str(before["game_id"]), before, None, session=session)
+        return True
+    return await run_transaction(write)
+
+
+async def rebuild_game_stats() -> int:
+    """Berechnet game_stats komplett aus der reviews-Collection neu (Backfill)."""
     db = get_db()
     pipeline = [
-        # Stage 1: Gruppiere nach Spiel
         {"$group": {
-            "_id": "$game_id",
-            "avg_rating": {"$avg": "$rating"},
+            "_id": {"$toString": "$game_id"},
+            "rating_sum": {"$sum": "$rating"},
             "review_count": {"$sum": 1},
-            "recommend_rate": {
-                "$avg": {"$cond": ["$recommended", 1, 0]}
-            },
-            "avg_playtime": {"$avg": "$playtime_hours"}
+            "recommend_count": {"$sum": {"$cond": ["$recommended", 1, 0]}},
+            "playtime_sum": {"$sum": {"$ifNull": ["$playtime_hours", 0]}},
+            "playtime_count": {"$sum": {"$cond": [{"$eq": [{"$ifNull": ["$playtime_hours", None]}, None]}, 0, 1]}},
         }},
-        # Stage 2: Mindestens 2 Reviews
-        {"$match": {"review_count": {"$gte": 2}}},
-        # Stage 3: Sortieren
-        {"$sort": {"avg_rating": -1, "review_count": -1}},
-        # Stage 4: Limitieren
-        {"$limit": limit},
-        # Stage 5: Spiel-Details joinen
-        {"$lookup": {
-            "from": "games",
-            "let": {"game_id": {"$toObjectId": "$_id"}},
-            "pipeline": [
-                {"$match": {"$expr": {"$eq": ["$_id", "$$game_id"]}}}
-            ],
-            "as": "game"
-        }},
-        # Stage 6: Array entpacken
-        {"$unwind": {"path": "$game", "preserveNullAndEmptyArrays": True}},
-        # Stage 7: Saubere Projektion
-        {"$project": {
-            "_id": 1,
-            "avg_rating": {"$round": ["$avg_rating", 1]},
-            "review_count": 1,
-            "recommend_rate": {"$round": [{"$multiply": ["$recommend_rate", 100]}, 0]},
-            "avg_playtime": {"$round": ["$avg_playtime", 1]},
-            "title": "$game.title",
-            "price": "$game.price",
-            "cover_url": "$game.cover_url"
-        }}
+        {"$set": {"avg_rating": {"$divide": ["$rating_sum", "$review_count"]}}},
+        # $out ersetzt die Collection atomar und behält deren Indizes
+        {"$out": "game_stats"},
     ]
-    cursor = db["reviews"].aggregate(pipeline)
-    results = await cursor.to_list(length=limit)
-    return _to_str_ids(results)
+    await db["reviews"].aggregate(pipeline).to_list(length=None)
+    count = await db["game_stats"].count_documents({})
+    print(f"[OK] game_stats neu berechnet: {count} Spiele")
+    return count
+
+
+# ──────────────────────────────────────────
+# Umsatz-Rollups pro Publisher und Tag (publisher_revenue_daily)
+# ──────────────────────────────────────────
+#
+# publisher_revenue_daily: {_id: "<publisher_id>:<YYYY-MM-DD>", publisher_id,
+#                           day, revenue, sales}
+#
+# Ein Kauf ist gebucht, sobald sein record_revenue-Auftrag aus graph_outbox
+# verschwunden ist. Der Neuaufbau zählt deshalb nur Käufe ohne offenen
+# Auftrag; solange er läuft, bucht der Outbox-Worker nichts (Sperre in
+# job_leases, siehe begin_revenue_booking).
+
+_REVENUE_LEASE_ID = "publisher_revenue"
+# So lange sperrt ein Neuaufbau die Buchungen höchstens (Absturz-Schutz)
+REVENUE_REBUILD_LEASE_SECONDS = 600
+
+
+class RevenueRebuildInProgress(RuntimeError):
+    """Die Rollups werden gerade neu aufgebaut; Buchungen später wiederholen."""
+
 
+def _day(value: date | datetime) -> datetime:
+    """Kürzt auf den Tagesbeginn (UTC); MongoDB kennt nur datetime."""
+    return datetime(value.year, value.month, value.day)
 
-async def get_revenue_per_publisher() -> list[dict]:
+
+async def begin_revenue_booking(session=None):
     """
-    Aggregation 2: Umsatz pro Publisher.
+    Erster Schritt jeder Umsatz-Buchung (in derselben Transaktion).
 
-    Joinst purchases mit games und gruppiert nach publisher_id,
-    berechnet Gesamtumsatz und Anzahl verkaufter Spiele.
+    Der Zähler-Update auf dem Sperr-Dokument kollidiert mit dem Setzen der
+    Sperre in rebuild_publisher_revenue: Entweder ist die Buchung committet,
+    bevor der Neuaufbau beginnt, oder sie sieht die Sperre und bricht ab.
     """
     db = get_db()
-    pipeline = [
-        # Stage 1: Spiel-Daten joinen (um publisher_id zu bekommen)
-        {"$lookup": {
+    lease = await db["job_leases"].find_one_and_update(
+        {"_id": _REVENUE_LEASE_ID}, {"$inc": {"bookings": 1}},
+        upsert=True, return_document=ReturnDocument.AFTER, session=session
+    )
+    if lease.get("rebuilding_until") and lease["rebuilding_until"] > datetime.utcnow():
+        raise RevenueRebuildInProgress("Umsatz-Rollups werden neu aufgebaut")
+
+
+async def record_purchase_revenue(sales: list[tuple[str | None, float, datetime]], session=None):
+    """
+    Rechnet Käufe in die Tages-Rollups ein – ein Upsert pro Publisher und Tag,
+    egal wie viele Käufe darauf entfallen.
+
+    sales: (publisher_id, price_paid, purchased_at) pro Kauf.
+    Läuft im Outbox-Worker, nicht in der Kauf-Transaktion: Bei einem Flash-Sale
+    würden sonst alle Käufe um dasselbe Rollup-Dokument konkurrieren.
+    """
+    totals: dict[str, dict] = {}
+    for publisher_id, price_paid, purchased_at in sales:
+        day = _day(purchased_at)
+        total = totals.setdefault(f"{publisher_id}:{day.date().isoformat()}", {
+            "publisher_id": publisher_id, "day": day, "revenue": 0, "sales": 0,
+        })
+        total["revenue"] += price_paid
+        total["sales"] += 1
+    if not totals:
+        return
+    db = get_db()
+    await db["publisher_revenue_daily"].bulk_write([
+        UpdateOne(
+            {"_id": rollup_id},
+            {
+                "$inc": {"revenue": t["revenue"], "sales": t["sales"]},
+                "$setOnInsert": {"publisher_id": t["publisher_id"], "day": t["day"]},
+            },
+            upsert=True,
+        )
+        for rollup_id, t in totals.items()
+    ], ordered=False, session=session)
+
+
+async def rebuild_publisher_revenue() -> int:
+    """
+    Berechnet alle Tages-Rollups aus purchases neu (Backfill/Reparatur).
+
+    Käufe mit noch offenem record_revenue-Auftrag bleiben außen vor – der
+    Worker bucht sie nach dem Neuaufbau per $inc, sonst zählten sie doppelt.
+    Während des Laufs sind Buchungen gesperrt, damit kein $inc auf die alte
+    Collection durch $out verloren geht.
+    """
+    db = get_db()
+    await db["job_leases"].update_one(
+        {"_id": _REVENUE_LEASE_ID},
+        {"$set": {"rebuilding_until": datetime.utcnow()
+                  + timedelta(seconds=REVENUE_REBUILD_LEASE_SECONDS)}},
+        upsert=True
+    )
+    try:
+        count = await _rebuild_publisher_revenue(db)
+    finally:
+        await db["job_leases"].update_one(
+            {"_id": _REVENUE_LEASE_ID}, {"$unset": {"rebuilding_until": ""}}
+        )
+    print(f"[OK] Publisher-Umsatz-Rollups neu berechnet: {count} Einträge")
+    return count
+
+
+async def _rebuild_publisher_revenue(db) -> int:
+    if MONGO_TYPED_REFERENCES:
+        # game_id ist ObjectId → Gleichheits-Join direkt über den _id-Index
+        game_lookup = {"$lookup": {
+            "from": "games",
+            "localField": "game_id",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"publisher_id": 1}}],
+            "as": "game"
+        }}
+    else:
+        game_lookup = {"$lookup": {
             "from": "games",
             "let": {"game_id": {"$toObjectId": "$game_id"}},
             "pipeline": [
-                {"$match": {"$expr": {"$eq": ["$_id", "$$game_id"]}}}
+                {"$match": {"$expr": {"$eq": ["$_id", "$$game_id"]}}},
+                {"$project": {"publisher_id": 1}}
             ],
             "as": "game"
-        }},
-        {"$unwind": "$game"},
-        # Stage 2: Gruppiere nach Publisher
-        {"$group": {
-            "_id": "$game.publisher_id",
-            "total_revenue": {"$sum": "$price_paid"},
-            "total_sales": {"$sum": 1},
-            "avg_price": {"$avg": "$price_paid"}
-        }},
-        # Stage 3: Publisher-Details joinen
+        }}
+    pipeline = [
+        # Noch nicht gebuchte Käufe (offener Auftrag, auch "dead") überspringen
         {"$lookup": {
-            "from": "publishers",
-            "let": {"pub_id": {"$toObjectId": "$_id"}},
+            "from": "graph_outbox",
+            "let": {"purchase_id": {"$toString": "$_id"}},
             "pipeline": [
-                {"$match": {"$expr": {"$eq": ["$_id", "$$pub_id"]}}}
+                {"$match": {"op": "record_revenue",
+                            "$expr": {"$eq": ["$payload.purchaseId", "$$purchase_id"]}}},
+                {"$project": {"_id": 1}},
             ],
-            "as": "publisher"
+            "as": "pending_revenue"
+        }},
+        {"$match": {"pending_revenue": {"$size": 0}}},
+        game_lookup,
+        {"$unwind": "$game"},
+        {"$group": {
+            "_id": {
+                "publisher_id": {"$toString": "$game.publisher_id"},
+                "day": {"$dateTrunc": {"date": "$created_at", "unit": "day"}},
+            },
+            "revenue": {"$sum": "$price_paid"},
+            "sales": {"$sum": 1},
         }},
-        {"$unwind": {"path": "$publisher", "preserveNullAndEmptyArrays": True}},
-        # Stage 4: Projektion
         {"$project": {
-            "_id": 1,
-            "publisher_name": "$publisher.name",
-            "total_revenue": {"$round": ["$total_revenue", 2]},
-            "total_sales": 1,
-            "avg_price": {"$round": ["$avg_price", 2]}
+            "_id": {"$concat": [
+                {"$ifNull": ["$_id.publisher_id", "None"]}, ":",
+                {"$dateToString": {"date": "$_id.day", "format": "%Y-%m-%d"}},
+            ]},
+            "publisher_id": "$_id.publisher_id",
+            "day": "$_id.day",
+            "revenue": 1,
+            "sales": 1,
         }},
-        {"$sort": {"total_revenue": -1}}
+        {"$out": "publisher_revenue_daily"},
+    ]
+    await db["purchases"].aggregate(pipeline).to_list(length=None)
+    return await db["publisher_revenue_daily"].count_documents({})
+
+
+# ──────────────────────────────────────────
+# Aggregation-Pipelines
+# ──────────────────────────────────────────
+
+async def get_top_rated_games(limit: int = 10) -> list[dict]:
+    """
+    Aggregation 1: Bestbewertete Spiele.
+
+    Liest aus der materialisierten Collection game_stats (indizierte Sortierung
+    nach avg_rating) statt alle Reviews neu zu gruppieren.
+    Die Spiel-Details kommen über den Dokument-Cache.
+    """
+    db = get_analytics_db()
+    cursor = db["game_stats"].find(
+        {"review_count": {"$gte": 2}}
+    ).sort([("avg_rating", -1), ("review_count", -1)]).limit(limit)
+    stats = await cursor.to_list(length=limit)
+    if not stats:
+        return []
+
+    games = await get_many_by_ids("games", [s["_id"] for s in stats], ["title", "price", "cover_url"])
+    game_map = {g["_id"]: g for g in games}
+
+    results = []
+    for s in stats:
+        game = game_map.get(s["_id"], {})
+        playtime_count = s.get("playtime_count", 0)
+        results.append({
+            "_id": s["_id"],
+            "avg_rating": round(s["avg_rating"], 1),
+            "review_count": s["review_count"],
+            "recommend_rate": round(s["recommend_count"] / s["review_count"] * 100),
+            "avg_playtime": round(s["playtime_sum"] / playtime_count, 1) if playtime_count else None,
+            "title": game.get("title"),
+            "price": game.get("price"),
+            "cover_url": game.get("cover_url"),
+        })
+    return results
+
+
+async def get_revenue_per_publisher(start: date | None = None, end: date | None = None) -> list[dict]:
+    """
+    Aggregation 2: Umsatz pro Publisher.
+
+    Summiert die täglichen Rollups aus publisher_revenue_daily (optional
+    eingeschränkt auf [start, end]) statt alle Käufe mit games zu joinen.
+    Publisher-Namen kommen über den Dokument-Cache.
+    """
+    db = get_analytics_db()
+    day_filter = {}
+    if start:
+        day_filter["$gte"] = _day(start)
+    if end:
+        day_filter["$lte"] = _day(end)
+
+    pipeline = [
+        *([{"$match": {"day": day_filter}}] if day_filter else []),
+        {"$group": {
+            "_id": "$publisher_id",
+            "total_revenue": {"$sum": "$revenue"},
+            "total_sales": {"$sum": "$sales"},
+        }},
+        {"$sort": {"total_revenue": -1}},
+        {"$limit": 50},
+    ]
+    rollups = await db["publisher_revenue_daily"].aggregate(pipeline).to_list(length=50)
+
+    publishers = await get_many_by_ids(
+        "publishers", [r["_id"] for r in rollups if r["_id"]], "name-only"
+    )
+    name_map = {p["_id"]: p.get("name") for p in publishers}
+
+    return [
+        {
+            "_id": r["_id"],
+            "publisher_name": name_map.get(r["_id"]),
+            "total_revenue": round(r["total_revenue"], 2),
+            "total_sales": r["total_sales"],
+            "avg_price": round(r["total_revenue"] / r["total_sales"], 2) if r["total_sales"] else 0,
+        }
+        for r in rollups
     ]
-    cursor = db["purchases"].aggregate(pipeline)
-    results = await cursor.to_list(length=50)
-    return _to_str_ids(results)
 
 
 async def get_platform_statistics() -> list[dict]:
@@ -196,7 +832,7 @@ async def get_platform_statistics() -> list[dict]:
     Entpackt das platforms-Array und berechnet pro Plattform
     die Anzahl Spiele, den Durchschnittspreis und den Preisbereich.
     """
-    db = get_db()
+    db = get_analytics_db()
     pipeline = [
         {"$unwind": "$platforms"},
         {"$group": {
@@ -226,9 +862,9 @@ async def get_user_spending_stats(user_id: str) -> dict:
     """
     db = get_db()
     pipeline = [
-        {"$match": {"user_id": user_id}},
+        {"$match": {"user_id": _ref_match(user_id)}},
         {"$group": {
-            "_id": "$user_id",
+            "_id": None,
             "total_spent": {"$sum": "$price_paid"},
             "games_owned": {"$sum": 1},
             "avg_price_paid": {"$avg": "$price_paid"},
@@ -237,7 +873,7 @@ async def get_user_spending_stats(user_id: str) -> dict:
         }},
         {"$project": {
             "_id": 0,
-            "user_id": "$_id",
+            "user_id": {"$literal": user_id},
             "total_spent": {"$round": ["$total_spent", 2]},
             "games_owned": 1,
             "avg_price_paid": {"$round": ["$avg_price_paid", 2]},
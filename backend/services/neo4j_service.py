@@ -13,7 +13,67 @@ Graph-Modell:
     (:Game)-[:TAGGED_WITH]->(:Tag)                 – Spiel hat Tag/Genre
 """
 
-from config import get_driver
+from itertools import islice
+from typing import Iterable
+from config import get_session, NEO4J_BATCH_SIZE, FRIEND_REC_CACHE_SIZE, FRIEND_REC_CACHE_TTL
+from services import metrics
+from services.cache import TTLCache
+
+# Freundes-Empfehlungen: userId → {"limit", "items"} (längste abgefragte Liste).
+# Invalidiert bei Käufen und Freundschaftsänderungen (siehe invalidate_recommendations),
+# die TTL begrenzt nur Änderungen aus anderen Prozessen.
+_friend_recs = TTLCache(FRIEND_REC_CACHE_SIZE, FRIEND_REC_CACHE_TTL)
+
+# Längste gecachte Empfehlungsliste pro User (= LIST_SIZE der vorberechneten
+# Listen, siehe recommendation_batch_service); längere werden nicht gecacht
+FRIEND_REC_LIST_SIZE = 50
+
+# Beispiel-IDs pro Ergebniszeile (Freunde, Besitzer, gemeinsame Spiele).
+# Die Zähler bleiben exakt, nur die mitgelieferten ID-Listen sind begrenzt –
+# sonst trägt eine Zeile bei Blockbustern zehntausende IDs bis ins $in.
+ID_SAMPLE = 5
+
+
+# ──────────────────────────────────────────
+# Ausführung: Transaktionsfunktionen
+# ──────────────────────────────────────────
+#
+# execute_read/execute_write wiederholen die Funktion bei transienten Fehlern
+# (Deadlock, Leader-Wechsel, Verbindungsabbruch) bis NEO4J_MAX_RETRY_TIME.
+# Die Queries müssen daher wiederholbar sein (MERGE statt CREATE), Seiteneffekte
+# wie Cache-Invalidierung erst nach der Rückkehr. Lesezugriffe laufen im
+# READ-Modus und damit im Cluster auf den Followern.
+
+async def _fetch_all(tx, query: str, params: dict) -> list:
+    metrics.count_round_trip("neo4j")
+    result = await tx.run(query, params)
+    return [record async for record in result]
+
+
+async def run_read(query: str, **params) -> list:
+    """Lesetransaktion mit automatischer Wiederholung; gibt alle Records zurück."""
+    async with get_session(read=True) as session:
+        return await session.execute_read(_fetch_all, query, params)
+
+
+async def run_write(query: str, **params) -> list:
+    """Schreibtransaktion mit automatischer Wiederholung; gibt alle Records zurück."""
+    async with get_session() as session:
+        return await session.execute_write(_fetch_all, query, params)
+
+
+def invalidate_recommendations(user_ids: Iterable[str]):
+    """Verwirft die gecachten Empfehlungen der angegebenen User."""
+    for user_id in set(user_ids):
+        _friend_recs.invalidate(user_id)
+
+
+def clear_recommendation_cache():
+    _friend_recs.clear()
+
+
+def get_recommendation_cache_stats() -> dict:
+    return _friend_recs.stats()
 
 
 # ──────────────────────────────────────────
@@ -22,22 +82,26 @@ from config import get_driver
 
 async def create_user_node(user_id: str):
     """Erstellt einen User-Knoten (nur userId als Referenz auf MongoDB)."""
-    driver = get_driver()
-    async with driver.session() as session:
-        await session.run(
-            "MERGE (u:User {userId: $userId})",
-            userId=user_id
-        )
+    await run_write(
+        "MERGE (u:User {userId: $userId})",
+        userId=user_id
+    )
 
 
 async def delete_user_node(user_id: str):
     """Löscht einen User-Knoten und alle seine Beziehungen."""
-    driver = get_driver()
-    async with driver.session() as session:
-        await session.run(
-            "MATCH (u:User {userId: $userId}) DETACH DELETE u",
-            userId=user_id
-        )
+    records = await run_write(
+        """
+        MATCH (u:User {userId: $userId})
+        OPTIONAL MATCH (u)-[:FRIENDS_WITH]-(f:User)
+        WITH u, COLLECT(f.userId) AS friendIds
+        DETACH DELETE u
+        RETURN friendIds
+        """,
+        userId=user_id
+    )
+    record = records[0] if records else None
+    invalidate_recommendations([user_id, *(record["friendIds"] if record else [])])
 
 
 # ──────────────────────────────────────────
@@ -46,90 +110,267 @@ async def delete_user_node(user_id: str):
 
 async def create_game_node(game_id: str, tag_ids: list[str] = None):
     """Erstellt einen Game-Knoten und verknüpft ihn mit Tag-Knoten."""
-    driver = get_driver()
-    async with driver.session() as session:
-        await session.run(
-            "MERGE (g:Game {gameId: $gameId})",
-            gameId=game_id
-        )
-        if tag_ids:
-            for tid in tag_ids:
-                await session.run(
-                    """
-                    MERGE (t:Tag {tagId: $tagId})
-                    WITH t
-                    MATCH (g:Game {gameId: $gameId})
-                    MERGE (g)-[:TAGGED_WITH]->(t)
-                    """,
-                    gameId=game_id, tagId=tid
-                )
+    await run_write(
+        """
+        MERGE (g:Game {gameId: $gameId})
+        WITH g
+        UNWIND $tagIds AS tagId
+        MERGE (t:Tag {tagId: tagId})
+        MERGE (g)-[:TAGGED_WITH]->(t)
+        """,
+        gameId=game_id, tagIds=tag_ids or []
+    )
 
 
 async def delete_game_node(game_id: str):
     """Löscht einen Game-Knoten und alle seine Beziehungen."""
-    driver = get_driver()
-    async with driver.session() as session:
-        await session.run(
-            "MATCH (g:Game {gameId: $gameId}) DETACH DELETE g",
-            gameId=game_id
-        )
+    await run_write(
+        "MATCH (g:Game {gameId: $gameId}) DETACH DELETE g",
+        gameId=game_id
+    )
+    # Das Spiel kann in beliebigen Empfehlungslisten stehen
+    clear_recommendation_cache()
 
 
 # ──────────────────────────────────────────
 # CRUD: Beziehungen
 # ──────────────────────────────────────────
 
-async def add_ownership(user_id: str, game_id: str):
-    """Erstellt eine OWNS-Beziehung (User kauft Spiel)."""
-    driver = get_driver()
-    async with driver.session() as session:
-        await session.run(
-            """
-            MATCH (u:User {userId: $userId}), (g:Game {gameId: $gameId})
-            MERGE (u)-[o:OWNS]->(g)
-            SET o.purchaseDate = datetime()
-            """,
-            userId=user_id, gameId=game_id
-        )
+async def add_ownership(user_id: str, game_id: str) -> list[str]:
+    """
+    Erstellt eine OWNS-Beziehung (User kauft Spiel).
+
+    Gibt im selben Round-Trip die übrigen Spiele des Users zurück
+    (für die inkrementelle Co-Ownership-Pflege).
+    """
+    records = await run_write(
+        """
+        MATCH (u:User {userId: $userId}), (g:Game {gameId: $gameId})
+        MERGE (u)-[o:OWNS]->(g)
+        SET o.purchaseDate = datetime()
+        WITH u, g
+        OPTIONAL MATCH (u)-[:OWNS]->(other:Game)
+        WHERE other <> g
+        WITH u, COLLECT(other.gameId) AS otherGameIds
+        OPTIONAL MATCH (u)-[:FRIENDS_WITH]-(f:User)
+        RETURN otherGameIds, COLLECT(DISTINCT f.userId) AS friendIds
+        """,
+        userId=user_id, gameId=game_id
+    )
+    record = records[0] if records else None
+    if not record:
+        return []
+    invalidate_recommendations([user_id, *record["friendIds"]])
+    return record["otherGameIds"]
 
 
 async def remove_ownership(user_id: str, game_id: str):
     """Entfernt eine OWNS-Beziehung."""
-    driver = get_driver()
-    async with driver.session() as session:
-        await session.run(
-            """
-            MATCH (u:User {userId: $userId})-[o:OWNS]->(g:Game {gameId: $gameId})
-            DELETE o
-            """,
-            userId=user_id, gameId=game_id
-        )
+    records = await run_write(
+        """
+        MATCH (u:User {userId: $userId})-[o:OWNS]->(g:Game {gameId: $gameId})
+        DELETE o
+        WITH u
+        OPTIONAL MATCH (u)-[:FRIENDS_WITH]-(f:User)
+        RETURN COLLECT(DISTINCT f.userId) AS friendIds
+        """,
+        userId=user_id, gameId=game_id
+    )
+    record = records[0] if records else None
+    invalidate_recommendations([user_id, *(record["friendIds"] if record else [])])
 
 
 async def add_friendship(user_id_1: str, user_id_2: str):
     """Erstellt eine Freundschaft (bidirektional)."""
-    driver = get_driver()
-    async with driver.session() as session:
-        await session.run(
-            """
-            MATCH (u1:User {userId: $uid1}), (u2:User {userId: $uid2})
-            MERGE (u1)-[:FRIENDS_WITH]-(u2)
-            """,
-            uid1=user_id_1, uid2=user_id_2
-        )
+    await run_write(
+        """
+        MATCH (u1:User {userId: $uid1}), (u2:User {userId: $uid2})
+        MERGE (u1)-[:FRIENDS_WITH]-(u2)
+        """,
+        uid1=user_id_1, uid2=user_id_2
+    )
+    # Nur die beiden Endpunkte sehen einen neuen Freund (2-Hop endet beim Freund)
+    invalidate_recommendations([user_id_1, user_id_2])
 
 
 async def remove_friendship(user_id_1: str, user_id_2: str):
     """Entfernt eine Freundschaft."""
-    driver = get_driver()
-    async with driver.session() as session:
-        await session.run(
+    await run_write(
+        """
+        MATCH (u1:User {userId: $uid1})-[f:FRIENDS_WITH]-(u2:User {userId: $uid2})
+        DELETE f
+        """,
+        uid1=user_id_1, uid2=user_id_2
+    )
+    invalidate_recommendations([user_id_1, user_id_2])
+
+
+# ──────────────────────────────────────────
+# BULK: Gebündelte Schreibvorgänge (UNWIND)
+# ──────────────────────────────────────────
+
+# Label → Schlüssel-Property (Labels lassen sich nicht parametrisieren)
+_NODE_KEYS = {"User": "userId", "Game": "gameId", "Tag": "tagId"}
+
+# Beziehungstyp → Cypher pro Zeile {from, to}
+_RELATIONSHIP_QUERIES = {
+    "OWNS": """
+        UNWIND $rows AS row
+        MATCH (u:User {userId: row.from}), (g:Game {gameId: row.to})
+        MERGE (u)-[o:OWNS]->(g)
+        ON CREATE SET o.purchaseDate = datetime()
+    """,
+    "TAGGED_WITH": """
+        UNWIND $rows AS row
+        MATCH (g:Game {gameId: row.from}), (t:Tag {tagId: row.to})
+        MERGE (g)-[:TAGGED_WITH]->(t)
+    """,
+    "FRIENDS_WITH": """
+        UNWIND $rows AS row
+        MATCH (u1:User {userId: row.from}), (u2:User {userId: row.to})
+        MERGE (u1)-[:FRIENDS_WITH]-(u2)
+    """,
+}
+
+
+def _chunks(rows: Iterable, size: int):
+    """Zerlegt ein beliebiges Iterable in Listen der Länge size (ohne alles zu laden)."""
+    it = iter(rows)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+async def _run_batched(query: str, rows: Iterable[dict], batch_size: int = None) -> int:
+    """Führt query mit $rows in einer Schreibtransaktion pro Chunk aus."""
+    total = 0
+    async with get_session() as session:
+        for chunk in _chunks(rows, batch_size or NEO4J_BATCH_SIZE):
+            await session.execute_write(_fetch_all, query, {"rows": chunk})
+            total += len(chunk)
+    return total
+
+
+async def bulk_create_nodes(label: str, ids: Iterable[str], batch_size: int = None) -> int:
+    """
+    Legt viele Knoten eines Labels an (User, Game oder Tag).
+
+    ids kann auch ein Generator sein – es werden nie mehr als
+    batch_size Zeilen gleichzeitig gehalten.
+    """
+    key = _NODE_KEYS[label]
+    query = f"UNWIND $rows AS row MERGE (n:{label} {{{key}: row.id}})"
+    return await _run_batched(query, ({"id": i} for i in ids), batch_size)
+
+
+async def bulk_create_relationships(rel_type: str, pairs: Iterable[tuple[str, str]],
+                                    batch_size: int = None) -> int:
+    """
+    Legt viele Beziehungen an (OWNS, TAGGED_WITH oder FRIENDS_WITH).
+
+    pairs: (from_id, to_id), z.B. (userId, gameId) für OWNS.
+    Beide Knoten müssen bereits existieren.
+    """
+    query = _RELATIONSHIP_QUERIES[rel_type]
+    rows = ({"from": a, "to": b} for a, b in pairs)
+    total = await _run_batched(query, rows, batch_size)
+    if rel_type in ("OWNS", "FRIENDS_WITH"):
+        clear_recommendation_cache()
+    return total
+
+
+async def bulk_delete_nodes(label: str, ids: Iterable[str], batch_size: int = None) -> int:
+    """Löscht viele Knoten eines Labels inkl. ihrer Beziehungen."""
+    key = _NODE_KEYS[label]
+    query = f"UNWIND $rows AS row MATCH (n:{label} {{{key}: row.id}}) DETACH DELETE n"
+    total = await _run_batched(query, ({"id": i} for i in ids), batch_size)
+    if label in ("User", "Game"):
+        clear_recommendation_cache()
+    return total
+
+
+async def bulk_set_game_tags(rows: list[dict], batch_size: int = None) -> int:
+    """
+    Legt Game-Knoten an und ersetzt deren TAGGED_WITH-Kanten.
+
+    rows: [{"gameId", "tagIds"}] – Tag-Knoten werden bei Bedarf angelegt.
+    Jede gameId höchstens einmal: Zeilen desselben Spiels im selben UNWIND
+    ergäben die Vereinigung ihrer Tag-Mengen.
+    """
+    query = """
+        UNWIND $rows AS row
+        MERGE (g:Game {gameId: row.gameId})
+        WITH g, row
+        OPTIONAL MATCH (g)-[old:TAGGED_WITH]->(:Tag)
+        DELETE old
+        WITH DISTINCT g, row
+        UNWIND row.tagIds AS tagId
+        MERGE (t:Tag {tagId: tagId})
+        MERGE (g)-[:TAGGED_WITH]->(t)
+    """
+    return await _run_batched(query, rows, batch_size)
+
+
+async def bulk_delete_ownerships(pairs: Iterable[tuple[str, str]], batch_size: int = None) -> int:
+    """Entfernt OWNS-Beziehungen für (userId, gameId)-Paare."""
+    query = """
+        UNWIND $rows AS row
+        MATCH (:User {userId: row.from})-[o:OWNS]->(:Game {gameId: row.to})
+        DELETE o
+    """
+    total = await _run_batched(query, ({"from": u, "to": g} for u, g in pairs), batch_size)
+    clear_recommendation_cache()
+    return total
+
+
+async def bulk_add_ownerships(pairs: list[tuple[str, str]]) -> list[dict]:
+    """
+    Legt OWNS-Beziehungen für (userId, gameId)-Paare in einer Transaktion an.
+
+    Gibt nur die Paare zurück, deren Knoten existierten – jeweils mit den
+    übrigen Spielen des Users (wie add_ownership).
+    """
+    records = await run_write(
+        """
+        UNWIND $rows AS row
+        MATCH (u:User {userId: row.from}), (g:Game {gameId: row.to})
+        MERGE (u)-[o:OWNS]->(g)
+        ON CREATE SET o.purchaseDate = datetime()
+        WITH row, u, g
+        OPTIONAL MATCH (u)-[:OWNS]->(other:Game)
+        WHERE other <> g
+        WITH row, u, COLLECT(other.gameId) AS otherGameIds
+        OPTIONAL MATCH (u)-[:FRIENDS_WITH]-(f:User)
+        RETURN row.from AS userId, row.to AS gameId, otherGameIds,
+               COLLECT(DISTINCT f.userId) AS friendIds
+        """,
+        rows=[{"from": u, "to": g} for u, g in pairs]
+    )
+    invalidate_recommendations(
+        uid for r in records for uid in (r["userId"], *r["friendIds"])
+    )
+    return [
+        {"userId": r["userId"], "gameId": r["gameId"], "otherGameIds": r["otherGameIds"]}
+        for r in records
+    ]
+
+
+async def clear_graph(batch_size: int = None):
+    """
+    Löscht alle Knoten in mehreren Transaktionen (statt einer riesigen).
+
+    CALL … IN TRANSACTIONS geht nur als Auto-Commit, daher ohne Transaktionsfunktion.
+    """
+    metrics.count_round_trip("neo4j")
+    async with get_session() as session:
+        result = await session.run(
             """
-            MATCH (u1:User {userId: $uid1})-[f:FRIENDS_WITH]-(u2:User {userId: $uid2})
-            DELETE f
+            MATCH (n)
+            CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF $batchSize ROWS
             """,
-            uid1=user_id_1, uid2=user_id_2
+            batchSize=batch_size or NEO4J_BATCH_SIZE
         )
+        await result.consume()
+    clear_recommendation_cache()
 
 
 # ──────────────────────────────────────────
@@ -138,32 +379,26 @@ async def remove_friendship(user_id_1: str, user_id_2: str):
 
 async def get_user_friends(user_id: str) -> list[str]:
     """Gibt alle Freunde eines Users zurück."""
-    driver = get_driver()
-    async with driver.session() as session:
-        result = await session.run(
-            """
-            MATCH (u:User {userId: $userId})-[:FRIENDS_WITH]-(friend:User)
-            RETURN friend.userId AS friendId
-            """,
-            userId=user_id
-        )
-        records = [record async for record in result]
-        return [r["friendId"] for r in records]
+    records = await run_read(
+        """
+        MATCH (u:User {userId: $userId})-[:FRIENDS_WITH]-(friend:User)
+        RETURN friend.userId AS friendId
+        """,
+        userId=user_id
+    )
+    return [r["friendId"] for r in records]
 
 
 async def get_user_library(user_id: str) -> list[str]:
     """Gibt alle Spiel-IDs zurück, die ein User besitzt."""
-    driver = get_driver()
-    async with driver.session() as session:
-        result = await session.run(
-            """
-            MATCH (u:User {userId: $userId})-[:OWNS]->(g:Game)
-            RETURN g.gameId AS gameId
-            """,
-            userId=user_id
-        )
-        records = [record async for record in result]
-        return [r["gameId"] for r in records]
+    records = await run_read(
+        """
+        MATCH (u:User {userId: $userId})-[:OWNS]->(g:Game)
+        RETURN g.gameId AS gameId
+        """,
+        userId=user_id
+    )
+    return [r["gameId"] for r in records]
 
 
 # ──────────────────────────────────────────
@@ -179,31 +414,50 @@ async def recommend_by_friends(user_id: str, limit: int = 10) -> list[dict]:
 
     → Dies ist auch der INTEGRATIONS-USE-CASE:
       Die gameIds werden an MongoDB übergeben für vollständige Details.
+
+    Pro User wird nur die längste abgefragte Liste (höchstens
+    FRIEND_REC_LIST_SIZE Einträge) im Speicher gehalten und für kleinere
+    limits gekürzt, bis ein Kauf oder eine Freundschaftsänderung sie
+    invalidiert. Das gilt nur für Änderungen in diesem Prozess – Käufe, die
+    der Projektor oder der Outbox-Worker eines anderen Prozesses einträgt,
+    sieht der Cache erst nach FRIEND_REC_CACHE_TTL.
     """
-    driver = get_driver()
-    async with driver.session() as session:
-        result = await session.run(
-            """
-            MATCH (u:User {userId: $userId})-[:FRIENDS_WITH]-(friend:User)
-                  -[:OWNS]->(g:Game)
-            WHERE NOT (u)-[:OWNS]->(g)
-            RETURN g.gameId AS gameId,
-                   COUNT(DISTINCT friend) AS friendCount,
-                   COLLECT(DISTINCT friend.userId) AS friendIds
-            ORDER BY friendCount DESC
-            LIMIT $limit
-            """,
-            userId=user_id, limit=limit
-        )
-        records = [record async for record in result]
-        return [
-            {
-                "gameId": r["gameId"],
-                "friendCount": r["friendCount"],
-                "friendIds": r["friendIds"]
-            }
-            for r in records
-        ]
+    cached = _friend_recs.get(user_id)
+    # Kürzere Liste als angefragt = es gibt nicht mehr Empfehlungen
+    if cached is not None and (cached["limit"] >= limit or len(cached["items"]) < cached["limit"]):
+        return [dict(r) for r in cached["items"][:limit]]
+    generation = _friend_recs.generation
+
+    records = await run_read(
+        """
+        MATCH (u:User {userId: $userId})-[:FRIENDS_WITH]-(friend:User)
+              -[:OWNS]->(g:Game)
+        WHERE NOT (u)-[:OWNS]->(g)
+        WITH u, g, COUNT(DISTINCT friend) AS friendCount
+        ORDER BY friendCount DESC
+        LIMIT $limit
+        CALL {
+            WITH u, g
+            MATCH (u)-[:FRIENDS_WITH]-(friend:User)-[:OWNS]->(g)
+            WITH DISTINCT friend LIMIT $sample
+            RETURN COLLECT(friend.userId) AS friendIds
+        }
+        RETURN g.gameId AS gameId, friendCount, friendIds
+        ORDER BY friendCount DESC
+        """,
+        userId=user_id, limit=limit, sample=ID_SAMPLE
+    )
+    recommendations = [
+        {
+            "gameId": r["gameId"],
+            "friendCount": r["friendCount"],
+            "friendIds": r["friendIds"]
+        }
+        for r in records
+    ]
+    if limit <= FRIEND_REC_LIST_SIZE:
+        _friend_recs.set(user_id, {"limit": limit, "items": recommendations}, generation)
+    return [dict(r) for r in recommendations]
 
 
 async def players_also_bought(game_id: str, limit: int = 5) -> list[dict]:
@@ -213,61 +467,63 @@ async def players_also_bought(game_id: str, limit: int = 5) -> list[dict]:
     Findet Spiele, die häufig zusammen mit dem angegebenen Spiel
     von denselben Usern besessen werden.
     """
-    driver = get_driver()
-    async with driver.session() as session:
-        result = await session.run(
-            """
-            MATCH (u:User)-[:OWNS]->(g1:Game {gameId: $gameId}),
-                  (u)-[:OWNS]->(g2:Game)
-            WHERE g1 <> g2
-            RETURN g2.gameId AS gameId,
-                   COUNT(DISTINCT u) AS commonOwners,
-                   COLLECT(DISTINCT u.userId) AS ownerIds
-            ORDER BY commonOwners DESC
-            LIMIT $limit
-            """,
-            gameId=game_id, limit=limit
-        )
-        records = [record async for record in result]
-        return [
-            {
-                "gameId": r["gameId"],
-                "commonOwners": r["commonOwners"],
-                "ownerIds": r["ownerIds"]
-            }
-            for r in records
-        ]
-
-
-async def popular_tags_in_network(user_id: str) -> list[dict]:
+    records = await run_read(
+        """
+        MATCH (u:User)-[:OWNS]->(g1:Game {gameId: $gameId}),
+              (u)-[:OWNS]->(g2:Game)
+        WHERE g1 <> g2
+        WITH g1, g2, COUNT(DISTINCT u) AS commonOwners
+        ORDER BY commonOwners DESC
+        LIMIT $limit
+        CALL {
+            WITH g1, g2
+            MATCH (g1)<-[:OWNS]-(u:User)-[:OWNS]->(g2)
+            WITH DISTINCT u LIMIT $sample
+            RETURN COLLECT(u.userId) AS ownerIds
+        }
+        RETURN g2.gameId AS gameId, commonOwners, ownerIds
+        ORDER BY commonOwners DESC
+        """,
+        gameId=game_id, limit=limit, sample=ID_SAMPLE
+    )
+    return [
+        {
+            "gameId": r["gameId"],
+            "commonOwners": r["commonOwners"],
+            "ownerIds": r["ownerIds"]
+        }
+        for r in records
+    ]
+
+
+async def popular_tags_in_network(user_id: str, limit: int = 20) -> list[dict]:
     """
     🎯 Analyse 3: Beliebteste Tags/Genres im Freundeskreis.
 
     Analysiert welche Tags die Freunde des Users am meisten
     spielen – hilfreich für personalisierte Storefront.
+    Liefert nur die limit häufigsten Tags.
     """
-    driver = get_driver()
-    async with driver.session() as session:
-        result = await session.run(
-            """
-            MATCH (u:User {userId: $userId})-[:FRIENDS_WITH]-(friend:User)
-                  -[:OWNS]->(g:Game)-[:TAGGED_WITH]->(t:Tag)
-            RETURN t.tagId AS tagId,
-                   COUNT(DISTINCT g) AS uniqueGames,
-                   COUNT(DISTINCT friend) AS friendsPlaying
-            ORDER BY uniqueGames DESC
-            """,
-            userId=user_id
-        )
-        records = [record async for record in result]
-        return [
-            {
-                "tagId": r["tagId"],
-                "uniqueGames": r["uniqueGames"],
-                "friendsPlaying": r["friendsPlaying"]
-            }
-            for r in records
-        ]
+    records = await run_read(
+        """
+        MATCH (u:User {userId: $userId})-[:FRIENDS_WITH]-(friend:User)
+              -[:OWNS]->(g:Game)-[:TAGGED_WITH]->(t:Tag)
+        RETURN t.tagId AS tagId,
+               COUNT(DISTINCT g) AS uniqueGames,
+               COUNT(DISTINCT friend) AS friendsPlaying
+        ORDER BY uniqueGames DESC
+        LIMIT $limit
+        """,
+        userId=user_id, limit=limit
+    )
+    return [
+        {
+            "tagId": r["tagId"],
+            "uniqueGames": r["uniqueGames"],
+            "friendsPlaying": r["friendsPlaying"]
+        }
+        for r in records
+    ]
 
 
 async def find_gaming_buddies(user_id: str, limit: int = 5) -> list[dict]:
@@ -277,29 +533,32 @@ async def find_gaming_buddies(user_id: str, limit: int = 5) -> list[dict]:
     Findet User (die KEINE Freunde sind), die die meisten
     gleichen Spiele besitzen – potenzielle neue Freunde.
     """
-    driver = get_driver()
-    async with driver.session() as session:
-        result = await session.run(
-            """
-            MATCH (u:User {userId: $userId})-[:OWNS]->(g:Game)<-[:OWNS]-(other:User)
-            WHERE u <> other AND NOT (u)-[:FRIENDS_WITH]-(other)
-            RETURN other.userId AS userId,
-                   COUNT(DISTINCT g) AS commonGames,
-                   COLLECT(DISTINCT g.gameId) AS sharedGameIds
-            ORDER BY commonGames DESC
-            LIMIT $limit
-            """,
-            userId=user_id, limit=limit
-        )
-        records = [record async for record in result]
-        return [
-            {
-                "userId": r["userId"],
-                "commonGames": r["commonGames"],
-                "sharedGameIds": r["sharedGameIds"]
-            }
-            for r in records
-        ]
+    records = await run_read(
+        """
+        MATCH (u:User {userId: $userId})-[:OWNS]->(g:Game)<-[:OWNS]-(other:User)
+        WHERE u <> other AND NOT (u)-[:FRIENDS_WITH]-(other)
+        WITH u, other, COUNT(DISTINCT g) AS commonGames
+        ORDER BY commonGames DESC
+        LIMIT $limit
+        CALL {
+            WITH u, other
+            MATCH (u)-[:OWNS]->(g:Game)<-[:OWNS]-(other)
+            WITH DISTINCT g LIMIT $sample
+            RETURN COLLECT(g.gameId) AS sharedGameIds
+        }
+        RETURN other.userId AS userId, commonGames, sharedGameIds
+        ORDER BY commonGames DESC
+        """,
+        userId=user_id, limit=limit, sample=ID_SAMPLE
+    )
+    return [
+        {
+            "userId": r["userId"],
+            "commonGames": r["commonGames"],
+            "sharedGameIds": r["sharedGameIds"]
+        }
+        for r in records
+    ]
 
 
 async def similar_games_by_tags(game_id: str, limit: int = 5) -> list[dict]:
@@ -308,26 +567,23 @@ async def similar_games_by_tags(game_id: str, limit: int = 5) -> list[dict]:
 
     Findet Spiele, die die meisten gleichen Tags wie das angegebene Spiel haben.
     """
-    driver = get_driver()
-    async with driver.session() as session:
-        result = await session.run(
-            """
-            MATCH (g1:Game {gameId: $gameId})-[:TAGGED_WITH]->(t:Tag)<-[:TAGGED_WITH]-(g2:Game)
-            WHERE g1 <> g2
-            RETURN g2.gameId AS gameId,
-                   COUNT(t) AS commonTags,
-                   COLLECT(t.tagId) AS sharedTagIds
-            ORDER BY commonTags DESC
-            LIMIT $limit
-            """,
-            gameId=game_id, limit=limit
-        )
-        records = [record async for record in result]
-        return [
-            {
-                "gameId": r["gameId"],
-                "commonTags": r["commonTags"],
-                "sharedTagIds": r["sharedTagIds"]
-            }
-            for r in records
-        ]
+    records = await run_read(
+        """
+        MATCH (g1:Game {gameId: $gameId})-[:TAGGED_WITH]->(t:Tag)<-[:TAGGED_WITH]-(g2:Game)
+        WHERE g1 <> g2
+        RETURN g2.gameId AS gameId,
+               COUNT(t) AS commonTags,
+               COLLECT(t.tagId) AS sharedTagIds
+        ORDER BY commonTags DESC
+        LIMIT $limit
+        """,
+        gameId=game_id, limit=limit
+    )
+    return [
+        {
+            "gameId": r["gameId"],
+            "commonTags": r["commonTags"],
+            "sharedTagIds": r["sharedTagIds"]
+        }
+        for r in records
+    ]
@@ -0,0 +1,348 @@
+"""
+Outbox Service – asynchrone Synchronisation MongoDB → Neo4j.
+
+Statt Neo4j direkt im Request aufzurufen, schreiben die Routen einen
+Auftrag in die Collection "graph_outbox" (im Replica Set in derselben
+Transaktion wie das eigentliche Dokument). Ein Hintergrund-Worker pro
+API-Prozess arbeitet die Aufträge gebündelt per UNWIND ab.
+
+  Auftrag:   {_id, op, payload, status, attempts, next_attempt_at,
+              locked_until, created_at}
+  Ops:       create_user, delete_user, create_game, set_game_tags,
+             delete_game, add_ownership (Graph)
+             record_revenue (Umsatz-Rollup in MongoDB)
+
+Ein Batch kann mehrfach laufen (Fehler → ganzer Batch wird wiederholt,
+abgelaufene Lease → anderer Worker). Alle Neo4j-Schreibvorgänge sind MERGE
+bzw. DETACH DELETE und damit idempotent; die Co-Ownership-Zähler werden
+pro Kauf nur einmal erhöht (siehe apply_ownerships).
+Umsatz-Aufträge sind es nicht ($inc); sie werden deshalb in derselben
+Transaktion gebucht, in der der Worker sie löscht (siehe _apply_revenue).
+Fehlgeschlagene Aufträge werden mit exponentiellem Backoff wiederholt
+und nach MAX_ATTEMPTS als "dead" markiert.
+
+Mit GRAPH_SYNC_MODE=changestream übernimmt stattdessen der separate
+Projektor (services/graph_projector.py) die Graph-Ops – enqueue() ist für
+sie dann ein No-op. Umsatz-Aufträge laufen in beiden Modi über die Outbox.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+from config import get_db, GRAPH_SYNC_MODE
+from services import (
+    mongo_service, neo4j_service, co_ownership_service, recommendation_batch_service,
+)
+
+BATCH_SIZE = 500
+POLL_INTERVAL = 1.0             # Sekunden, wenn nichts zu tun ist
+LEASE_SECONDS = 60              # so lange gehört ein Auftrag einem Worker
+MAX_ATTEMPTS = 10
+MAX_BACKOFF_SECONDS = 300
+
+# Ops, die im Change-Stream-Modus der Projektor übernimmt
+GRAPH_OPS = {"create_user", "delete_user", "create_game", "set_game_tags",
+             "delete_game", "add_ownership"}
+
+_wakeup: asyncio.Event | None = None
+_worker_task: asyncio.Task | None = None
+_processed_total = 0
+_failed_total = 0
+_last_batch_at: datetime | None = None
+
+
+# ──────────────────────────────────────────
+# Schreiben (aus den Routen)
+# ──────────────────────────────────────────
+
+def _new_entry(op: str, payload: dict, now: datetime) -> dict:
+    return {"op": op, "payload": payload, "status": "pending", "attempts": 0,
+            "next_attempt_at": now, "locked_until": now, "created_at": now}
+
+
+async def enqueue(op: str, payload: dict, session=None):
+    """Legt einen Auftrag an; session = laufende MongoDB-Transaktion (optional)."""
+    if GRAPH_SYNC_MODE != "outbox" and op in GRAPH_OPS:
+        # Der Change-Stream-Projektor liest die Änderungen direkt aus MongoDB
+        return
+    db = get_db()
+    await db["graph_outbox"].insert_one(
+        _new_entry(op, payload, datetime.utcnow()), session=session
+    )
+
+
+async def enqueue_many(op: str, payloads: list[dict], session=None):
+    """Wie enqueue, aber ein insert_many für viele Aufträge (z.B. Bulk-Import)."""
+    if (GRAPH_SYNC_MODE != "outbox" and op in GRAPH_OPS) or not payloads:
+        return
+    db = get_db()
+    now = datetime.utcnow()
+    await db["graph_outbox"].insert_many(
+        [_new_entry(op, payload, now) for payload in payloads], session=session
+    )
+
+
+def notify():
+    """Weckt den lokalen Worker sofort auf (nach dem Commit aufrufen)."""
+    if _wakeup:
+        _wakeup.set()
+
+
+# ──────────────────────────────────────────
+# Worker
+# ──────────────────────────────────────────
+
+async def _claim_batch() -> list[dict]:
+    """Reserviert bis zu BATCH_SIZE fällige Aufträge für diesen Worker."""
+    db = get_db()
+    now = datetime.utcnow()
+    due = {"status": "pending", "next_attempt_at": {"$lte": now}, "locked_until": {"$lte": now}}
+    candidates = await db["graph_outbox"].find(due, {"_id": 1}).sort("created_at", 1) \
+        .limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+    if not candidates:
+        return []
+    token = uuid.uuid4().hex
+    await db["graph_outbox"].update_many(
+        {**due, "_id": {"$in": [c["_id"] for c in candidates]}},
+        {"$set": {"locked_until": now + timedelta(seconds=LEASE_SECONDS), "lock": token}}
+    )
+    return await db["graph_outbox"].find({"lock": token}).sort("created_at", 1) \
+        .to_list(length=BATCH_SIZE)
+
+
+async def apply_ownerships(pairs: list[tuple[str, str]],
+                           purchase_ids: list[str | None] | None = None) -> set:
+    """
+    Legt OWNS-Kanten an und schreibt Co-Ownership ("also_bought") und
+    vorberechnete Empfehlungen in MongoDB fort.
+
+    Nur Datenbank-Schreibzugriffe: Läuft im Projektor-Prozess oder im Worker
+    eines beliebigen API-Prozesses – die Speicherstände (Co-Ownership,
+    Buddy-Index) folgen in jedem API-Prozess selbst den Änderungen in MongoDB.
+
+    pairs in Kaufreihenfolge, purchase_ids parallel dazu (None = unbekannt,
+    z.B. Aufträge von vor dem Update); gibt die Paare zurück, deren Knoten
+    existierten. Wird ein Batch wiederholt, sind OWNS (MERGE) und
+    Empfehlungen ($pull) ohnehin idempotent; Co-Ownership zählt jeden Kauf
+    per claim_purchases nur einmal.
+    """
+    purchase_ids = purchase_ids or [None] * len(pairs)
+    applied = await neo4j_service.bulk_add_ownerships(pairs)
+    libraries = {(a["userId"], a["gameId"]): a["otherGameIds"] for a in applied}
+    # Erst nach dem Anlegen der Kanten markieren – nicht angewendete Käufe kommen wieder
+    fresh = await co_ownership_service.claim_purchases(
+        [pid for pair, pid in zip(pairs, purchase_ids) if pid and pair in libraries]
+    )
+    bought_later: dict[str, set] = {}
+    # Rückwärts: Käufe desselben Users, die im Batch NACH diesem kommen,
+    # gehören nicht zu seiner "vorherigen" Bibliothek
+    for (user_id, game_id), purchase_id in reversed(list(zip(pairs, purchase_ids))):
+        if (user_id, game_id) not in libraries:
+            continue
+        later = bought_later.setdefault(user_id, set())
+        library = [g for g in libraries[(user_id, game_id)] if g not in later]
+        later.add(game_id)
+        if purchase_id is None or purchase_id in fresh:
+            await co_ownership_service.record_purchase(user_id, game_id, library)
+    await recommendation_batch_service.remove_owned(list(libraries))
+    return set(libraries)
+
+
+async def _apply(entries: list[dict]) -> set:
+    """
+    Schreibt einen Batch nach Neo4j. Gibt die _ids zurück, die NICHT
+    angewendet werden konnten (z.B. OWNS, bevor der User-Knoten existiert).
+    """
+    by_op: dict[str, list[dict]] = {}
+    for e in entries:
+        by_op.setdefault(e["op"], []).append(e)
+
+    # Reihenfolge: erst Knoten anlegen, dann Beziehungen, zuletzt löschen
+    users = by_op.get("create_user", [])
+    if users:
+        await neo4j_service.bulk_create_nodes("User", [e["payload"]["userId"] for e in users])
+
+    # Pro Spiel gilt nur der neueste Tag-Stand – mehrere Zeilen für dieselbe
+    # gameId im UNWIND ergäben die Vereinigung aller Tag-Mengen
+    latest_games: dict[str, dict] = {}
+    for e in sorted(by_op.get("create_game", []) + by_op.get("set_game_tags", []),
+                    key=lambda e: (e["created_at"], e["_id"])):
+        latest_games[e["payload"]["gameId"]] = e
+    if latest_games:
+        # Knoten, Tags und TAGGED_WITH in einem UNWIND
+        await neo4j_service.bulk_set_game_tags([
+            {"gameId": game_id, "tagIds": e["payload"].get("tagIds", [])}
+            for game_id, e in latest_games.items()
+        ])
+
+    not_applied = set()
+    ownerships = by_op.get("add_ownership", [])
+    if ownerships:
+        pairs = [(e["payload"]["userId"], e["payload"]["gameId"]) for e in ownerships]
+        applied = await apply_ownerships(pairs, [e["payload"].get("purchaseId") for e in ownerships])
+        not_applied = {e["_id"] for e, pair in zip(ownerships, pairs) if pair not in applied}
+
+    deleted_games = by_op.get("delete_game", [])
+    if deleted_games:
+        await neo4j_service.bulk_delete_nodes("Game", [e["payload"]["gameId"] for e in deleted_games])
+    deleted_users = by_op.get("delete_user", [])
+    if deleted_users:
+        user_ids = [e["payload"]["userId"] for e in deleted_users]
+        await neo4j_service.bulk_delete_nodes("User", user_ids)
+
+    return not_applied
+
+
+class LeaseLostError(Exception):
+    """Die Aufträge gehören inzwischen einem anderen Worker (Lease abgelaufen)."""
+
+
+async def _apply_revenue(entries: list[dict]):
+    """
+    Bucht Umsatz-Aufträge genau einmal: Löschen der (noch eigenen) Aufträge
+    und Rollup-$inc laufen in einer Transaktion. Hat ein anderer Worker sie
+    nach Ablauf der Lease übernommen, wird abgebrochen und nichts gebucht.
+
+    Ohne Replica Set wird erst gelöscht, dann gebucht – ein Absturz dazwischen
+    verliert Umsatz (POST /api/revenue/rebuild), statt ihn doppelt zu zählen.
+    """
+    db = get_db()
+    ids = [e["_id"] for e in entries]
+    sales = [(e["payload"]["publisherId"], e["payload"]["price"], e["payload"]["purchasedAt"])
+             for e in entries]
+
+    async def book(session):
+        await mongo_service.begin_revenue_booking(session)
+        deleted = await db["graph_outbox"].delete_many(
+            {"_id": {"$in": ids}, "lock": entries[0]["lock"]}, session=session
+        )
+        if deleted.deleted_count != len(ids):
+            raise LeaseLostError(f"{len(ids) - deleted.deleted_count} Umsatz-Aufträge übernommen")
+        await mongo_service.record_purchase_revenue(sales, session=session)
+
+    await mongo_service.run_transaction(book)
+
+
+async def _retry_later(entries: list[dict], error: str):
+    global _failed_total
+    db = get_db()
+    now = datetime.utcnow()
+    ops = []
+    for e in entries:
+        attempts = e.get("attempts", 0) + 1
+        backoff = min(2 ** attempts, MAX_BACKOFF_SECONDS)
+        # Nur solange der Auftrag noch diesem Worker gehört
+        ops.append(UpdateOne({"_id": e["_id"], "lock": e.get("lock")}, {
+            "$set": {
+                "status": "dead" if attempts >= MAX_ATTEMPTS else "pending",
+                "attempts": attempts, "last_error": error,
+                "next_attempt_at": now + timedelta(seconds=backoff), "locked_until": now,
+            },
+            "$unset": {"lock": ""},
+        }))
+    if ops:
+        await db["graph_outbox"].bulk_write(ops, ordered=False)
+    _failed_total += len(entries)
+
+
+async def process_batch() -> int:
+    """Arbeitet einen Batch ab; gibt die Anzahl erledigter Aufträge zurück."""
+    global _processed_total, _last_batch_at
+    entries = await _claim_batch()
+    if not entries:
+        return 0
+    db = get_db()
+    processed = 0
+
+    revenue = [e for e in entries if e["op"] == "record_revenue"]
+    if revenue:
+        try:
+            await _apply_revenue(revenue)
+            processed += len(revenue)
+        except LeaseLostError as e:
+            print(f"[WARN] Outbox: {e}")
+        except mongo_service.RevenueRebuildInProgress as e:
+            print(f"[RETRY] Outbox: {e}")
+            await _retry_later(revenue, str(e))
+        except Exception as e:
+            print(f"[RETRY] Umsatz-Rollup fehlgeschlagen ({len(revenue)} Aufträge): {e}")
+            await _retry_later(revenue, str(e))
+
+    graph = [e for e in entries if e["op"] != "record_revenue"]
+    if graph:
+        try:
+            not_applied = await _apply(graph)
+        except Exception as e:
+            print(f"[RETRY] Outbox-Batch fehlgeschlagen ({len(graph)} Aufträge): {e}")
+            await _retry_later(graph, str(e))
+            graph, not_applied = [], set()
+
+        done = [e["_id"] for e in graph if e["_id"] not in not_applied]
+        if done:
+            await db["graph_outbox"].delete_many({"_id": {"$in": done}})
+        await _retry_later([e for e in graph if e["_id"] in not_applied],
+                           "Knoten (noch) nicht vorhanden")
+        processed += len(done)
+
+    _processed_total += processed
+    _last_batch_at = datetime.utcnow()
+    return processed
+
+
+async def _run():
+    while True:
+        try:
+            processed = await process_batch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Outbox-Worker: {e}")
+            processed = 0
+        if processed == 0:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+
+
+def start_worker():
+    global _wakeup, _worker_task
+    _wakeup = asyncio.Event()
+    _worker_task = asyncio.create_task(_run())
+    print("[OK] Outbox-Worker gestartet")
+
+
+async def stop_worker():
+    global _worker_task
+    if _worker_task:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
+        print("[CLOSED] Outbox-Worker gestoppt")
+
+
+# ──────────────────────────────────────────
+# Metriken
+# ──────────────────────────────────────────
+
+async def get_status() -> dict:
+    """Lag-Metrik: offene/tote Aufträge und Alter des ältesten offenen Auftrags."""
+    db = get_db()
+    oldest = await db["graph_outbox"].find_one(
+        {"status": "pending"}, {"created_at": 1}, sort=[("created_at", 1)]
+    )
+    return {
+        "pending": await db["graph_outbox"].count_documents({"status": "pending"}),
+        "dead": await db["graph_outbox"].count_documents({"status": "dead"}),
+        "lag_seconds": round((datetime.utcnow() - oldest["created_at"]).total_seconds(), 3)
+                       if oldest else 0.0,
+        "processed_total": _processed_total,
+        "failed_total": _failed_total,
+        "last_batch_at": _last_batch_at,
+    }
@@ -0,0 +1,117 @@
+"""
+Purchase Service – atomarer Kauf eines Spiels.
+
+Statt "User lesen → Guthaben prüfen → Bibliothek aus Neo4j lesen → schreiben"
+(Check-then-Act, zwei parallele Käufe konnten beide die Prüfung bestehen):
+  1. Vorhandenen Kauf in beiden Referenzformen suchen (String/ObjectId,
+     siehe mongo_service.has_purchased)
+  2. Guthaben abbuchen per find_one_and_update mit Bedingung
+     wallet_balance >= Preis  → Prüfung und Abbuchung in einem Schritt
+  3. Purchase einfügen; der Unique-Index (user_id, game_id) verhindert
+     Doppelkäufe ohne die Bibliothek aus Neo4j zu laden
+  4. Outbox-Aufträge für die OWNS-Beziehung in Neo4j und den Umsatz-Rollup
+     anlegen – der Rollup wird gebündelt vom Worker gebucht, damit sich
+     parallele Käufe nicht am selben Rollup-Dokument stoßen
+
+Im Replica Set laufen 1–4 in einer MongoDB-Transaktion, die bei Write-
+Konflikten wiederholt wird. Parallele Käufe desselben Users konkurrieren
+dabei um das User-Dokument; die Wiederholung sieht dann den zuerst
+committeten Kauf. Auf einem Standalone-Server (ohne Transaktionen) wird bei
+einem Doppelkauf die Abbuchung wieder gutgeschrieben.
+"""
+
+from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+
+from config import get_db
+from services import mongo_service, outbox_service
+
+
+class PurchaseError(Exception):
+    """Fachlicher Fehler beim Kauf (wird in der Route zu HTTPException)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def _debit_and_insert(user_id: str, purchase: dict, publisher_id: str | None,
+                            session=None) -> float:
+    """Bucht ab und legt den Kauf an; gibt das neue Guthaben zurück."""
+    db = get_db()
+    price = purchase["price_paid"]
+
+    if await mongo_service.has_purchased(user_id, purchase["game_id"], session=session):
+        raise PurchaseError(400, "Spiel bereits in Bibliothek")
+
+    user = await db["users"].find_one_and_update(
+        {"_id": ObjectId(user_id), "wallet_balance": {"$gte": price}},
+        {"$inc": {"wallet_balance": -price}, "$set": {"updated_at": datetime.utcnow()}},
+        projection={"wallet_balance": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if not user:
+        # Nur im Fehlerfall: unterscheiden zwischen "gibt es nicht" und "zu wenig Guthaben"
+        existing = await db["users"].find_one(
+            {"_id": ObjectId(user_id)}, {"wallet_balance": 1}, session=session
+        )
+        if not existing:
+            raise PurchaseError(404, "User nicht gefunden")
+        raise PurchaseError(
+            400,
+            f"Nicht genug Guthaben. Benötigt: {price}€, "
+            f"Vorhanden: {existing.get('wallet_balance', 0)}€"
+        )
+
+    try:
+        await db["purchases"].insert_one(
+            mongo_service.to_storage_refs("purchases", dict(purchase)), session=session
+        )
+    except DuplicateKeyError:
+        if session is None:
+            # Ohne Transaktion: Abbuchung manuell zurücknehmen
+            await db["users"].update_one(
+                {"_id": ObjectId(user_id)}, {"$inc": {"wallet_balance": price}}
+            )
+        raise PurchaseError(400, "Spiel bereits in Bibliothek")
+
+    await outbox_service.enqueue(
+        "add_ownership",
+        {"userId": user_id, "gameId": purchase["game_id"], "purchaseId": str(purchase["_id"])},
+        session=session
+    )
+    await outbox_service.enqueue("record_revenue", {
+        "purchaseId": str(purchase["_id"]), "publisherId": publisher_id,
+        "price": price, "purchasedAt": purchase["created_at"],
+    }, session=session)
+    return user["wallet_balance"]
+
+
+async def purchase_game(user_id: str, game_id: str, price_paid: float) -> tuple[dict, dict, float]:
+    """
+    Führt den Kauf in MongoDB aus.
+
+    Rückgabe: (Purchase-Dokument, Spiel, neues Guthaben).
+    Neo4j wird hier nicht angefasst – das erledigt der Outbox-Worker.
+    """
+    if not ObjectId.is_valid(user_id):
+        raise PurchaseError(404, "User nicht gefunden")
+    game = await mongo_service.get_one("games", game_id, fields="card")
+    if not game:
+        raise PurchaseError(404, "Spiel nicht gefunden")
+
+    purchase = {
+        "_id": ObjectId(), "user_id": user_id, "game_id": game_id,
+        "price_paid": price_paid, "created_at": datetime.utcnow(),
+    }
+
+    async def write(session):
+        return await _debit_and_insert(user_id, purchase, game.get("publisher_id"), session)
+    new_balance = await mongo_service.run_transaction(write)
+
+    mongo_service.invalidate_cached("users", user_id)
+    return {**purchase, "_id": str(purchase["_id"])}, game, new_balance
@@ -0,0 +1,291 @@
+"""
+Recommendation-Batch-Service – vorberechnete Freundes-Empfehlungen.
+
+Statt recommend_by_friends bei jedem Seitenaufruf zu traversieren, rechnet
+ein Batch-Job die Listen für alle User vor:
+
+  1. User-Knoten partitionsweise per Keyset (userId) lesen
+  2. pro Partition ein UNWIND-Query (mehrere Partitionen parallel,
+     je eine Neo4j-Session)
+  3. Ranglisten per bulk_write in die Collection "recommendations"
+     {_id: userId, items: [{gameId, friendCount, friendIds}], generation}
+
+Der Endpunkt liest die vorberechnete Liste und rechnet nur für User live,
+die (noch) keine haben. Nach einem Kauf wird das gekaufte Spiel sofort aus
+der Liste des Käufers entfernt; nach einer Freundschaftsänderung werden die
+Listen beider User verworfen (→ live). Beides stempelt das Dokument mit
+changed_at – ein laufender Batch überschreibt nur Listen, die seit seinem
+Start nicht geändert wurden, bringt also weder gekaufte Spiele noch
+verworfene Listen zurück. Alles andere holt der nächste Lauf
+nach – start_schedule() startet ihn alle RECOMMENDATION_BATCH_INTERVAL
+Sekunden, über alle API-Prozesse hinweg höchstens einmal (Lease in MongoDB).
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from config import get_db, RECOMMENDATION_BATCH_INTERVAL
+from services import neo4j_service
+
+LIST_SIZE = neo4j_service.FRIEND_REC_LIST_SIZE  # gespeicherte Empfehlungen pro User
+PARTITION_SIZE = 500            # User pro Neo4j-Query
+CONCURRENCY = 4                 # parallele Neo4j-Sessions
+_DUPLICATE_KEY = 11000
+
+_job: asyncio.Task | None = None
+_schedule_task: asyncio.Task | None = None
+_LEASE_ID = "recommendations"
+_progress: dict = {
+    "running": False, "generation": None, "users_total": 0, "users_done": 0,
+    "partitions_done": 0, "started_at": None, "finished_at": None,
+    "users_per_second": 0.0, "last_error": None,
+}
+
+
+# ──────────────────────────────────────────
+# Lesen
+# ──────────────────────────────────────────
+
+async def get_recommendations(user_id: str, limit: int = 10) -> list[dict]:
+    """Gleiche Struktur wie neo4j_service.recommend_by_friends."""
+    db = get_db()
+    doc = await db["recommendations"].find_one(
+        {"_id": user_id}, {"items": {"$slice": limit}}
+    )
+    if doc is None or "items" not in doc or limit > LIST_SIZE:
+        # Noch nie berechnet bzw. verworfen → live (mit Cache, siehe neo4j_service)
+        return await neo4j_service.recommend_by_friends(user_id, limit)
+    return doc["items"]
+
+
+async def remove_owned(pairs: list[tuple[str, str]]):
+    """Entfernt gekaufte Spiele aus den vorberechneten Listen der Käufer."""
+    if not pairs:
+        return
+    db = get_db()
+    now = datetime.utcnow()
+    # Upsert: ohne Liste entsteht ein leeres Dokument (→ live), das ein
+    # laufender Batch wegen changed_at nicht überschreibt
+    await db["recommendations"].bulk_write([
+        UpdateOne({"_id": user_id},
+                  {"$pull": {"items": {"gameId": game_id}}, "$set": {"changed_at": now}},
+                  upsert=True)
+        for user_id, game_id in pairs
+    ], ordered=False)
+
+
+async def invalidate(user_ids: list[str]):
+    """Verwirft die vorberechneten Listen (z.B. nach einer Freundschaftsänderung)."""
+    db = get_db()
+    now = datetime.utcnow()
+    await db["recommendations"].bulk_write([
+        UpdateOne({"_id": user_id},
+                  {"$set": {"changed_at": now}, "$unset": {"items": ""}}, upsert=True)
+        for user_id in set(user_ids)
+    ], ordered=False)
+
+
+# ──────────────────────────────────────────
+# Batch-Job
+# ──────────────────────────────────────────
+
+async def _partitions():
+    """userId-Listen der Größe PARTITION_SIZE, sortiert (Keyset statt SKIP)."""
+    after = ""
+    while True:
+        records = await neo4j_service.run_read(
+            """
+            MATCH (u:User) WHERE u.userId > $after
+            RETURN u.userId AS userId ORDER BY userId LIMIT $size
+            """,
+            after=after, size=PARTITION_SIZE
+        )
+        user_ids = [r["userId"] for r in records]
+        if not user_ids:
+            return
+        yield user_ids
+        after = user_ids[-1]
+
+
+async def _compute_partition(user_ids: list[str]) -> dict[str, list[dict]]:
+    """Wie recommend_by_friends, aber für viele User in einem Query."""
+    records = await neo4j_service.run_read(
+        """
+        UNWIND $userIds AS userId
+        MATCH (u:User {userId: userId})
+        CALL {
+            WITH u
+            MATCH (u)-[:FRIENDS_WITH]-(friend:User)-[:OWNS]->(g:Game)
+            WHERE NOT (u)-[:OWNS]->(g)
+            WITH u, g, COUNT(DISTINCT friend) AS friendCount
+            ORDER BY friendCount DESC
+            LIMIT $limit
+            CALL {
+                WITH u, g
+                MATCH (u)-[:FRIENDS_WITH]-(friend:User)-[:OWNS]->(g)
+                WITH DISTINCT friend LIMIT $sample
+                RETURN COLLECT(friend.userId) AS friendIds
+            }
+            RETURN COLLECT({gameId: g.gameId, friendCount: friendCount,
+                            friendIds: friendIds}) AS items
+        }
+        RETURN userId, items
+        """,
+        userIds=user_ids, limit=LIST_SIZE, sample=neo4j_service.ID_SAMPLE
+    )
+    return {r["userId"]: r["items"] for r in records}
+
+
+async def _write_partition(recommendations: dict[str, list[dict]], generation: datetime):
+    """
+    Schreibt die Listen einer Partition – außer für User, deren Liste seit
+    Start des Laufs (generation) geändert wurde (Kauf, Freundschaft).
+
+    Deren Filter trifft nicht, der Upsert scheitert am _id; sie behalten
+    ihren Stand bzw. bleiben live, bis der nächste Lauf sie neu berechnet.
+    """
+    db = get_db()
+    now = datetime.utcnow()
+    try:
+        await db["recommendations"].bulk_write([
+            ReplaceOne({"_id": user_id, "changed_at": {"$not": {"$gte": generation}}},
+                       {"items": items, "generation": generation, "computed_at": now},
+                       upsert=True)
+            for user_id, items in recommendations.items()
+        ], ordered=False)
+    except BulkWriteError as e:
+        if any(err["code"] != _DUPLICATE_KEY for err in e.details["writeErrors"]):
+            raise
+
+
+async def _count_users() -> int:
+    records = await neo4j_service.run_read("MATCH (u:User) RETURN COUNT(u) AS users")
+    return records[0]["users"]
+
+
+async def run() -> dict:
+    """Berechnet die Listen aller User neu; gibt den Fortschritt zurück."""
+    db = get_db()
+    generation = datetime.utcnow()
+    started = time.monotonic()
+    _progress.update({
+        "running": True, "generation": generation, "users_total": await _count_users(),
+        "users_done": 0, "partitions_done": 0, "started_at": generation,
+        "finished_at": None, "users_per_second": 0.0, "last_error": None,
+    })
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def process(user_ids: list[str]):
+        try:
+            recommendations = await _compute_partition(user_ids)
+            if recommendations:
+                await _write_partition(recommendations, generation)
+            _progress["users_done"] += len(user_ids)
+            _progress["partitions_done"] += 1
+            _progress["users_per_second"] = round(
+                _progress["users_done"] / max(time.monotonic() - started, 1e-9), 1
+            )
+        finally:
+            semaphore.release()
+
+    tasks = []
+    try:
+        async for user_ids in _partitions():
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(process(user_ids)))
+        await asyncio.gather(*tasks)
+        # Listen gelöschter User entfernen (während des Laufs geänderte bleiben)
+        await db["recommendations"].delete_many({
+            "generation": {"$not": {"$gte": generation}},
+            "changed_at": {"$not": {"$gte": generation}},
+        })
+    except Exception as e:
+        for task in tasks:
+            task.cancel()
+        _progress["last_error"] = str(e)
+        raise
+    finally:
+        _progress["running"] = False
+        _progress["finished_at"] = datetime.utcnow()
+
+    print(f"[OK] Empfehlungen vorberechnet: {_progress['users_done']} User, "
+          f"{_progress['users_per_second']} User/s")
+    return get_progress()
+
+
+def start() -> dict:
+    """Startet den Job im Hintergrund (höchstens ein Lauf gleichzeitig)."""
+    global _job
+    if _job is None or _job.done():
+        _progress["running"] = True
+        _job = asyncio.create_task(run())
+        _job.add_done_callback(_log_failure)
+    return get_progress()
+
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        print(f"[ERROR] Empfehlungs-Batch fehlgeschlagen: {task.exception()}")
+
+
+# ──────────────────────────────────────────
+# Zeitplan
+# ──────────────────────────────────────────
+
+async def _acquire_lease(interval: float) -> bool:
+    """True, wenn dieser Prozess den fälligen Lauf übernimmt (Lease über alle Prozesse)."""
+    db = get_db()
+    now = datetime.utcnow()
+    try:
+        await db["job_leases"].update_one(
+            {"_id": _LEASE_ID, "next_run_at": {"$lte": now}},
+            {"$set": {"next_run_at": now + timedelta(seconds=interval), "acquired_at": now}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Lease existiert, ist aber noch nicht fällig (der Upsert scheitert am _id)
+        return False
+    return True
+
+
+async def _schedule(interval: float):
+    while True:
+        try:
+            if await _acquire_lease(interval):
+                start()
+                # Fehler meldet bereits _log_failure
+                await asyncio.wait({_job})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Empfehlungs-Batch (Zeitplan): {e}")
+        await asyncio.sleep(min(interval, 60))
+
+
+def start_schedule():
+    """Startet den periodischen Lauf (RECOMMENDATION_BATCH_INTERVAL, 0 = aus)."""
+    global _schedule_task
+    if RECOMMENDATION_BATCH_INTERVAL > 0:
+        _schedule_task = asyncio.create_task(_schedule(RECOMMENDATION_BATCH_INTERVAL))
+
+
+async def stop_schedule():
+    global _schedule_task
+    if _schedule_task:
+        _schedule_task.cancel()
+        try:
+            await _schedule_task
+        except asyncio.CancelledError:
+            pass
+        _schedule_task = None
+
+
+def get_progress() -> dict:
+    """Fortschritt und Durchsatz des letzten bzw. laufenden Jobs."""
+    progress = dict(_progress)
+    if progress["users_total"]:
+        progress["percent"] = round(100 * progress["users_done"] / progress["users_total"], 1)
+    return progress
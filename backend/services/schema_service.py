@@ -0,0 +1,183 @@
+"""
+Schema Service – Indizes (MongoDB) und Constraints (Neo4j).
+
+Wird beim Start in main.lifespan ausgeführt. Alle Operationen sind
+idempotent (create_index / IF NOT EXISTS), der angewendete Stand wird
+als Versionsnummer in der Collection "schema_version" gespeichert.
+"""
+
+from datetime import datetime
+from pymongo.errors import OperationFailure
+from config import get_db
+from services import neo4j_service
+
+# Bei jeder Änderung an MONGO_INDEXES / NEO4J_CONSTRAINTS erhöhen
+SCHEMA_VERSION = 9
+
+
+class SchemaError(RuntimeError):
+    """Ein deklarierter Index ließ sich nicht anlegen (z.B. Duplikate bei unique)."""
+
+
+# ──────────────────────────────────────────
+# Deklaration
+# ──────────────────────────────────────────
+
+# collection → Liste von (Index-Name, Keys, Optionen)
+MONGO_INDEXES = {
+    "purchases": [
+        ("user_id_1", [("user_id", 1)], {}),
+        ("game_id_1", [("game_id", 1)], {}),
+        ("created_at_1__id_1", [("created_at", 1), ("_id", 1)], {}),
+        # Jeder User kann ein Spiel nur einmal kaufen (Prüfung beim Insert)
+        ("user_id_1_game_id_1", [("user_id", 1), ("game_id", 1)], {"unique": True}),
+    ],
+    "reviews": [
+        ("game_id_1", [("game_id", 1)], {}),
+        ("user_id_1", [("user_id", 1)], {}),
+        ("created_at_1__id_1", [("created_at", 1), ("_id", 1)], {}),
+    ],
+    # Keyset-Pagination nach created_at (siehe mongo_service.get_page)
+    "games": [
+        ("created_at_1__id_1", [("created_at", 1), ("_id", 1)], {}),
+    ],
+    "users": [
+        ("created_at_1__id_1", [("created_at", 1), ("_id", 1)], {}),
+    ],
+    "tags": [
+        ("name_1", [("name", 1)], {"unique": True}),
+    ],
+    # Top-Rated: indizierte Sortierung auf den materialisierten Statistiken
+    "game_stats": [
+        ("avg_rating_-1_review_count_-1", [("avg_rating", -1), ("review_count", -1)], {}),
+    ],
+    # Umsatz pro Publisher: Zeitraum-Filter auf den Tages-Rollups
+    "publisher_revenue_daily": [
+        ("day_1_publisher_id_1", [("day", 1), ("publisher_id", 1)], {}),
+    ],
+    # Bereits eingerechnete Käufe (co_ownership_service.claim_purchases);
+    # Wiederholungen kommen innerhalb von Minuten, ein Tag reicht
+    "co_ownership_applied": [
+        ("applied_at_1", [("applied_at", 1)], {"expireAfterSeconds": 86400}),
+    ],
+    # Tag-Ähnlichkeit: Nachladen geänderter Listen und Queue in Reihenfolge
+    "tag_similar": [
+        ("updated_at_1", [("updated_at", 1)], {}),
+    ],
+    "tag_similarity_queue": [
+        ("queued_at_1", [("queued_at", 1)], {}),
+    ],
+    # Outbox-Worker: fällige Aufträge in Einfügereihenfolge
+    "graph_outbox": [
+        ("status_1_next_attempt_at_1", [("status", 1), ("next_attempt_at", 1)], {}),
+        ("lock_1", [("lock", 1)], {"sparse": True}),
+        # Offene Umsatz-Aufträge pro Kauf (rebuild_publisher_revenue)
+        ("payload.purchaseId_1", [("payload.purchaseId", 1)],
+         {"partialFilterExpression": {"op": "record_revenue"}}),
+    ],
+}
+
+# Constraint-Name → Cypher (Uniqueness erzeugt automatisch einen Index)
+NEO4J_CONSTRAINTS = {
+    "user_userId_unique":
+        "CREATE CONSTRAINT user_userId_unique IF NOT EXISTS "
+        "FOR (u:User) REQUIRE u.userId IS UNIQUE",
+    "game_gameId_unique":
+        "CREATE CONSTRAINT game_gameId_unique IF NOT EXISTS "
+        "FOR (g:Game) REQUIRE g.gameId IS UNIQUE",
+    "tag_tagId_unique":
+        "CREATE CONSTRAINT tag_tagId_unique IF NOT EXISTS "
+        "FOR (t:Tag) REQUIRE t.tagId IS UNIQUE",
+}
+
+
+# ──────────────────────────────────────────
+# Prüfen
+# ──────────────────────────────────────────
+
+async def get_missing_mongo_indexes() -> list[str]:
+    """Gibt alle deklarierten MongoDB-Indizes zurück, die noch fehlen."""
+    db = get_db()
+    missing = []
+    for coll, indexes in MONGO_INDEXES.items():
+        existing = await db[coll].index_information()
+        for name, _, _ in indexes:
+            if name not in existing:
+                missing.append(f"{coll}.{name}")
+    return missing
+
+
+async def get_missing_neo4j_constraints() -> list[str]:
+    """Gibt alle deklarierten Neo4j-Constraints zurück, die noch fehlen."""
+    records = await neo4j_service.run_read("SHOW CONSTRAINTS YIELD name RETURN name")
+    existing = {record["name"] for record in records}
+    return [name for name in NEO4J_CONSTRAINTS if name not in existing]
+
+
+async def get_schema_report() -> dict:
+    """Stand des Schemas: gespeicherte Version + fehlende Indizes/Constraints."""
+    db = get_db()
+    version_doc = await db["schema_version"].find_one({"_id": "schema"})
+    return {
+        "expected_version": SCHEMA_VERSION,
+        "applied_version": version_doc["version"] if version_doc else None,
+        "applied_at": version_doc["applied_at"] if version_doc else None,
+        "missing_mongo_indexes": await get_missing_mongo_indexes(),
+        "missing_neo4j_constraints": await get_missing_neo4j_constraints(),
+    }
+
+
+# ──────────────────────────────────────────
+# Anwenden
+# ──────────────────────────────────────────
+
+async def ensure_schema() -> dict:
+    """
+    Legt fehlende Indizes und Constraints an.
+
+    Läuft nur dann gegen die Datenbanken, wenn sich die Version geändert hat
+    oder ein deklarierter Index fehlt (z.B. nach einem Drop durch den Seeder).
+    Lässt sich ein Index nicht anlegen → SchemaError, die Version bleibt unverändert.
+    """
+    db = get_db()
+
+    report = await get_schema_report()
+    missing_mongo = report["missing_mongo_indexes"]
+    missing_neo4j = report["missing_neo4j_constraints"]
+
+    if report["applied_version"] == SCHEMA_VERSION and not missing_mongo and not missing_neo4j:
+        print(f"[OK] Schema aktuell (Version {SCHEMA_VERSION})")
+        return report
+
+    if missing_mongo:
+        print(f"[WARN] Fehlende MongoDB-Indizes: {', '.join(missing_mongo)}")
+    if missing_neo4j:
+        print(f"[WARN] Fehlende Neo4j-Constraints: {', '.join(missing_neo4j)}")
+
+    failed = []
+    for coll, indexes in MONGO_INDEXES.items():
+        for name, keys, options in indexes:
+            try:
+                await db[coll].create_index(keys, name=name, **options)
+            except OperationFailure as e:
+                # z.B. Unique-Index bei vorhandenen Duplikaten – erst die übrigen anlegen
+                print(f"[ERROR] Index {coll}.{name} konnte nicht angelegt werden: {e}")
+                failed.append(f"{coll}.{name}")
+
+    for cypher in NEO4J_CONSTRAINTS.values():
+        await neo4j_service.run_write(cypher)
+
+    if failed:
+        # Ohne z.B. den Unique-Index auf purchases wären Doppelkäufe möglich →
+        # nicht starten und die Version nicht eintragen (nächster Start prüft erneut)
+        raise SchemaError(
+            f"Indizes fehlen: {', '.join(failed)} – Duplikate bereinigen und neu starten"
+        )
+
+    await db["schema_version"].update_one(
+        {"_id": "schema"},
+        {"$set": {"version": SCHEMA_VERSION, "applied_at": datetime.utcnow()}},
+        upsert=True
+    )
+    print(f"[OK] Schema angewendet (Version {SCHEMA_VERSION})")
+    return report
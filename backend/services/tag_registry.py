@@ -0,0 +1,174 @@
+"""
+Tag-Registry – prozessweites Wörterbuch aller Tags.
+
+Das Tag-Vokabular ist klein und fast statisch. Statt es bei jeder Anfrage
+aus MongoDB zu lesen, wird es beim Start einmal geladen und im Speicher
+gehalten:
+
+  code (int)  ↔  tagId (MongoDB _id als String)  ↔  name
+
+Der Code ist ein kompakter, im Prozess stabiler Integer (0, 1, 2, ...);
+er bleibt auch nach dem Löschen eines Tags reserviert, damit davon
+abgeleitete Strukturen (z.B. Vektoren) gültig bleiben.
+
+Aktualisierung:
+  - Eigene Schreibzugriffe laufen über ensure() und sind sofort sichtbar
+  - Änderungen anderer Prozesse kommen per Change Stream auf "tags"
+    (Replica Set) bzw. durch periodisches Neuladen (Standalone)
+"""
+
+import asyncio
+
+from config import get_db, supports_transactions
+from services import mongo_service
+
+RELOAD_INTERVAL = 60            # Sekunden; Fallback ohne Change Streams
+
+_names: list[str | None] = []   # code → Name (None = gelöscht)
+_tag_ids: list[str] = []        # code → tagId
+_code_by_tag_id: dict[str, int] = {}
+_code_by_name: dict[str, int] = {}
+_watch_task: asyncio.Task | None = None
+
+
+# ──────────────────────────────────────────
+# Lesen (ohne Datenbankzugriff)
+# ──────────────────────────────────────────
+
+def name_of(tag_id: str, default: str = "Unknown") -> str:
+    code = _code_by_tag_id.get(tag_id)
+    name = _names[code] if code is not None else None
+    return name if name is not None else default
+
+
+def tag_id_of(name: str) -> str | None:
+    code = _code_by_name.get(name)
+    return _tag_ids[code] if code is not None else None
+
+
+def code_of(tag_id: str) -> int | None:
+    return _code_by_tag_id.get(tag_id)
+
+
+def tag_id_of_code(code: int) -> str:
+    return _tag_ids[code]
+
+
+def size() -> int:
+    """Anzahl vergebener Codes (inkl. gelöschter Tags)."""
+    return len(_tag_ids)
+
+
+def stats() -> dict:
+    return {"tags": len(_code_by_name), "codes": len(_tag_ids)}
+
+
+# ──────────────────────────────────────────
+# Schreiben
+# ──────────────────────────────────────────
+
+def _intern(tag_id: str, name: str | None) -> int:
+    """Registriert bzw. aktualisiert einen Tag und gibt seinen Code zurück."""
+    code = _code_by_tag_id.get(tag_id)
+    if code is None:
+        code = len(_tag_ids)
+        _tag_ids.append(tag_id)
+        _names.append(None)
+        _code_by_tag_id[tag_id] = code
+    old_name = _names[code]
+    if old_name is not None and _code_by_name.get(old_name) == code:
+        del _code_by_name[old_name]
+    _names[code] = name
+    if name is not None:
+        _code_by_name[name] = code
+    return code
+
+
+def _forget(tag_id: str):
+    if tag_id in _code_by_tag_id:
+        _intern(tag_id, None)
+
+
+async def ensure(names) -> dict[str, str]:
+    """
+    Name → tagId für alle Namen; unbekannte Tags werden in MongoDB angelegt.
+
+    Nur für neue Namen gibt es einen Datenbankzugriff.
+    """
+    names = list(dict.fromkeys(n for n in names if n))
+    missing = [n for n in names if n not in _code_by_name]
+    if missing:
+        for name, tag_id in (await mongo_service.resolve_tag_ids(missing)).items():
+            _intern(tag_id, name)
+    return {n: tag_id_of(n) for n in names if n in _code_by_name}
+
+
+async def load(quiet: bool = False):
+    """Lädt alle Tags aus MongoDB (beim Start und nach einem Reset)."""
+    db = get_db()
+    seen = set()
+    async for tag in db["tags"].find({}, {"name": 1}):
+        tag_id = str(tag["_id"])
+        _intern(tag_id, tag.get("name"))
+        seen.add(tag_id)
+    for tag_id in list(_code_by_tag_id):
+        if tag_id not in seen:
+            _forget(tag_id)
+    if not quiet:
+        print(f"[OK] Tag-Registry geladen: {len(_code_by_name)} Tags")
+
+
+def clear():
+    """Verwirft alle Einträge (z.B. beim Zurücksetzen der Datenbanken)."""
+    _names.clear()
+    _tag_ids.clear()
+    _code_by_tag_id.clear()
+    _code_by_name.clear()
+
+
+# ──────────────────────────────────────────
+# Änderungsbenachrichtigungen
+# ──────────────────────────────────────────
+
+async def _watch():
+    db = get_db()
+    while True:
+        try:
+            if not supports_transactions():
+                await asyncio.sleep(RELOAD_INTERVAL)
+                await load(quiet=True)
+                continue
+            async with db["tags"].watch(full_document="updateLookup") as stream:
+                # Änderungen zwischen letztem Laden und Stream-Start nachholen
+                await load(quiet=True)
+                async for change in stream:
+                    if "documentKey" not in change:
+                        continue    # drop/invalidate – Stream endet danach
+                    tag_id = str(change["documentKey"]["_id"])
+                    if change["operationType"] == "delete":
+                        _forget(tag_id)
+                    elif change.get("fullDocument"):
+                        _intern(tag_id, change["fullDocument"].get("name"))
+            # Stream beendet (z.B. Collection gedroppt) → beim nächsten Durchlauf neu laden
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WARN] Tag-Registry: Änderungsstrom unterbrochen ({e})")
+            await asyncio.sleep(RELOAD_INTERVAL)
+
+
+async def start():
+    global _watch_task
+    await load()
+    _watch_task = asyncio.create_task(_watch())
+
+
+async def stop():
+    global _watch_task
+    if _watch_task:
+        _watch_task.cancel()
+        try:
+            await _watch_task
+        except asyncio.CancelledError:
+            pass
+        _watch_task = None
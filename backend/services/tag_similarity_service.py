@@ -0,0 +1,522 @@
+"""
+Tag-Similarity Service – gewichtete Ähnlichkeit über Tags (TF-IDF).
+
+Der reine Cypher-Join zählt gemeinsame Tags, jeder Tag wiegt gleich – ein
+gemeinsames "Action" zählt so viel wie ein gemeinsames "Metroidvania".
+Hier wird jedes Spiel als dünnbesetzter Tag-Vektor dargestellt:
+
+  Gewicht(tag) = idf(tag) = ln((1 + N) / (1 + df(tag))) + 1
+  Ähnlichkeit  = Kosinus der Vektoren (seltene gemeinsame Tags zählen mehr)
+
+  - Bulk:          Game×Tag-Matrix, normiert, blockweise X·Xᵀ → Top-K
+  - In-Memory-Map: gameId → Nachbarliste (Lesepfad)
+  - MongoDB:       Collection "tag_similar" (maßgeblicher Stand)
+  - Inkrementell:  update_game() nach Änderung der Tags eines Spiels – die
+                   Routen legen sie per schedule_update() in der Collection
+                   "tag_similarity_queue" ab, ein Hintergrund-Worker rechnet
+                   sie außerhalb des Requests nach
+
+Geschrieben wird nur von einem Prozess: Jeder API-Prozess startet den
+Worker, aber nur der Inhaber der Lease in "job_leases" arbeitet die Queue
+und angeforderte Neuaufbauten (schedule_rebuild) ab. Er lädt beim Erwerb
+der Lease neu, rechnet also nie auf einem veralteten Speicherstand. Alle
+Prozesse folgen "tag_similar" per Change Stream (Replica Set) bzw. durch
+periodisches Nachladen geänderter Dokumente (Standalone), wie Co-Ownership.
+
+Das Matrixprodukt läuft per asyncio.to_thread außerhalb des Event-Loops;
+die Blockgröße richtet sich nach einer Obergrenze für die Einträge des
+Zwischenergebnisses statt nach einer festen Zeilenzahl.
+
+Die Spalten der Matrix sind die Codes der Tag-Registry. Inkrementelle
+Updates rechnen mit den aktuellen idf-Werten; die Scores der übrigen
+Paare verschieben sich erst beim nächsten rebuild().
+"""
+
+import asyncio
+import math
+import uuid
+from datetime import datetime, timedelta
+import numpy as np
+from scipy import sparse
+from pymongo import ReplaceOne, DeleteOne, UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import get_db, supports_transactions
+from services import neo4j_service, tag_registry
+
+TOP_K = 20                      # gelieferte Nachbarn pro Spiel
+STORE_K = TOP_K * 2             # mit Reserve für inkrementelle Updates
+# Obergrenze für Einträge eines Blocks von X·Xᵀ (≈ 12 Byte pro Eintrag → ~100 MB)
+_MAX_BLOCK_NNZ = 8_000_000
+_WRITE_BATCH = 1000
+_YIELD_EVERY = 1000             # Kandidaten, nach denen update_game den Event-Loop freigibt
+REFRESH_INTERVAL = 10           # Sekunden; Fallback ohne Change Streams
+QUEUE_POLL_INTERVAL = 2.0       # Sekunden; Vorgemerktes anderer Prozesse abholen
+LEASE_SECONDS = 60              # Schreibrecht für die Queue
+REBUILD_LEASE_SECONDS = 1800    # Schreibrecht während eines Neuaufbaus
+_QUEUE_BATCH = 100
+_LEASE_ID = "tag_similarity"
+_PROCESS_ID = uuid.uuid4().hex
+
+# gameId → [{"gameId", "score", "commonTags", "sharedTagIds"}], absteigend nach score
+_neighbors: dict[str, list[dict]] = {}
+# Invertierter Index für inkrementelle Updates
+_tags_by_game: dict[str, set[int]] = {}
+_games_by_tag: dict[int, set[str]] = {}
+_built = False
+# Hält dieser Prozess die Lease (und damit einen aktuellen Speicherstand)?
+_holding_lease = False
+
+_wakeup: asyncio.Event | None = None
+_worker_task: asyncio.Task | None = None
+_follow_task: asyncio.Task | None = None
+
+
+# ──────────────────────────────────────────
+# Lesen
+# ──────────────────────────────────────────
+
+async def get_similar(game_id: str, limit: int = 5) -> list[dict]:
+    """
+    Gleiche Struktur wie neo4j_service.similar_games_by_tags (+ "score").
+
+    Solange noch nie gebaut wurde (oder limit > TOP_K), wird live in Neo4j gerechnet.
+    """
+    if not _built or limit > TOP_K:
+        return await neo4j_service.similar_games_by_tags(game_id, limit)
+    return [
+        {**n, "sharedTagIds": list(n["sharedTagIds"])}
+        for n in _neighbors.get(game_id, [])[:limit]
+    ]
+
+
+def _codes(tag_names) -> set[int]:
+    codes = set()
+    for name in tag_names or []:
+        tag_id = tag_registry.tag_id_of(name)
+        if tag_id is not None:
+            codes.add(tag_registry.code_of(tag_id))
+    return codes
+
+
+def _index(game_id: str, codes: set[int]):
+    for code in _tags_by_game.pop(game_id, set()):
+        _games_by_tag[code].discard(game_id)
+    if codes:
+        _tags_by_game[game_id] = codes
+        for code in codes:
+            _games_by_tag.setdefault(code, set()).add(game_id)
+
+
+async def _load_game_tags() -> dict[str, set[int]]:
+    db = get_db()
+    return {
+        str(g["_id"]): codes
+        async for g in db["games"].find({}, {"tag_names": 1})
+        if (codes := _codes(g.get("tag_names")))
+    }
+
+
+async def load_from_mongo():
+    """Lädt Nachbarlisten und Tag-Index in den Speicher (beim Start, nach der Tag-Registry)."""
+    global _built
+    db = get_db()
+    _neighbors.clear()
+    async for doc in db["tag_similar"].find():
+        _neighbors[doc["_id"]] = doc["neighbors"]
+    _tags_by_game.clear()
+    _games_by_tag.clear()
+    for game_id, codes in (await _load_game_tags()).items():
+        _index(game_id, codes)
+    _built = bool(_neighbors)
+    print(f"[OK] Tag-Ähnlichkeit geladen: {len(_neighbors)} Spiele")
+
+
+def clear():
+    """Verwirft den Speicherstand (z.B. beim Zurücksetzen der Datenbanken)."""
+    global _built, _holding_lease
+    _neighbors.clear()
+    _tags_by_game.clear()
+    _games_by_tag.clear()
+    _built = False
+    # Beim nächsten Erwerb der Lease neu laden
+    _holding_lease = False
+
+
+# ──────────────────────────────────────────
+# Änderungen des schreibenden Prozesses übernehmen
+# ──────────────────────────────────────────
+
+async def _reload_changed(since: datetime) -> datetime:
+    """Lädt alle seit since geänderten Nachbarlisten nach (Standalone)."""
+    global _built
+    db = get_db()
+    latest = since
+    # Überlappung: updated_at stammt von der Uhr des schreibenden Prozesses
+    query = {"updated_at": {"$gte": since - timedelta(seconds=REFRESH_INTERVAL)}}
+    async for doc in db["tag_similar"].find(query):
+        _neighbors[doc["_id"]] = doc["neighbors"]
+        latest = max(latest, doc["updated_at"])
+        _built = True
+    return latest
+
+
+async def _follow():
+    global _built
+    db = get_db()
+    since = datetime.utcnow()
+    while True:
+        try:
+            if not supports_transactions():
+                await asyncio.sleep(REFRESH_INTERVAL)
+                since = await _reload_changed(since)
+                continue
+            async with db["tag_similar"].watch(full_document="updateLookup") as stream:
+                # Änderungen zwischen Laden und Stream-Start nachholen
+                since = await _reload_changed(since)
+                async for change in stream:
+                    if "documentKey" not in change:
+                        continue    # drop/invalidate – Stream endet danach
+                    game_id = change["documentKey"]["_id"]
+                    doc = change.get("fullDocument")
+                    if change["operationType"] == "delete":
+                        _neighbors.pop(game_id, None)
+                    elif doc:
+                        _neighbors[game_id] = doc["neighbors"]
+                        _built = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WARN] Tag-Ähnlichkeit: Änderungsstrom unterbrochen ({e})")
+            await asyncio.sleep(REFRESH_INTERVAL)
+
+
+# ──────────────────────────────────────────
+# Bulk-Aufbau
+# ──────────────────────────────────────────
+
+def _idf(df, n_games: int):
+    return np.log((1 + n_games) / (1 + np.asarray(df, dtype=np.float64))) + 1
+
+
+def _row_blocks(matrix):
+    """
+    Zeilenblöcke, deren Produkt höchstens _MAX_BLOCK_NNZ Einträge haben kann.
+
+    Obergrenze pro Spiel = Summe der df seiner Tags (jedes Spiel mit einem
+    gemeinsamen Tag wird einmal pro gemeinsamem Tag gezählt).
+    """
+    df = np.asarray(matrix.sum(axis=0)).ravel()
+    bounds = matrix @ df
+    start, total = 0, 0.0
+    for row, bound in enumerate(bounds):
+        if row > start and total + bound > _MAX_BLOCK_NNZ:
+            yield start, row
+            start, total = row, 0.0
+        total += bound
+    if start < matrix.shape[0]:
+        yield start, matrix.shape[0]
+
+
+def _top_neighbors(game_ids: list[str], codes: list[set[int]], top_k: int) -> dict:
+    """TF-IDF-Matrix aufbauen, normieren und blockweise Top-K Kosinus-Nachbarn bestimmen."""
+    rows = [g for g, c in enumerate(codes) for _ in c]
+    cols = [code for c in codes for code in c]
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(len(game_ids), tag_registry.size())
+    )
+    idf = _idf(np.bincount(cols, minlength=matrix.shape[1]), len(game_ids))
+    weighted = matrix @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    normalized = (sparse.diags(1 / norms) @ weighted).tocsr()
+    transposed = normalized.T.tocsc()
+
+    result = {}
+    for block_start, block_end in _row_blocks(matrix):
+        scores = (normalized[block_start:block_end] @ transposed).tocsr()
+        for offset in range(scores.shape[0]):
+            g = block_start + offset
+            start, end = scores.indptr[offset], scores.indptr[offset + 1]
+            others, values = scores.indices[start:end], scores.data[start:end]
+            keep = others != g
+            others, values = others[keep], values[keep]
+            if len(others) > top_k:
+                top = np.argpartition(-values, top_k)[:top_k]
+                others, values = others[top], values[top]
+            order = np.argsort(-values, kind="stable")
+            neighbors = [
+                _entry(game_ids[h], float(v), codes[g] & codes[h])
+                for h, v in zip(others[order], values[order])
+            ]
+            if neighbors:
+                result[game_ids[g]] = neighbors
+    return result
+
+
+def _entry(game_id: str, score: float, shared: set[int]) -> dict:
+    return {
+        "gameId": game_id,
+        "score": round(float(score), 4),
+        "commonTags": len(shared),
+        "sharedTagIds": [tag_registry.tag_id_of_code(c) for c in sorted(shared)],
+    }
+
+
+async def rebuild(top_k: int = STORE_K) -> dict:
+    """Berechnet alle Nachbarlisten aus den Tags der Spiele in MongoDB neu."""
+    global _built
+    db = get_db()
+
+    game_tags = await _load_game_tags()
+    game_ids = list(game_tags)
+    # CPU-lastig (Sekunden bei großen Katalogen) → nicht im Event-Loop
+    neighbors = await asyncio.to_thread(
+        _top_neighbors, game_ids, [game_tags[g] for g in game_ids], top_k
+    ) if game_ids else {}
+
+    # Erst unmittelbar vor dem Schreiben stempeln – sonst übersieht das
+    # periodische Nachladen anderer Prozesse einen lange rechnenden Neuaufbau
+    written_at = datetime.utcnow()
+    ops = [
+        ReplaceOne({"_id": gid}, {"neighbors": n, "updated_at": written_at}, upsert=True)
+        for gid, n in neighbors.items()
+    ]
+    for i in range(0, len(ops), _WRITE_BATCH):
+        await db["tag_similar"].bulk_write(ops[i:i + _WRITE_BATCH], ordered=False)
+    await db["tag_similar"].delete_many({"updated_at": {"$lt": written_at}})
+
+    _neighbors.clear()
+    _neighbors.update(neighbors)
+    _tags_by_game.clear()
+    _games_by_tag.clear()
+    for game_id, codes in game_tags.items():
+        _index(game_id, codes)
+    _built = True
+    print(f"[OK] Tag-Ähnlichkeit neu berechnet: {len(neighbors)} Spiele, "
+          f"{tag_registry.size()} Tags")
+    return {"games": len(neighbors), "tags": tag_registry.size()}
+
+
+# ──────────────────────────────────────────
+# Inkrementelle Pflege
+# ──────────────────────────────────────────
+
+async def _scores_for(game_id: str) -> dict[str, tuple[float, set[int]]]:
+    """
+    Kosinus des Spiels gegen alle Spiele mit mindestens einem gemeinsamen Tag.
+
+    Bei populären Tags sind das zehntausende Kandidaten – zwischendurch wird
+    der Event-Loop freigegeben.
+    """
+    codes = _tags_by_game.get(game_id, set())
+    n_games = len(_tags_by_game)
+    idf = {c: _idf(len(games), n_games) for c, games in _games_by_tag.items() if games}
+
+    def norm(tags: set[int]) -> float:
+        return math.sqrt(sum(idf[c] ** 2 for c in tags))
+
+    own_norm = norm(codes)
+    candidates = set().union(*(_games_by_tag[c] for c in codes)) - {game_id} if codes else set()
+    scores = {}
+    for i, other in enumerate(candidates):
+        if i % _YIELD_EVERY == _YIELD_EVERY - 1:
+            await asyncio.sleep(0)
+        other_codes = _tags_by_game.get(other)
+        if not other_codes:
+            continue    # inzwischen gelöscht bzw. ohne Tags
+        shared = codes & other_codes
+        dot = sum(idf[c] ** 2 for c in shared)
+        scores[other] = (dot / (own_norm * norm(other_codes)), shared)
+    return scores
+
+
+def _place(game_id: str, other_id: str, score: float | None, shared: set[int]) -> bool:
+    """Trägt game_id in die Liste von other_id ein bzw. entfernt es; True bei Änderung."""
+    if score is None and other_id not in _neighbors:
+        return False
+    neighbors = _neighbors.setdefault(other_id, [])
+    before = len(neighbors)
+    neighbors[:] = [n for n in neighbors if n["gameId"] != game_id]
+    removed = len(neighbors) != before
+    if score is None:
+        return removed
+    if len(neighbors) >= STORE_K and score <= neighbors[-1]["score"]:
+        return removed
+    neighbors.append(_entry(game_id, score, shared))
+    neighbors.sort(key=lambda n: n["score"], reverse=True)
+    del neighbors[STORE_K:]
+    return True
+
+
+async def update_game(game_id: str, tag_names: list[str] | None):
+    """
+    Aktualisiert die Nachbarlisten nach einer Tag-Änderung.
+
+    tag_names: neue Tags des Spiels, None = Spiel gelöscht.
+    Schreibt ganze Nachbarlisten auf Basis des Speicherstands – nur vom
+    Inhaber der Lease aufrufen, aus Requests per schedule_update().
+    """
+    if not _built:
+        return
+    db = get_db()
+    previous = {n["gameId"] for n in _neighbors.pop(game_id, [])}
+    _index(game_id, _codes(tag_names) if tag_names is not None else set())
+
+    scores = await _scores_for(game_id) if tag_names is not None else {}
+    changed = set()
+    for other in previous | set(scores):
+        score, shared = scores.get(other, (None, set()))
+        if _place(game_id, other, score, shared):
+            changed.add(other)
+
+    ops = []
+    if scores:
+        top = sorted(scores.items(), key=lambda item: item[1][0], reverse=True)[:STORE_K]
+        _neighbors[game_id] = [_entry(other, s, shared) for other, (s, shared) in top]
+        changed.add(game_id)
+    else:
+        ops.append(DeleteOne({"_id": game_id}))
+    now = datetime.utcnow()
+    ops.extend(
+        ReplaceOne({"_id": gid}, {"neighbors": _neighbors[gid], "updated_at": now}, upsert=True)
+        for gid in changed
+    )
+    for i in range(0, len(ops), _WRITE_BATCH):
+        await db["tag_similar"].bulk_write(ops[i:i + _WRITE_BATCH], ordered=False)
+
+
+# ──────────────────────────────────────────
+# Hintergrund-Worker
+# ──────────────────────────────────────────
+#
+# tag_similarity_queue: {_id: gameId, tag_names (None = gelöscht), queued_at}
+# job_leases "tag_similarity": {holder, locked_until, rebuild_requested_at}
+
+async def schedule_updates(games: list[tuple[str, list[str] | None]], session=None):
+    """
+    Merkt Tag-Änderungen vor (pro Spiel gewinnt die letzte).
+
+    session = laufende Transaktion der Spiel-Änderung (optional).
+    """
+    if not games:
+        return
+    db = get_db()
+    now = datetime.utcnow()
+    await db["tag_similarity_queue"].bulk_write([
+        UpdateOne(
+            {"_id": game_id},
+            {"$set": {"tag_names": list(tag_names) if tag_names is not None else None,
+                      "queued_at": now}},
+            upsert=True,
+        )
+        for game_id, tag_names in games
+    ], ordered=False, session=session)
+    if _wakeup:
+        _wakeup.set()
+
+
+async def schedule_update(game_id: str, tag_names: list[str] | None, session=None):
+    """Merkt die Tag-Änderung eines Spiels vor (siehe schedule_updates)."""
+    await schedule_updates([(game_id, tag_names)], session=session)
+
+
+async def schedule_rebuild():
+    """Fordert einen kompletten Neuaufbau an (z.B. nach einem großen Bulk-Import)."""
+    db = get_db()
+    await db["job_leases"].update_one(
+        {"_id": _LEASE_ID}, {"$set": {"rebuild_requested_at": datetime.utcnow()}}, upsert=True
+    )
+    if _wakeup:
+        _wakeup.set()
+
+
+async def _acquire_lease(seconds: float) -> dict | None:
+    """Erwirbt bzw. verlängert die Lease; None, wenn ein anderer Prozess schreibt."""
+    global _holding_lease
+    db = get_db()
+    now = datetime.utcnow()
+    try:
+        lease = await db["job_leases"].find_one_and_update(
+            {"_id": _LEASE_ID, "$or": [
+                {"holder": _PROCESS_ID}, {"locked_until": {"$not": {"$gt": now}}},
+            ]},
+            {"$set": {"holder": _PROCESS_ID, "locked_until": now + timedelta(seconds=seconds)}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lease gehört einem anderen Prozess (der Upsert scheitert am _id)
+        _holding_lease = False
+        return None
+    if not _holding_lease:
+        # Bisheriger Schreiber war ein anderer Prozess → dessen Stand übernehmen
+        await load_from_mongo()
+        _holding_lease = True
+    return lease
+
+
+async def _process_queue():
+    """Arbeitet Neuaufbau-Anforderung und Queue ab, sofern dieser Prozess die Lease hat."""
+    db = get_db()
+    lease = await _acquire_lease(LEASE_SECONDS)
+    if lease is None:
+        return
+    requested = lease.get("rebuild_requested_at")
+    if requested:
+        await _acquire_lease(REBUILD_LEASE_SECONDS)
+        started_at = datetime.utcnow()
+        await rebuild()
+        # Bis zum Start Vorgemerktes ist im Neuaufbau enthalten
+        await db["tag_similarity_queue"].delete_many({"queued_at": {"$lte": started_at}})
+        await db["job_leases"].update_one(
+            {"_id": _LEASE_ID, "rebuild_requested_at": requested},
+            {"$unset": {"rebuild_requested_at": ""}}
+        )
+    while True:
+        queued = await db["tag_similarity_queue"].find().sort("queued_at", 1) \
+            .limit(_QUEUE_BATCH).to_list(length=_QUEUE_BATCH)
+        if not queued:
+            return
+        for entry in queued:
+            await update_game(entry["_id"], entry.get("tag_names"))
+            # Nur entfernen, wenn das Spiel inzwischen nicht erneut vorgemerkt wurde
+            await db["tag_similarity_queue"].delete_one(
+                {"_id": entry["_id"], "queued_at": entry["queued_at"]}
+            )
+        if await _acquire_lease(LEASE_SECONDS) is None:
+            return
+
+
+async def _run():
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=QUEUE_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            await _process_queue()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Tag-Ähnlichkeit: Aktualisierung fehlgeschlagen ({e})")
+
+
+async def start():
+    """Lädt den Speicherstand, folgt den Änderungen und startet den Worker (API-Prozess)."""
+    global _wakeup, _worker_task, _follow_task
+    await load_from_mongo()
+    _follow_task = asyncio.create_task(_follow())
+    _wakeup = asyncio.Event()
+    _worker_task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _worker_task, _follow_task
+    for task in (_worker_task, _follow_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    _worker_task = _follow_task = None
@@ -0,0 +1,104 @@
+"""
+Integrationstest: Neuaufbau der Umsatz-Rollups vs. offene Outbox-Aufträge.
+
+Braucht einen erreichbaren MongoDB-Server (TEST_MONGO_URI, Standard
+mongodb://localhost:27017) und wird sonst übersprungen. Gearbeitet wird in
+der Datenbank TEST_MONGO_DB (Standard "gamestore_test"), die vor und nach
+jedem Test gelöscht wird.
+
+    cd backend && python -m pytest tests
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+# Vor dem Import von config setzen – die Module lesen die Umgebung beim Import
+os.environ["MONGO_URI"] = os.getenv("TEST_MONGO_URI", "mongodb://localhost:27017")
+os.environ["MONGO_DB"] = os.getenv("TEST_MONGO_DB", "gamestore_test")
+os.environ["MONGO_MIN_POOL_SIZE"] = "0"
+os.environ["MONGO_SERVER_SELECTION_TIMEOUT_MS"] = "2000"
+
+import pytest
+from pymongo.errors import PyMongoError
+
+from config import connect_mongodb, close_mongodb, get_db
+from config.mongodb import MONGO_DB
+from services import mongo_service, outbox_service, purchase_service
+
+PRICE = 59.99
+
+
+async def _with_test_db(test):
+    try:
+        await connect_mongodb()
+    except PyMongoError as e:
+        await close_mongodb()
+        pytest.skip(f"kein MongoDB-Server erreichbar: {e}")
+    db = get_db()
+    await db.client.drop_database(MONGO_DB)
+    mongo_service.clear_cache()
+    try:
+        await test(db)
+    finally:
+        await db.client.drop_database(MONGO_DB)
+        await close_mongodb()
+
+
+async def _buy_game(db) -> str:
+    """Legt Publisher, Spiel und User an und kauft das Spiel; gibt die publisher_id zurück."""
+    publisher = await mongo_service.create_one("publishers", {"name": "Test Publisher"})
+    game = await mongo_service.create_one("games", {
+        "title": "Test Game", "price": PRICE, "publisher_id": publisher["_id"], "tag_names": [],
+    })
+    user = await mongo_service.create_one("users", {"username": "buyer", "wallet_balance": 100.0})
+    await purchase_service.purchase_game(user["_id"], game["_id"], PRICE)
+    return publisher["_id"]
+
+
+async def _apply_revenue_outbox(db):
+    """Bucht alle offenen record_revenue-Aufträge wie der Outbox-Worker."""
+    entries = [e for e in await outbox_service._claim_batch() if e["op"] == "record_revenue"]
+    if entries:
+        await outbox_service._apply_revenue(entries)
+
+
+async def _revenue(db, publisher_id: str) -> tuple[float, int]:
+    rollups = await db["publisher_revenue_daily"].find({"publisher_id": publisher_id}).to_list(None)
+    return sum(r["revenue"] for r in rollups), sum(r["sales"] for r in rollups)
+
+
+def test_rebuild_skips_purchases_with_pending_revenue_entry():
+    async def test(db):
+        publisher_id = await _buy_game(db)
+        assert await db["graph_outbox"].count_documents({"op": "record_revenue"}) == 1
+
+        # Neuaufbau vor der Buchung: der Kauf ist noch nicht gebucht
+        await mongo_service.rebuild_publisher_revenue()
+        assert await _revenue(db, publisher_id) == (0, 0)
+
+        await _apply_revenue_outbox(db)
+        assert await db["graph_outbox"].count_documents({"op": "record_revenue"}) == 0
+        revenue, sales = await _revenue(db, publisher_id)
+        assert sales == 1
+        assert revenue == pytest.approx(PRICE)
+
+        # Ein weiterer Neuaufbau zählt den inzwischen gebuchten Kauf genau einmal
+        await mongo_service.rebuild_publisher_revenue()
+        revenue, sales = await _revenue(db, publisher_id)
+        assert sales == 1
+        assert revenue == pytest.approx(PRICE)
+
+    asyncio.run(_with_test_db(test))
+
+
+def test_booking_is_refused_while_rebuilding():
+    async def test(db):
+        await db["job_leases"].insert_one({
+            "_id": mongo_service._REVENUE_LEASE_ID,
+            "rebuilding_until": datetime.utcnow() + timedelta(seconds=60),
+        })
+        with pytest.raises(mongo_service.RevenueRebuildInProgress):
+            await mongo_service.begin_revenue_booking()
+
+    asyncio.run(_with_test_db(test))